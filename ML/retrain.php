@@ -1,4 +1,48 @@
 <?php
+// Training runs as a background job on the Flask API. The form posts below only queue it and
+// redirect to ?job_id=...&job_kind=..., which asks the API for the job's status once per page
+// load and reloads itself every few seconds until the job is over.
+function job_status($job_id) {
+    $url = 'http://127.0.0.1:5000/jobs/' . urlencode($job_id);
+    $ch = curl_init($url);
+    curl_setopt($ch, CURLOPT_RETURNTRANSFER, true);
+    $job = json_decode(curl_exec($ch), true);
+    $status = curl_getinfo($ch, CURLINFO_HTTP_CODE);
+    curl_close($ch);
+
+    // An unknown job, an API that is down or a reply without a status ends the polling
+    if ($status != 200 || !isset($job['status'])) {
+        return ['status' => 'failed', 'error' => isset($job['error']) ? $job['error'] : 'Could not get the status of the training job'];
+    }
+    return $job;
+}
+
+function follow_job($response, $kind) {
+    header('Location: ' . basename($_SERVER['PHP_SELF']) . '?job_id=' . urlencode($response['job_id']) . '&job_kind=' . $kind);
+    exit;
+}
+
+function show_retrain_result($response) {
+    global $mse, $mae, $r2;
+
+    if (isset($response['mse']) && isset($response['mae']) && isset($response['r2'])) {
+        // Display the metrics returned from Flask
+        $mse = $response['mse'];
+        $mae = $response['mae'];
+        $r2 = $response['r2'];
+    } else {
+        echo "<p>Error: " . htmlspecialchars($response['error']) . "</p>";
+    }
+}
+
+function show_export_result($response) {
+    if (isset($response['update'])) {
+        echo "<script type='text/javascript'>alert('Model Exported Successfully');</script>";
+    } else {
+        echo "<script type='text/javascript'>alert('". htmlspecialchars($response['error']) ."');</script>";
+    }
+}
+
 // Check if the form has been submitted
 if (isset($_POST["Retrain"])) {
     // Check if a dataset has been selected
@@ -23,17 +67,10 @@ if (isset($_POST["Retrain"])) {
     
         // Decode the JSON response from the Flask API
         $response = json_decode($result, true);
-        
-        if (isset($response['mse']) && isset($response['mae']) && isset($response['r2'])) {
-            // Display the metrics returned from Flask
-            $mse = $response['mse'];
-            $mae = $response['mae'];
-            $r2 = $response['r2'];
-    
-            
-        } else {
-            echo "<p>Error: " . htmlspecialchars($response['error']) . "</p>";
+        if (isset($response['job_id'])) {
+            follow_job($response, 'retrain');
         }
+        show_retrain_result($response);
     } else {
         echo "<p>No dataset selected.</p>";
     }
@@ -65,18 +102,36 @@ if (isset($_POST["Train"])) {
     
         // Decode the JSON response from the Flask API
         $response = json_decode($result, true);
-        
-        if (isset($response['update'])) {
-            // Display the metrics returned from Flask
-            $mse = $response['update'];
-           
-            echo "<script type='text/javascript'>alert('Model Exported Successfully');</script>";
-            
-        } else {
-            echo "<script type='text/javascript'>alert('". htmlspecialchars($response['error']) ."');</script>";
+        if (isset($response['job_id'])) {
+            follow_job($response, 'export');
         }
+        show_export_result($response);
     } else {
         echo "<script type='text/javascript'>alert('No Dataset Selected');</script>";
     }
 }
+
+
+// A queued training or export job, followed from the browser
+if (isset($_GET['job_id'])) {
+    $job = job_status($_GET['job_id']);
+    $is_export = isset($_GET['job_kind']) && $_GET['job_kind'] == 'export';
+
+    if ($job['status'] == 'queued' || $job['status'] == 'running') {
+        // Ask again in two seconds instead of keeping this request open until the job ends
+        header('Refresh: 2');
+        echo "<p>Training: " . round($job['progress'] * 100) . "% - " . htmlspecialchars($job['message']) . "</p>";
+    } else {
+        if ($job['status'] == 'finished') {
+            $response = $job['result'];
+        } else {
+            $response = ['error' => isset($job['error']) ? $job['error'] : 'Training job ' . $job['status']];
+        }
+        if ($is_export) {
+            show_export_result($response);
+        } else {
+            show_retrain_result($response);
+        }
+    }
+}
 ?>
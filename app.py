@@ -1,34 +1,414 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify
 import pandas as pd
-import pickle
 import os
-from statsmodels.tsa.statespace.sarimax import SARIMAX
-from sklearn.model_selection import train_test_split
-from sklearn.preprocessing import StandardScaler
-from sklearn.metrics import mean_squared_error, r2_score, mean_absolute_error
-from xgboost import XGBRegressor
-
-import numpy as np
-import warnings
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from sarima_cache import SarimaFitCache
+from forecasting import ForecastCurves, forecast_error_message, forecast_steps_to, forget_executor, ignore_sarima_warnings
+from forecast_table import ForecastTable
+from response_cache import ResponseCache
+from row_predictor import RowPredictor
+from dataset_store import StationDataset
+from dataset_cache import ColumnarDatasetCache
+from imputation import KNNImputation
+from prediction_log import PredictionLog
+from jobs import JobQueue
+from model_registry import ModelRegistry, ServingModel, file_fingerprint
+from model_artifacts import load_model_pair, load_times as artifact_load_times
+from metrics import (cache_events, errors_total, forecast_table_events, model_info, request_seconds, requests_total,
+                     response_cache_events, span, after_fork as metrics_after_fork, render as render_metrics)
 
 app = Flask(__name__)
 
-# Load the scaler and XGBoost model
-with open('xgb_scaler.pkl', 'rb') as file:
-    scaler = pickle.load(file)
-with open('xgb_model.pkl', 'rb') as file:
-    xgb_model = pickle.load(file)
+# Directory for persisted SARIMA fits, leave unset to keep the cache in memory only
+app.config['SARIMA_CACHE_DIR'] = os.environ.get('SARIMA_CACHE_DIR')
+
+# 'serial' fits the station x parameter grid in the request thread, 'process' uses a pool.
+# With several Flask workers on one host keep SARIMA_WORKERS * workers <= CPU count.
+app.config['SARIMA_EXECUTION'] = os.environ.get('SARIMA_EXECUTION', 'serial')
+app.config['SARIMA_WORKERS'] = int(os.environ.get('SARIMA_WORKERS', os.cpu_count() or 1))
+app.config['SARIMA_TASK_TIMEOUT'] = float(os.environ.get('SARIMA_TASK_TIMEOUT', 120))
+
+# Engine forecasting the fitted SARIMA models, see forecast_engines: 'statsmodels' or 'numpy'
+app.config['FORECAST_ENGINE'] = os.environ.get('FORECAST_ENGINE', 'statsmodels')
+
+# New months extend a cached SARIMA fit with its parameters kept; they are re-estimated after
+# SARIMA_REFIT_EVERY appended months or when the mean squared standardized forecast error of
+# the new months exceeds SARIMA_DEGRADE_THRESHOLD
+app.config['SARIMA_REFIT_EVERY'] = int(os.environ.get('SARIMA_REFIT_EVERY', 12))
+app.config['SARIMA_DEGRADE_THRESHOLD'] = float(os.environ.get('SARIMA_DEGRADE_THRESHOLD', 4.0))
+
+# Training jobs run in the background on this many threads per process. Their state is kept in the
+# SQLite database at JOBS_PATH, so every worker process can report and deduplicate them
+app.config['JOB_WORKERS'] = int(os.environ.get('JOB_WORKERS', 1))
+app.config['JOBS_PATH'] = os.environ.get('JOBS_PATH', 'jobs.sqlite3')
+
+# Optional warm-up at startup: 'imports' loads statsmodels, 'forecasts' also computes the forecast curves
+app.config['WARM_UP'] = os.environ.get('WARM_UP', '')
+
+# Months of SARIMA forecasts computed at once for every station and parameter
+app.config['FORECAST_HORIZON'] = int(os.environ.get('FORECAST_HORIZON', 36))
+
+# Table of the next FORECAST_TABLE_MONTHS months of forecasts per station, with the phytoplankton
+# prediction for FORECAST_TABLE_WEATHER ("Temperature,Humidity,Wind Speed", the training means if
+# unset), rebuilt in the background when the dataset or the serving model changes. 0 disables it.
+app.config['FORECAST_TABLE_MONTHS'] = int(os.environ.get('FORECAST_TABLE_MONTHS', 24))
+app.config['FORECAST_TABLE_PATH'] = os.environ.get('FORECAST_TABLE_PATH', 'forecast_table.npz')
+app.config['FORECAST_TABLE_WEATHER'] = os.environ.get('FORECAST_TABLE_WEATHER', '')
+
+# Responses of /model_testing and /predict_and_learn kept for RESPONSE_CACHE_TTL seconds, at most
+# RESPONSE_CACHE_SIZE of them (0 disables the cache). With RESPONSE_CACHE_PATH they are also stored in a
+# SQLite file that every worker reads, leave it unset to keep them in the memory of each process.
+app.config['RESPONSE_CACHE_SIZE'] = int(os.environ.get('RESPONSE_CACHE_SIZE', 1024))
+app.config['RESPONSE_CACHE_TTL'] = float(os.environ.get('RESPONSE_CACHE_TTL', 3600))
+app.config['RESPONSE_CACHE_PATH'] = os.environ.get('RESPONSE_CACHE_PATH')
+
+# /model_testing predicts a single row of the serving model's features straight from the JSON,
+# scaled inline and passed to the booster, instead of through a DataFrame; '0' always uses the DataFrame
+app.config['ROW_PREDICTOR'] = os.environ.get('ROW_PREDICTOR', '1') == '1'
+
+# Memory-mapped copies of the training columns of every dataset /retrain_model and /export_model
+# were given, kept until the dataset's contents change; leave empty to parse the CSV on every run
+app.config['DATASET_CACHE_DIR'] = os.environ.get('DATASET_CACHE_DIR', 'dataset_cache')
+
+# Training fills the missing water quality readings of a dataset with the mean of the
+# TRAINING_IMPUTE_NEIGHBORS nearest rows, as Data Cleaning.ipynb did with KNNImputer, instead of
+# dropping those rows; 0 keeps dropping them. IMPUTE_BY_STATION only compares rows of the same
+# station, IMPUTE_WORKERS threads share the distance computations and the filled values are kept in
+# IMPUTE_MEMO_DIR, so a dataset that gained rows only has its new rows imputed.
+app.config['TRAINING_IMPUTE_NEIGHBORS'] = int(os.environ.get('TRAINING_IMPUTE_NEIGHBORS', 0))
+app.config['IMPUTE_BY_STATION'] = os.environ.get('IMPUTE_BY_STATION', '0') == '1'
+app.config['IMPUTE_WORKERS'] = int(os.environ.get('IMPUTE_WORKERS', os.cpu_count() or 1))
+app.config['IMPUTE_MEMO_DIR'] = os.environ.get('IMPUTE_MEMO_DIR', 'imputation_memo')
+
+# Trained models are registered here as immutable versions
+app.config['MODEL_REGISTRY_DIR'] = os.environ.get('MODEL_REGISTRY_DIR', 'models')
+
+# Retraining continues boosting the serving model on rows it has not seen when 'incremental' is
+# requested (or RETRAIN_INCREMENTAL=1), and falls back to a full fit when the new rows drift more than
+# XGB_DRIFT_THRESHOLD standard deviations or the holdout MSE grows past XGB_ERROR_THRESHOLD times its own
+app.config['RETRAIN_INCREMENTAL'] = os.environ.get('RETRAIN_INCREMENTAL', '0') == '1'
+app.config['XGB_UPDATE_ROUNDS'] = int(os.environ.get('XGB_UPDATE_ROUNDS', 10))
+app.config['XGB_UPDATE_LEARNING_RATE'] = float(os.environ.get('XGB_UPDATE_LEARNING_RATE', 0.05))
+app.config['XGB_DRIFT_THRESHOLD'] = float(os.environ.get('XGB_DRIFT_THRESHOLD', 1.0))
+app.config['XGB_ERROR_THRESHOLD'] = float(os.environ.get('XGB_ERROR_THRESHOLD', 1.25))
+
+# RowPredictor of the serving version, built by the first /model_testing request after a swap
+row_predictor = None
 
 # Define the path to your CSV file
 csv_file_path = 'updated_dataset_with_predictions.csv'
 
+# Predictions are logged here instead of being appended to the training CSV
+app.config['PREDICTION_LOG_PATH'] = os.environ.get('PREDICTION_LOG_PATH', 'predictions.sqlite3')
+
 # List of station names
 station_names = ['Stn. I (Central West Bay)', 'Stn V (Northern West Bay)', 'Stn XIII (Taytay)', 'Stn XV (San Pedro)', 'Stn.XVI (Sta Rosa)',  'Stn XIX (Muntinlupa)']
 
+# Define SARIMA parameters
+sarima_order = (1, 1, 1)
+seasonal_order = (1, 1, 1, 12)  # Monthly data with yearly seasonality
+
+# List of parameters to model
+parameters = ['pH (units)', 'Ammonia (mg/L)', 'Inorganic Phosphate (mg/L)', 'BOD (mg/l)', 'Total coliforms (MPN/100ml)']
+
+
+def sarima_grid_options():
+    return {
+        'execution': app.config['SARIMA_EXECUTION'],
+        'workers': app.config['SARIMA_WORKERS'],
+        'timeout': app.config['SARIMA_TASK_TIMEOUT'],
+        'engine': app.config['FORECAST_ENGINE'],
+    }
+
+
+# Website inputs, in the order the scaler and XGBoost model expect them before the parameters
+weather_features = ['Temperature', 'Humidity', 'Wind Speed']
+
+# Features and target the models are trained on, the only columns training reads from a dataset
+training_columns = weather_features + parameters + ['Phytoplankton (cells/ml)']
+
+
+def warm_up(level='forecasts'):
+    """Preload the prediction path so the first request does not pay for it."""
+    import statsmodels.tsa.statespace.sarimax  # noqa: F401
+
+    # One prediction initialises XGBoost's predictor
+    model_version, xgb_model, scaler = serving_model.current
+    xgb_model.predict(scaler.transform(pd.DataFrame([scaler.mean_], columns=weather_features + parameters)))
+
+    if level == 'forecasts':
+        ignore_sarima_warnings()
+        dataset = station_dataset.get()
+        station_frames = {station_name: dataset.station_frame(station_name) for station_name in station_names}
+        curves, error = forecast_curves.get(dataset.signature, station_frames, parameters, **sarima_grid_options())
+        if error is not None:
+            print(f'Warm-up could not compute the forecast curves: {error}')
+
+
+def default_weather(scaler):
+    """Weather the forecast table predicts phytoplankton for, by feature."""
+    if app.config['FORECAST_TABLE_WEATHER']:
+        values = [float(value) for value in app.config['FORECAST_TABLE_WEATHER'].split(',')]
+    else:
+        values = scaler.mean_[:len(weather_features)].tolist()
+    return dict(zip(weather_features, values))
+
+
+def forecast_table_key(dataset, model_version):
+    return repr((dataset.signature, model_version, app.config['FORECAST_TABLE_MONTHS'], app.config['FORECAST_TABLE_WEATHER']))
+
+
+def build_forecast_table():
+    """Fill the forecast table for the current dataset and serving model, unless it already is."""
+    ignore_sarima_warnings()
+    model_version, xgb_model, scaler = serving_model.current
+    dataset = station_dataset.get()
+    key = forecast_table_key(dataset, model_version)
+    # Another worker may be building the same table, wait for it rather than computing it twice
+    with forecast_table.build_lock:
+        if forecast_table.current(key):
+            return {'built': False, 'model_version': model_version}
+
+        months = app.config['FORECAST_TABLE_MONTHS']
+        station_frames = {station_name: dataset.station_frame(station_name) for station_name in station_names}
+        target_date = max(frame.index[-1] for frame in station_frames.values()) + pd.DateOffset(months=months)
+        with span('forecast_table_build'):
+            curves, error = forecast_curves.get(dataset.signature, station_frames, parameters, target_date, **sarima_grid_options())
+            if error is not None:
+                raise RuntimeError(error)
+            forecast_table.build(key, station_frames, curves, parameters, xgb_model, scaler, default_weather(scaler), months)
+    return {'built': True, 'model_version': model_version, 'months': months}
+
+
+def run_forecast_table_build():
+    """Build the table on its executor, reporting a failure nobody waits for."""
+    try:
+        return build_forecast_table()
+    except Exception as e:
+        print(f'Could not build the forecast table: {e}')
+
+
+# Key of the last table build queued, so a failing build is not queued again by every request
+forecast_table_requested = None
+forecast_table_future = None
+
+
+def schedule_forecast_table(key):
+    """Queue a table build for the key unless one was already queued for it."""
+    global forecast_table_requested, forecast_table_future
+    if app.config['FORECAST_TABLE_MONTHS'] < 1 or forecast_table_requested == key:
+        return
+    forecast_table_requested = key
+    forecast_table_future = forecast_table_executor.submit(run_forecast_table_build)
+
+
+def wait_for_forecast_table():
+    """Block until the table build queued last has finished."""
+    if forecast_table_future is not None:
+        forecast_table_future.result()
+
+
+def forecast_table_rows(dataset, model_version, station_names, target_date):
+    """Table rows of the stations for the target month, None for those the table cannot answer."""
+    key = forecast_table_key(dataset, model_version)
+    rows = {station_name: forecast_table.lookup(key, station_name, target_date) for station_name in station_names}
+    if forecast_table.key != key:
+        schedule_forecast_table(key)
+    return rows
+
+
+def load_serving_model():
+    """Load the scaler and XGBoost model, the promoted version if there is one."""
+    active_version = model_registry.active_version()
+    if active_version is not None:
+        xgb_model, scaler = model_registry.load(active_version)
+    else:
+        # Native files written by convert_models.py, the pickles only if they were not converted
+        active_version = 'xgb_model'
+        xgb_model, scaler = load_model_pair('xgb_model.ubj', 'xgb_scaler.npz', 'xgb_model.pkl', 'xgb_scaler.pkl')
+    print(f'Loaded model {active_version} in {sum(artifact_load_times.values()):.3f}s')
+    model_info.set(1, version=active_version)
+    return active_version, xgb_model, scaler
+
+
+def start():
+    """Load the serving model, open the stores and queues and run the configured warm-up."""
+    global model_registry, promotion_mtime, serving_model, prediction_log, dataset_cache, training_imputer
+    global station_dataset, sarima_cache, forecast_curves, forecast_table, response_cache, training_jobs
+    global forecast_table_executor
+
+    # Trained models are registered here as immutable versions
+    model_registry = ModelRegistry(app.config['MODEL_REGISTRY_DIR'])
+
+    # active.json is stat'ed before the model is loaded, so a promotion made meanwhile is still picked up
+    promotion_mtime = model_registry.active_mtime()
+
+    # Requests take the (version, model, scaler) triple from here, promotion swaps it; the first
+    # request that needs the model, or the warm-up, loads it
+    serving_model = ServingModel(load_serving_model)
+
+    # Predictions are logged here instead of being appended to the training CSV
+    prediction_log = PredictionLog(app.config['PREDICTION_LOG_PATH'])
+
+    # Cached columnar copies of the datasets and the optional imputer training reads them through
+    dataset_cache = ColumnarDatasetCache(app.config['DATASET_CACHE_DIR'], training_columns) if app.config['DATASET_CACHE_DIR'] else None
+    training_imputer = KNNImputation(
+        n_neighbors=app.config['TRAINING_IMPUTE_NEIGHBORS'],
+        group_by='Monitoring Stations' if app.config['IMPUTE_BY_STATION'] else None,
+        workers=app.config['IMPUTE_WORKERS'],
+        memo_dir=app.config['IMPUTE_MEMO_DIR'],
+    ) if app.config['TRAINING_IMPUTE_NEIGHBORS'] > 0 else None
+
+    # Station rows shared by every request, reloaded only when the CSV changes.
+    # Logged predictions stay out of the SARIMA training rows.
+    station_dataset = StationDataset(csv_file_path, prediction_log, include_predictions=False)
+
+    # Fitted SARIMA models are reused until the rows of a station change
+    sarima_cache = SarimaFitCache(app.config['SARIMA_CACHE_DIR'], app.config['SARIMA_REFIT_EVERY'],
+                                  app.config['SARIMA_DEGRADE_THRESHOLD'])
+
+    # Forecast paths computed once per dataset snapshot and read by index for any target month
+    forecast_curves = ForecastCurves(sarima_cache, app.config['FORECAST_HORIZON'], sarima_order, seasonal_order)
+
+    # Precomputed forecasts and default-weather predictions, answered by lookup
+    forecast_table = ForecastTable(app.config['FORECAST_TABLE_PATH'])
+
+    # Responses keyed by request payload, serving model version and dataset snapshot
+    response_cache = ResponseCache(app.config['RESPONSE_CACHE_SIZE'], app.config['RESPONSE_CACHE_TTL'],
+                                   app.config['RESPONSE_CACHE_PATH'])
+
+    # Queue for /retrain_model and /export_model, polled through /jobs/<job_id>
+    training_jobs = JobQueue(app.config['JOBS_PATH'], app.config['JOB_WORKERS'])
+
+    # Forecast table builds run one at a time on their own thread, so they neither wait behind
+    # training jobs nor hold them up
+    forecast_table_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='forecast-table')
+
+    if app.config['WARM_UP']:
+        warm_up(app.config['WARM_UP'])
+
+    if app.config['WARM_UP'] == 'forecasts':
+        schedule_forecast_table(forecast_table_key(station_dataset.get(), serving_model.current[0]))
+
+
+# Pool workers spawned for SARIMA_EXECUTION=process run the script started as `python app.py` again,
+# as __mp_main__, before taking tasks; they only need forecasting's functions, not a second server
+if __name__ != '__mp_main__':
+    start()
+
+
+def after_fork():
+    """Reset what a worker forked from a preloading master cannot share with it (see gunicorn.conf.py).
+
+    Only the forking thread exists in the worker, so any lock another thread
+    of the master held at the fork would stay held forever; they are replaced.
+    """
+    global forecast_table_executor, forecast_table_requested, forecast_table_future, promotion_lock
+    training_jobs.after_fork()
+    forget_executor()
+    forecast_table_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='forecast-table')
+    forecast_table_requested = None
+    forecast_table_future = None
+    forecast_table.after_fork()
+    forecast_curves.after_fork()
+    sarima_cache.after_fork()
+    station_dataset.after_fork()
+    serving_model.after_fork()
+    prediction_log.after_fork()
+    model_registry.after_fork()
+    response_cache.after_fork()
+    if dataset_cache is not None:
+        dataset_cache.after_fork()
+    metrics_after_fork()
+    promotion_lock = threading.Lock()
+
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+
+# Held while this worker loads a version promoted elsewhere, so it is loaded once
+promotion_lock = threading.Lock()
+
+
+@app.before_request
+def follow_promotions():
+    """Serve the version another worker promoted, noticed by the mtime of active.json."""
+    global promotion_mtime
+    mtime = model_registry.active_mtime()
+    if mtime == promotion_mtime:
+        return
+    with promotion_lock:
+        if mtime == promotion_mtime:
+            return
+        try:
+            version = model_registry.active_version()
+            # Before the model is loaded there is nothing to swap, the first load reads active.json
+            if version is not None and serving_model.version not in (None, version):
+                xgb_model, scaler = model_registry.load(version)
+                serve_version(version, xgb_model, scaler)
+                print(f'Serving model {version} promoted by another worker')
+        except Exception as e:
+            print(f'Could not load the promoted model: {e}')
+        promotion_mtime = mtime
+
+
+@app.after_request
+def record_request_metrics(response):
+    endpoint = request.endpoint or 'unknown'
+    if endpoint == 'prometheus_metrics':
+        return response
+    request_seconds.observe(time.perf_counter() - g.request_start, endpoint=endpoint)
+    # Requests answered before the model is loaded carry an empty version, reading it here would load it
+    requests_total.inc(endpoint=endpoint, status=response.status_code, model_version=serving_model.version or '')
+
+    # Most endpoints report errors in the body with a 200 status
+    failed = response.status_code >= 400
+    if not failed and response.is_json:
+        body = response.get_json(silent=True)
+        failed = isinstance(body, dict) and (body.get('status') == 'Error' or 'error' in body)
+    if failed:
+        errors_total.inc(endpoint=endpoint)
+    return response
+
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    cache_events.set(sarima_cache.hits, event='hit')
+    cache_events.set(sarima_cache.misses, event='miss')
+    cache_events.set(sarima_cache.extensions, event='extend')
+    cache_events.set(sarima_cache.refits, event='refit')
+    forecast_table_events.set(forecast_table.hits, event='hit')
+    forecast_table_events.set(forecast_table.misses, event='miss')
+    forecast_table_events.set(forecast_table.builds, event='build')
+    response_cache_events.set(response_cache.hits, event='hit')
+    response_cache_events.set(response_cache.shared_hits, event='shared_hit')
+    response_cache_events.set(response_cache.misses, event='miss')
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+
+
 @app.route('/predict_and_learn', methods=['POST'])
 def predict_and_learn():
     try:
         data = request.get_json()
+
+        # Model and scaler used for the whole request, even if a new version is promoted meanwhile
+        model_version, xgb_model, scaler = serving_model.current
+
+        # Cleaned, date-indexed rows of each station, parsed once per change of the CSV
+        dataset = station_dataset.get()
+
+        # The same inputs against the same model and data give the same response; it is logged again all the same
+        cache_key = response_cache.key('predict_and_learn', data, model_version, dataset.signature)
+        cached = response_cache.get(cache_key)
+        if cached is not None:
+            with span('prediction_log_write'):
+                prediction_log.append_many(cached['log_rows'])
+            return jsonify(cached['response'])
+
         web_df = pd.DataFrame(data)
         
         # Extract and remove the 'Date' column from web_df
@@ -38,62 +418,36 @@ def predict_and_learn():
             return jsonify({'status': 'Error', 'message': 'Date column is missing in the input data'})
 
         # Warnings management
-        warnings.filterwarnings("ignore", message="Non-invertible starting MA parameters found. Using zeros as starting parameters.")
-        warnings.filterwarnings("ignore", message="A date index has been provided, but it has no associated frequency information and so will be ignored when e.g. forecasting.")
-        warnings.filterwarnings("ignore", message="No supported index is available. Prediction results will be given with an integer index beginning at `start`.")
-        warnings.filterwarnings("ignore", message="No supported index is available. In the next version, calling this method in a model without a supported index will result in an exception.")
-
-        # Define SARIMA parameters
-        sarima_order = (1, 1, 1)
-        seasonal_order = (1, 1, 1, 12)  # Monthly data with yearly seasonality
-        
-        # Initialize dictionaries for models and forecasts
-        sarima_models = {}
-        forecasts = {}
-        
-        # List of parameters to model
-        parameters = ['pH (units)', 'Ammonia (mg/L)', 'Inorganic Phosphate (mg/L)', 'BOD (mg/l)', 'Total coliforms (MPN/100ml)']
-        
-        # Load dataset and process for each station
+        ignore_sarima_warnings()
+
+        station_frames = {station_name: dataset.station_frame(station_name) for station_name in station_names}
+
+        # Define the target date for prediction
+        target_date = pd.Timestamp(selected_date)
+
+        # Precomputed forecasts when the table covers the month, the forecast curves otherwise
+        table_rows = forecast_table_rows(dataset, model_version, station_names, target_date)
+        if any(row is None for row in table_rows.values()):
+            # Forecast curves of every station and parameter, fitted only when the data changed
+            with span('forecast_curves'):
+                curves, error = forecast_curves.get(dataset.signature, station_frames, parameters, target_date, **sarima_grid_options())
+            if error is not None:
+                return jsonify({'status': 'Error', 'message': error})
+
         results = {}
+        log_rows = []
         for station_name in station_names:
-            # Load dataset for SARIMA
-            merged_df = pd.read_csv(csv_file_path)
-            merged_df = merged_df[merged_df['Monitoring Stations'] == station_name]
-            
-            # Drop rows with missing values
-            merged_df.dropna(inplace=True)
-
-            # Ensure there's a Date column for time series forecasting
-            merged_df['Date'] = pd.to_datetime(merged_df[['Year', 'Month']].assign(DAY=1))
-            merged_df.set_index('Date', inplace=True)
-            
-            # Fit SARIMA models
-            for parameter in parameters:
-                try:
-                    sarima_model = SARIMAX(merged_df[parameter], order=sarima_order, seasonal_order=seasonal_order)
-                    sarima_model_fit = sarima_model.fit(disp=False)
-                    sarima_models[parameter] = sarima_model_fit
-                except Exception as e:
-                    return jsonify({'status': 'Error', 'message': f'An error occurred while fitting the model for {parameter} at {station_name}: {e}'})
-
-            # Define the target date for prediction
-            target_date = pd.Timestamp(selected_date)
-            
-            # Calculate number of periods from the last observed date to the target date
-            last_date = merged_df.index[-1]
-            forecast_steps = (target_date.year - last_date.year) * 12 + (target_date.month - last_date.month)
-            
-            # Forecast for the target date
-            forecast_results = {}
-            for parameter in parameters:
-                try:
-                    model_fit = sarima_models[parameter]
-                    forecast = model_fit.get_forecast(steps=forecast_steps).predicted_mean
-                    forecast_value = float(forecast.values[-1])  # Convert to Python float
-                    forecast_results[parameter] = forecast_value
-                except Exception as e:
-                    return jsonify({'status': 'Error', 'message': f'Error in SARIMA for {parameter} at {station_name}: {e}'})
+            if table_rows[station_name] is not None:
+                forecast_results = dict(table_rows[station_name][0])
+            else:
+                # Read the target month from each curve
+                last_date = station_frames[station_name].index[-1]
+                forecast_results = {}
+                for parameter in parameters:
+                    try:
+                        forecast_results[parameter] = ForecastCurves.value(curves[station_name][parameter], last_date, target_date)
+                    except Exception as e:
+                        return jsonify({'status': 'Error', 'message': forecast_error_message(parameter, station_name, e)})
             
             # Convert the results to a DataFrame with parameters as columns and target date as a column
             forecast_df = pd.DataFrame([forecast_results])
@@ -101,35 +455,22 @@ def predict_and_learn():
             combined_df = pd.concat([web_df, forecast_df], axis=1)
 
             # Standardize the combined input
-            combined_scaled = scaler.transform(combined_df)
+            with span('scaler_transform', station=station_name):
+                combined_scaled = scaler.transform(combined_df)
 
             # Make prediction using XGBoost model
-            prediction = xgb_model.predict(combined_scaled)
-            combined_df['Phytoplankton (cells/ml)'] = [float(p) for p in prediction]  # Convert to Python float
-            
-            # Format the date as 'MM/DD/YYYY'
-            formatted_date = target_date.strftime('%m/%d/%Y')
-            
-            # Create a new DataFrame with the Date column
-            date_df = pd.DataFrame({'Date': [formatted_date]})
-            station_df = pd.DataFrame({'Monitoring Stations': [station_name]})
-            
-            # Concatenate the date_df with combined_df along the columns
-            combined_df = pd.concat([combined_df, date_df, station_df], axis=1)
-
-            # Save the new data with prediction to the CSV file
-            if os.path.exists(csv_file_path):
-                # Load the existing dataset to ensure columns match
-                existing_df = pd.read_csv(csv_file_path)
-                
-                # Reorder combined_df to match the order of columns in existing_df
-                combined_df = combined_df.reindex(columns=existing_df.columns)
-                
-                # Append the data to the CSV file
-                combined_df.to_csv(csv_file_path, mode='a', header=False, index=False)
-            else:
-                # If the file does not exist, save the combined_df as a new CSV
-                combined_df.to_csv(csv_file_path, mode='w', header=True, index=False)
+            with span('xgb_predict', station=station_name):
+                prediction = xgb_model.predict(combined_scaled)
+
+            # Queue the inputs, forecasts and prediction for the prediction log
+            log_rows.append({
+                'station': station_name,
+                'date': target_date,
+                'inputs': {k: float(v) for k, v in web_df.iloc[0].items()},
+                'forecasts': forecast_results,
+                'prediction': float(prediction[0]),
+                'model_version': model_version,
+            })
             
             forecast_df_dict = forecast_df.to_dict(orient='records')[0]
             results[station_name] = {
@@ -137,6 +478,100 @@ def predict_and_learn():
                 'forecast': {k: float(v) for k, v in forecast_df_dict.items()}
             }
         
+        # Save every station's prediction in one batch, away from the training dataset
+        with span('prediction_log_write'):
+            prediction_log.append_many(log_rows)
+
+        response = {
+            'status': 'Prediction made and saved successfully',
+            'results': results
+        }
+        response_cache.put(cache_key, {
+            'response': response,
+            'log_rows': [{**row, 'date': row['date'].isoformat()} for row in log_rows],
+        })
+        return jsonify(response)
+
+    except Exception as e:
+        return jsonify({'status': 'Error', 'message': str(e)}), 500
+
+
+@app.route('/predict_batch', methods=['POST'])
+def predict_batch():
+    try:
+        data = request.get_json()
+        rows = data.get('rows') or []
+        if not rows:
+            return jsonify({'status': 'Error', 'message': 'No rows in the input data'})
+        for row in rows:
+            missing = [column for column in ['Date'] + weather_features if column not in row]
+            if missing:
+                return jsonify({'status': 'Error', 'message': f'Missing {", ".join(missing)} in row {row}'})
+
+        selected_stations = data.get('stations') or station_names
+        unknown = [station_name for station_name in selected_stations if station_name not in station_names]
+        if unknown:
+            return jsonify({'status': 'Error', 'message': f'Unknown stations: {", ".join(unknown)}'})
+
+        ignore_sarima_warnings()
+
+        model_version, xgb_model, scaler = serving_model.current
+        dataset = station_dataset.get()
+        station_frames = {station_name: dataset.station_frame(station_name) for station_name in selected_stations}
+        target_dates = [pd.Timestamp(row['Date']) for row in rows]
+
+        # Precomputed forecasts where the table covers the month, one forecast curve per series
+        # up to the furthest date serves the other rows
+        table_rows = {target_date: forecast_table_rows(dataset, model_version, selected_stations, target_date)
+                      for target_date in set(target_dates)}
+        if any(row is None for month_rows in table_rows.values() for row in month_rows.values()):
+            with span('forecast_curves'):
+                curves, error = forecast_curves.get(dataset.signature, station_frames, parameters, max(target_dates), **sarima_grid_options())
+            if error is not None:
+                return jsonify({'status': 'Error', 'message': error})
+
+        # Build a single feature matrix with one line per row and station
+        keys = []
+        feature_rows = []
+        for row, target_date in zip(rows, target_dates):
+            for station_name in selected_stations:
+                last_date = station_frames[station_name].index[-1]
+                if forecast_steps_to(last_date, target_date) < 1:
+                    return jsonify({'status': 'Error', 'message': f'{target_date.date()} is not after the last observation at {station_name}'})
+                table_row = table_rows[target_date][station_name]
+                if table_row is not None:
+                    forecast_results = dict(table_row[0])
+                else:
+                    forecast_results = {parameter: ForecastCurves.value(curves[station_name][parameter], last_date, target_date) for parameter in parameters}
+                keys.append((target_date, station_name, row, forecast_results))
+                feature_rows.append([float(row[column]) for column in weather_features] + [forecast_results[parameter] for parameter in parameters])
+
+        combined_df = pd.DataFrame(feature_rows, columns=weather_features + parameters)
+        with span('scaler_transform'):
+            combined_scaled = scaler.transform(combined_df)
+        with span('xgb_predict'):
+            predictions = xgb_model.predict(combined_scaled)
+
+        results = []
+        log_rows = []
+        for (target_date, station_name, row, forecast_results), prediction in zip(keys, predictions):
+            results.append({
+                'Date': target_date.strftime('%Y-%m-%d'),
+                'station': station_name,
+                'prediction': float(prediction),
+                'forecast': forecast_results
+            })
+            log_rows.append({
+                'station': station_name,
+                'date': target_date,
+                'inputs': {column: float(row[column]) for column in weather_features},
+                'forecasts': forecast_results,
+                'prediction': float(prediction),
+                'model_version': model_version,
+            })
+        with span('prediction_log_write'):
+            prediction_log.append_many(log_rows)
+
         return jsonify({
             'status': 'Prediction made and saved successfully',
             'results': results
@@ -146,65 +581,300 @@ def predict_and_learn():
         return jsonify({'status': 'Error', 'message': str(e)}), 500
 
 
+@app.route('/forecast_curve', methods=['GET'])
+def forecast_curve():
+    try:
+        selected_stations = request.args.getlist('station') or station_names
+        selected_parameters = request.args.getlist('parameter') or parameters
+        unknown = [name for name in selected_stations if name not in station_names]
+        unknown += [name for name in selected_parameters if name not in parameters]
+        if unknown:
+            return jsonify({'status': 'Error', 'message': f'Unknown stations or parameters: {", ".join(unknown)}'})
+
+        ignore_sarima_warnings()
+
+        dataset = station_dataset.get()
+        station_frames = {station_name: dataset.station_frame(station_name) for station_name in selected_stations}
+        curves, error = forecast_curves.get(dataset.signature, station_frames, parameters, **sarima_grid_options())
+        if error is not None:
+            return jsonify({'status': 'Error', 'message': error})
+
+        results = {}
+        for station_name in selected_stations:
+            last_date = station_frames[station_name].index[-1]
+            curve_length = min(len(curves[station_name][parameter]) for parameter in selected_parameters)
+            dates = pd.date_range(last_date + pd.DateOffset(months=1), periods=curve_length, freq='MS')
+            results[station_name] = {
+                'dates': [date.strftime('%Y-%m-%d') for date in dates],
+                'forecast': {parameter: curves[station_name][parameter][:curve_length].tolist() for parameter in selected_parameters}
+            }
+
+        return jsonify({'status': 'Success', 'results': results})
+
+    except Exception as e:
+        return jsonify({'status': 'Error', 'message': str(e)}), 500
+
+
+@app.route('/forecast_table', methods=['GET'])
+def forecast_table_endpoint():
+    """Forecasts and the phytoplankton prediction for the default weather of one month, per station."""
+    try:
+        if not request.args.get('date'):
+            return jsonify({'status': 'Error', 'message': 'date is missing'})
+        target_date = pd.Timestamp(request.args['date'])
+        selected_stations = request.args.getlist('station') or station_names
+        unknown = [name for name in selected_stations if name not in station_names]
+        if unknown:
+            return jsonify({'status': 'Error', 'message': f'Unknown stations: {", ".join(unknown)}'})
+
+        model_version, xgb_model, scaler = serving_model.current
+        dataset = station_dataset.get()
+        table_rows = forecast_table_rows(dataset, model_version, selected_stations, target_date)
+
+        results = {}
+        live = [station_name for station_name in selected_stations if table_rows[station_name] is None]
+        if live:
+            # Outside the table, or the table is being rebuilt: forecast like /predict_and_learn
+            ignore_sarima_warnings()
+            station_frames = {station_name: dataset.station_frame(station_name) for station_name in live}
+            with span('forecast_curves'):
+                curves, error = forecast_curves.get(dataset.signature, station_frames, parameters, target_date, **sarima_grid_options())
+            if error is not None:
+                return jsonify({'status': 'Error', 'message': error})
+            weather = default_weather(scaler)
+            feature_rows = []
+            for station_name in live:
+                last_date = station_frames[station_name].index[-1]
+                forecast_results = {}
+                for parameter in parameters:
+                    try:
+                        forecast_results[parameter] = ForecastCurves.value(curves[station_name][parameter], last_date, target_date)
+                    except Exception as e:
+                        return jsonify({'status': 'Error', 'message': forecast_error_message(parameter, station_name, e)})
+                results[station_name] = {'forecast': forecast_results, 'source': 'live'}
+                feature_rows.append(list(weather.values()) + [forecast_results[parameter] for parameter in parameters])
+            with span('xgb_predict'):
+                predictions = xgb_model.predict(scaler.transform(pd.DataFrame(feature_rows, columns=weather_features + parameters)))
+            for station_name, prediction in zip(live, predictions):
+                results[station_name]['prediction'] = float(prediction)
+
+        for station_name in selected_stations:
+            if table_rows[station_name] is not None:
+                forecast_results, prediction = table_rows[station_name]
+                results[station_name] = {'forecast': forecast_results, 'prediction': prediction, 'source': 'table'}
+
+        return jsonify({
+            'status': 'Success',
+            'date': target_date.strftime('%Y-%m-%d'),
+            'model_version': model_version,
+            'weather': default_weather(scaler),
+            'results': {station_name: results[station_name] for station_name in selected_stations}
+        })
+
+    except Exception as e:
+        return jsonify({'status': 'Error', 'message': str(e)}), 500
+
+
+@app.route('/predictions', methods=['GET'])
+def predictions():
+    try:
+        rows = prediction_log.query(
+            station=request.args.get('station'),
+            start=request.args.get('start'),
+            end=request.args.get('end'),
+            limit=request.args.get('limit'))
+        return jsonify({'status': 'Success', 'predictions': rows})
+    except Exception as e:
+        return jsonify({'status': 'Error', 'message': str(e)}), 500
+
+
+def current_row_predictor(version, xgb_model, scaler):
+    """The RowPredictor of a serving version, rebuilt when the version changed."""
+    global row_predictor
+    predictor = row_predictor
+    if predictor is None or predictor.version != version:
+        predictor = row_predictor = RowPredictor(version, xgb_model, scaler)
+    return predictor
+
+
 @app.route('/model_testing', methods=['POST'])
 def model_testing():
     data = request.get_json()
-    df = pd.DataFrame(data)
+    model_version, xgb_model, scaler = serving_model.current
+    cache_key = response_cache.key('model_testing', data, model_version)
+    cached = response_cache.get(cache_key)
+    if cached is not None:
+        return jsonify(cached)
+
+    predictor = current_row_predictor(model_version, xgb_model, scaler) if app.config['ROW_PREDICTOR'] else None
+    values = predictor.row(data) if predictor is not None else None
+    if values is not None:
+        with span('row_predict'):
+            prediction = predictor.predict(values)
+    else:
+        df = pd.DataFrame(data)
+
+        # Standardize the input
+        with span('scaler_transform'):
+            df_scaled = scaler.transform(df)
+
+        # Make prediction
+        with span('xgb_predict'):
+            prediction = xgb_model.predict(df_scaled)
+
+    response = {'status': 'Prediction made and saved successfully', 'prediction': prediction.tolist()}
+    response_cache.put(cache_key, response)
+    return jsonify(response)
+
+
+def training_fingerprint(dataset_path, include_predictions):
+    """Fingerprint of the data a training run would see."""
+    fingerprint = dataset_cache.content_hash(dataset_path) if dataset_cache is not None else file_fingerprint(dataset_path)
+    if training_imputer is not None:
+        fingerprint = f'{fingerprint}~{training_imputer.key}'
+    if include_predictions:
+        fingerprint = f'{fingerprint}+{prediction_log.last_id()}'
+    return fingerprint
+
+
+def update_serving_model(job, dataset_path, include_predictions):
+    """Continue boosting the serving model on the new rows of the dataset.
+
+    Returns (version, metrics, extra) of the update, or (version, metrics, None)
+    of the serving version when the dataset has no new rows. Raises
+    FullRetrainNeeded when the serving model cannot be updated.
+    """
+    from training import FullRetrainNeeded, update_xgb_model
+
+    base_version, base_model, base_scaler = serving_model.current
+    base_rows = model_registry.rows(base_version)
+    if base_rows is None:
+        raise FullRetrainNeeded(f"Version '{base_version}' has no record of the rows it was trained on")
+
+    updated = update_xgb_model(dataset_path, base_model, base_scaler, base_rows, prediction_log,
+                               include_predictions, rounds=app.config['XGB_UPDATE_ROUNDS'],
+                               learning_rate=app.config['XGB_UPDATE_LEARNING_RATE'],
+                               drift_threshold=app.config['XGB_DRIFT_THRESHOLD'],
+                               error_threshold=app.config['XGB_ERROR_THRESHOLD'], progress=job.update,
+                               dataset_cache=dataset_cache, imputer=training_imputer)
+    if updated is None:
+        return base_version, model_registry.metadata(base_version)['metrics'], None
+    xgb_model, scaler, metrics, rows = updated
+    job.update(0.95, 'Registering model')
+    extra = {
+        'include_predictions': include_predictions,
+        'training': 'incremental',
+        'base_version': base_version,
+        'new_rows': sum(len(rows[name]) - len(base_rows[name]) for name in ('trained', 'holdout')),
+    }
+    version = model_registry.register(xgb_model, scaler, metrics, training_fingerprint(dataset_path, include_predictions),
+                                      os.path.basename(dataset_path), extra=extra, rows=rows)
+    return version, metrics, extra
+
+
+def train_and_register(job, dataset_path, include_predictions, incremental=False):
+    """Train on the dataset and store the result as a new registry version.
+
+    With incremental, the serving model is updated on the new rows instead
+    when it can be; otherwise the reason is recorded with the full retrain.
+    Returns the version, its metrics and how it was trained.
+    """
+    # Training dependencies are only imported by the workers that train
+    from training import FullRetrainNeeded, train_xgb_model
+
+    extra = {'include_predictions': include_predictions, 'training': 'full'}
+    if incremental:
+        try:
+            version, metrics, update = update_serving_model(job, dataset_path, include_predictions)
+            if update is None:
+                return version, metrics, {'training': 'none', 'reason': 'No new rows since this version'}
+            return version, metrics, update
+        except FullRetrainNeeded as e:
+            extra['full_retrain_reason'] = str(e)
+
+    fingerprint = training_fingerprint(dataset_path, include_predictions)
+    xgb_model, scaler, metrics, rows = train_xgb_model(dataset_path, prediction_log, include_predictions,
+                                                       progress=job.update, dataset_cache=dataset_cache,
+                                                       imputer=training_imputer)
+    job.update(0.95, 'Registering model')
+    version = model_registry.register(xgb_model, scaler, metrics, fingerprint, os.path.basename(dataset_path),
+                                      extra=extra, rows=rows)
+    return version, metrics, extra
+
+
+def run_retrain_job(job, dataset_path, include_predictions, promote, incremental):
+    """Train and register a version, reporting its metrics."""
+    version, metrics, training = train_and_register(job, dataset_path, include_predictions, incremental)
+    if promote:
+        promote_version(version)
+    response_cache.clear()
+    return {**metrics, 'version': version, 'training': training}
+
+
+def run_export_job(job, dataset_path, include_predictions, promote, incremental):
+    """Export the version trained on this dataset, training it only if it is not registered yet."""
+    fingerprint = training_fingerprint(dataset_path, include_predictions)
+    version = model_registry.find(fingerprint, include_predictions=include_predictions)
+    if version is None:
+        version, metrics, _ = train_and_register(job, dataset_path, include_predictions, incremental)
+    else:
+        metrics = model_registry.metadata(version)['metrics']
+
+    # Save the trained model and scaler to standalone files
+    job.update(0.98, 'Saving model')
+    model_registry.export(version, 'xgb_model2.ubj', 'xgb_scaler2.npz')
+    print("Model saved to 'xgb_model2.ubj'")
+
+    if promote:
+        promote_version(version)
+    response_cache.clear()
+    return {'update': 'Model Export Success', 'version': version, **metrics}
+
+
+def serve_version(version, xgb_model, scaler):
+    """Swap the serving pair of this process."""
+    serving_model.swap(version, xgb_model, scaler)
+    model_info.clear()
+    model_info.set(1, version=version)
+
+
+def promote_version(version):
+    """Make a registered version the serving model, here and, through active.json, in the other workers."""
+    xgb_model, scaler = model_registry.load(version)
+    model_registry.promote(version)
+    serve_version(version, xgb_model, scaler)
+    response_cache.clear()
+    schedule_forecast_table(forecast_table_key(station_dataset.get(), version))
+
+
+def enqueue_training_job(kind, job_fn):
+    """Validate the requested dataset and queue a training job for it."""
+    # Get the dataset name from the request
+    data = request.get_json()
+    dataset_name = data.get('dataset')
+    include_predictions = bool(data.get('include_predictions'))
+    promote = bool(data.get('promote'))
+    incremental = bool(data.get('incremental', app.config['RETRAIN_INCREMENTAL']))
+    
+    # Construct the full path to the dataset
+    dataset_path = os.path.join(app.root_path, dataset_name)
+    
+    # Check if the file exists
+    if not os.path.exists(dataset_path):
+        return jsonify({"error": f"Dataset file '{dataset_name}' not found."})
 
-    # Standardize the input
-    df_scaled = scaler.transform(df)
+    # Identical requests for an unchanged dataset share one pending job
+    stat = os.stat(dataset_path)
+    key = (kind, dataset_path, include_predictions, promote, incremental, stat.st_mtime_ns, stat.st_size)
+    job, created = training_jobs.submit(kind, key, job_fn, dataset_path, include_predictions, promote, incremental)
 
-    # Make prediction
-    prediction = xgb_model.predict(df_scaled)
-   
-    return jsonify({'status': 'Prediction made and saved successfully', 'prediction': prediction.tolist()})
+    return jsonify({'job_id': job.id, 'status': job.status, 'deduplicated': not created}), 202
 
 
 @app.route('/retrain_model', methods=['POST'])
 def retrain_model():
     try:
-        # Get the dataset name from the request
-        data = request.get_json()
-        dataset_name = data.get('dataset')
-        
-        # Construct the full path to the dataset
-        dataset_path = os.path.join(app.root_path, dataset_name)
-        
-        # Check if the file exists
-        if not os.path.exists(dataset_path):
-            return jsonify({"error": f"Dataset file '{dataset_name}' not found."})
-        
-        # Load the dataset
-        merged_df = pd.read_csv(dataset_path)
-        merged_df = merged_df.dropna()
-    
-        # Select features and target
-        features = ['Temperature', 'Humidity', 'Wind Speed', 'pH (units)', 'Ammonia (mg/L)', 'Inorganic Phosphate (mg/L)', 'BOD (mg/l)', 'Total coliforms (MPN/100ml)']
-        target = 'Phytoplankton (cells/ml)'
-    
-        # Perform train/test split
-        X = merged_df[features]
-        y = merged_df[target]
-        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
-    
-        # Standardize the features
-        scaler = StandardScaler()
-        X_train_scaled = scaler.fit_transform(X_train)
-        X_test_scaled = scaler.transform(X_test)
-    
-        # Train XGBoost model
-        xgb_model = XGBRegressor()
-        xgb_model.fit(X_train_scaled, y_train)
-        y_pred_xgb = xgb_model.predict(X_test_scaled)
-    
-        # Calculate metrics
-        mse_xgb = mean_squared_error(y_test, y_pred_xgb)
-        mae_xgb = mean_absolute_error(y_test, y_pred_xgb)
-        r2_xgb = r2_score(y_test, y_pred_xgb)
-    
-        # Return the metrics to the PHP website
-        return jsonify({'mse': mse_xgb, 'mae': mae_xgb, 'r2': r2_xgb})
-    
+        return enqueue_training_job('retrain', run_retrain_job)
     except Exception as e:
         return jsonify({"error": str(e)})   
 
@@ -212,64 +882,47 @@ def retrain_model():
 @app.route('/export_model', methods=['POST'])
 def export_model():
     try:
-        # Get the dataset name from the request
-        data = request.get_json()
-        dataset_name = data.get('dataset')
-        
-        # Construct the full path to the dataset
-        dataset_path = os.path.join(app.root_path, dataset_name)
-        
-        # Check if the file exists
-        if not os.path.exists(dataset_path):
-            return jsonify({"error": f"Dataset file '{dataset_name}' not found."})
-        
-        # Load the dataset
-        merged_df = pd.read_csv(dataset_path)
-        merged_df = merged_df.dropna()
-    
-        # Select features and target
-        features = ['Temperature', 'Humidity', 'Wind Speed', 'pH (units)', 'Ammonia (mg/L)', 'Inorganic Phosphate (mg/L)', 'BOD (mg/l)', 'Total coliforms (MPN/100ml)']
-        target = 'Phytoplankton (cells/ml)'
-    
-        # Perform train/test split
-        X = merged_df[features]
-        y = merged_df[target]
-        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
-    
-        # Standardize the features
-        scaler = StandardScaler()
-        X_train_scaled = scaler.fit_transform(X_train)
-        X_test_scaled = scaler.transform(X_test)
-    
-        # Train XGBoost model
-        xgb_model = XGBRegressor()
-        xgb_model.fit(X_train_scaled, y_train)
-        y_pred_xgb = xgb_model.predict(X_test_scaled)
-    
-        # Calculate metrics
-        mse_xgb = mean_squared_error(y_test, y_pred_xgb)
-        mae_xgb = mean_absolute_error(y_test, y_pred_xgb)
-        r2_xgb = r2_score(y_test, y_pred_xgb)
-        # Save the trained model to a file using pickle
-        with open('xgb_model2.pkl', 'wb') as file:
-            pickle.dump(xgb_model, file)
-        
-        print("Model saved to 'xgb_model2.pkl'")
+        return enqueue_training_job('export', run_export_job)
+    except Exception as e:
+        return jsonify({"error": str(e)}) 
 
-        with open('xgb_model2.pkl', 'rb') as file:
-            loaded_svr_model = pickle.load(file)
 
-        with open('xgb_scaler2.pkl', 'wb') as file:
-            pickle.dump(scaler, file)
-    
-        # Return the metrics to the PHP website
-        return jsonify({'update': 'Model Export Success'})
-    
+@app.route('/models', methods=['GET'])
+def list_models():
+    return jsonify({
+        'serving': serving_model.current[0],
+        'active': model_registry.active_version(),
+        'load_times': artifact_load_times,
+        'versions': model_registry.versions()
+    })
+
+
+@app.route('/models/<version>/promote', methods=['POST'])
+def promote_model(version):
+    try:
+        promote_version(version)
+        return jsonify({'status': 'Promoted', 'version': version})
+    except KeyError as e:
+        return jsonify({'error': e.args[0]}), 404
     except Exception as e:
-        return jsonify({"error": str(e)}) 
-        
+        return jsonify({'error': str(e)})
 
 
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    job = training_jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': f"Job '{job_id}' not found."}), 404
+    return jsonify(job.to_dict())
+
+
+@app.route('/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    job = training_jobs.cancel(job_id)
+    if job is None:
+        return jsonify({'error': f"Job '{job_id}' not found."}), 404
+    return jsonify(job.to_dict())
+        
 
 if __name__ == '__main__':
     app.run(debug=True)
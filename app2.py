@@ -1,18 +1,57 @@
 import os
 import pandas as pd
 from flask import Flask, request, redirect, url_for, render_template, flash
-from sklearn.model_selection import train_test_split, GridSearchCV
-from sklearn.svm import SVR
+from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import StandardScaler
 from sklearn.metrics import mean_squared_error, mean_absolute_error, r2_score
 import pickle
-import re
+from weather_pipeline import MonthlyWeatherStore, mean_columns, mode_columns
+from imputation import KNNImputation
+from svr_search import grid_search, halving_search
 
 app = Flask(__name__)
 app.config['UPLOAD_FOLDER'] = 'uploads/'
 app.secret_key = 'your_secret_key'
+# Monthly weather aggregates of past uploads, reused for months whose hourly rows did not change
+app.config['WEATHER_MONTHLY_PATH'] = os.environ.get('WEATHER_MONTHLY_PATH', 'weather_monthly.sqlite3')
+# SVR hyperparameter search: 'grid' tries all 72 configurations on 5 folds, 'halving' drops
+# the weaker ones fold by fold and stops at SVR_SEARCH_SECONDS or SVR_SEARCH_FITS if set
+app.config['SVR_SEARCH'] = os.environ.get('SVR_SEARCH', 'grid')
+app.config['SVR_SEARCH_SECONDS'] = float(os.environ['SVR_SEARCH_SECONDS']) if os.environ.get('SVR_SEARCH_SECONDS') else None
+app.config['SVR_SEARCH_FITS'] = int(os.environ['SVR_SEARCH_FITS']) if os.environ.get('SVR_SEARCH_FITS') else None
+app.config['SVR_SKIP_LOSING_KERNELS'] = os.environ.get('SVR_SKIP_LOSING_KERNELS', '1') == '1'
+# Uploads are read UPLOAD_CHUNK_ROWS rows at a time; only the cleaned station rows and the
+# monthly weather aggregates are kept, as <name>.prepared.csv next to where the upload would go
+app.config['UPLOAD_CHUNK_ROWS'] = int(os.environ.get('UPLOAD_CHUNK_ROWS', 50000))
+# Missing water quality readings of an upload are filled with the mean of the UPLOAD_IMPUTE_NEIGHBORS
+# nearest rows, as Data Cleaning.ipynb did with KNNImputer; 0, like TRAINING_IMPUTE_NEIGHBORS in app.py,
+# leaves them missing. IMPUTE_BY_STATION only compares rows of the same station, IMPUTE_WORKERS threads
+# share the work and the filled values are kept in IMPUTE_MEMO_DIR, so uploading a file again with rows
+# added only imputes the added rows.
+app.config['UPLOAD_IMPUTE_NEIGHBORS'] = int(os.environ.get('UPLOAD_IMPUTE_NEIGHBORS', 0))
+app.config['IMPUTE_BY_STATION'] = os.environ.get('IMPUTE_BY_STATION', '0') == '1'
+app.config['IMPUTE_WORKERS'] = int(os.environ.get('IMPUTE_WORKERS', os.cpu_count() or 1))
+app.config['IMPUTE_MEMO_DIR'] = os.environ.get('IMPUTE_MEMO_DIR', 'imputation_memo')
 
 model_path = 'best_svr_model.pkl'
+monthly_weather = MonthlyWeatherStore(app.config['WEATHER_MONTHLY_PATH'])
+
+# Select relevant features and target
+features = ['Temperature', 'Humidity', 'Wind', 'Wind Speed', 'Condition', 'pH (units)', 'Ammonia (mg/L)', 'Nitrate (mg/L)', 'Inorganic Phosphate (mg/L)', 'BOD (mg/l)', 'Dissolved Oxygen (mg/l)', 'Total coliforms (MPN/100ml)']
+target = 'Phytoplankton (cells/ml)'
+
+# Water quality columns kept from the upload, the rest of the features come from the weather
+water_quality_columns = ['Month', 'Year'] + [feature for feature in features if feature not in mode_columns + mean_columns] + [target]
+# Also kept when the upload has it, to impute from rows of the same station
+station_column = 'Monitoring Stations'
+
+upload_imputer = KNNImputation(
+    columns=[column for column in water_quality_columns if column not in ('Month', 'Year', target)],
+    n_neighbors=app.config['UPLOAD_IMPUTE_NEIGHBORS'],
+    group_by=station_column if app.config['IMPUTE_BY_STATION'] else None,
+    workers=app.config['IMPUTE_WORKERS'],
+    memo_dir=app.config['IMPUTE_MEMO_DIR'],
+) if app.config['UPLOAD_IMPUTE_NEIGHBORS'] > 0 else None
 
 def load_model():
     """Load the pre-trained model if it exists."""
@@ -27,6 +66,89 @@ def save_model(model):
     with open(model_path, 'wb') as file:
         pickle.dump(model, file)
 
+def prepared_path(filename):
+    return os.path.join(app.config['UPLOAD_FOLDER'], f'{filename}.prepared.csv')
+
+def save_prepared(df, filename):
+    """Write a prepared upload, replaced whole so a reader never sees half of it."""
+    path = prepared_path(filename)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    df.to_csv(tmp_path, index=False)
+    os.replace(tmp_path, path)
+
+def clean_water_quality(chunk, first_row):
+    """Keep the training columns of a chunk of the water quality upload and clean them."""
+    missing = [column for column in water_quality_columns if column not in chunk.columns]
+    if missing:
+        raise ValueError(f'The water quality file has no {", ".join(missing)} column')
+    chunk = chunk[water_quality_columns + ([station_column] if station_column in chunk.columns else [])].copy()
+
+    # Counts are written with thousands separators
+    phytoplankton = chunk[target].astype(str).str.replace(',', '').where(chunk[target].notna())
+    chunk[target] = pd.to_numeric(phytoplankton, errors='coerce')
+    invalid = chunk[target].isna() & phytoplankton.notna()
+    if invalid.any():
+        rows = ', '.join(str(first_row + position) for position in invalid.to_numpy().nonzero()[0][:5])
+        raise ValueError(f'The water quality file has a {target} that is not a number on row {rows}')
+    chunk['Month'] = chunk['Month'].astype(str)
+
+    # Correct typos in the 'Month' column
+    chunk['Month'] = chunk['Month'].replace({
+        'Febuary': 'February',
+        'Aug': 'August',
+        'Sept': 'September',
+        'Nov': 'November',
+        'Dec': 'December'
+    }, regex=False)  # Use regex=False to avoid treating the keys as regular expressions
+    return chunk
+
+def prepare_upload(water_quality_file, weather_file, filename1, filename2):
+    """Read both uploads in chunks and save their prepared forms; ValueError describes a bad file.
+
+    The water quality rows are cleaned chunk by chunk, the hourly weather is
+    reduced to monthly aggregates as it is read, cleaning only the months
+    that are not in the store yet, so memory depends on the number of
+    stations and months, not on the hours of weather uploaded.
+    With UPLOAD_IMPUTE_NEIGHBORS, missing water quality readings are imputed
+    before the rows are saved.
+    """
+    chunk_rows = app.config['UPLOAD_CHUNK_ROWS']
+    parts = []
+    first_row = 2
+    for chunk in pd.read_csv(water_quality_file, encoding='latin1', chunksize=chunk_rows):
+        parts.append(clean_water_quality(chunk, first_row))
+        first_row += len(chunk)
+    if not parts:
+        raise ValueError('The water quality file has no rows')
+    water_quality_df = pd.concat(parts, ignore_index=True)
+    if upload_imputer is not None:
+        if upload_imputer.group_by is not None and upload_imputer.group_by not in water_quality_df.columns:
+            raise ValueError(f'The water quality file has no {upload_imputer.group_by} column')
+        water_quality_df = upload_imputer.impute(water_quality_df, filename1)
+
+    def read_weather():
+        # Read once to fingerprint the months and again for the rows of the changed ones
+        if hasattr(weather_file, 'seek'):
+            weather_file.seek(0)
+        return pd.read_csv(weather_file, encoding='iso-8859-1', chunksize=chunk_rows)
+
+    # Per (Year, Month) modes of Wind and Condition and means of the readings; months whose
+    # rows did not change since the last upload are taken from the store instead of recomputed
+    weather_monthly_stats = monthly_weather.aggregate_chunks(read_weather)
+
+    save_prepared(water_quality_df, filename1)
+    save_prepared(weather_monthly_stats, filename2)
+    return water_quality_df, weather_monthly_stats
+
+def load_prepared(filename1, filename2):
+    """Prepared water quality rows and monthly weather of an upload, preparing files uploaded before they were kept."""
+    if not (os.path.exists(prepared_path(filename1)) and os.path.exists(prepared_path(filename2))):
+        return prepare_upload(os.path.join(app.config['UPLOAD_FOLDER'], filename1),
+                              os.path.join(app.config['UPLOAD_FOLDER'], filename2), filename1, filename2)
+    # round_trip reads back exactly the floats that were written
+    return (pd.read_csv(prepared_path(filename1), dtype={'Month': str}, float_precision='round_trip'),
+            pd.read_csv(prepared_path(filename2), dtype={'Month': str}, float_precision='round_trip'))
+
 @app.route('/')
 def index():
     return render_template('repo.html')
@@ -46,11 +168,13 @@ def upload_file():
     
     if file1 and file2:
         try:
-            file_path1 = os.path.join(app.config['UPLOAD_FOLDER'], file1.filename)
-            file_path2 = os.path.join(app.config['UPLOAD_FOLDER'], file2.filename)
-            file1.save(file_path1)
-            file2.save(file_path2)
+            # Werkzeug spools large file parts to temporary files as they arrive, read them from there in chunks
+            prepare_upload(file1.stream, file2.stream, file1.filename, file2.filename)
             return redirect(url_for('train_and_evaluate', filename1=file1.filename, filename2=file2.filename))
+        except ValueError as e:
+            # Missing columns, non-numeric counts and unreadable CSV, reported from the chunk they appear in
+            flash(f'Invalid upload: {e}')
+            return redirect(request.url)
         except Exception as e:
             flash(f'Error saving files: {e}')
             return redirect(request.url)
@@ -58,92 +182,8 @@ def upload_file():
 @app.route('/train_and_evaluate/<filename1>/<filename2>')
 def train_and_evaluate(filename1, filename2):
     try:
-        file_path1 = os.path.join(app.config['UPLOAD_FOLDER'], filename1)
-        file_path2 = os.path.join(app.config['UPLOAD_FOLDER'], filename2)
-        
-        water_quality_df = pd.read_csv(file_path1, encoding='latin1')
-        weather_df = pd.read_csv(file_path2, encoding='iso-8859-1')
-
-        water_quality_df['Phytoplankton (cells/ml)'] = water_quality_df['Phytoplankton (cells/ml)'].str.replace(',', '')
-        water_quality_df['Month'] = water_quality_df['Month'].astype(str)
-        
-        # Correct typos in the 'Month' column
-        water_quality_df['Month'] = water_quality_df['Month'].replace({
-            'Febuary': 'February',
-            'Aug': 'August',
-            'Sept': 'September',
-            'Nov': 'November',
-            'Dec': 'December'
-        }, regex=False)  # Use regex=False to avoid treating the keys as regular expressions
-        
-        # List of columns to exclude from transformation
-        exclude_columns = ['Month', 'Wind', 'Condition']
-        
-        # Function to remove non-numeric characters from each cell
-        def remove_non_numeric(value):
-            if isinstance(value, str) and value not in exclude_columns:
-                return re.sub(r'[^0-9.]', '', value)
-            else:
-                return value
-        
-        # Apply the function to each cell in numeric columns of the dataframe
-        for column in weather_df.columns:
-            if column not in exclude_columns:
-                weather_df[column] = weather_df[column].apply(remove_non_numeric)
-        
-        # Convert the numeric columns to numeric type
-        numeric_columns = [col for col in weather_df.columns if col not in exclude_columns]
-        weather_df[numeric_columns] = weather_df[numeric_columns].apply(pd.to_numeric, errors='coerce')
-        
-        # Define mappings for Wind column
-        wind_mapping = {
-            'N': 1, 'NNE': 2, 'NE': 3, 'ENE': 4,
-            'E': 5, 'ESE': 6, 'SE': 7, 'SSE': 8,
-            'S': 9, 'SSW': 10, 'SW': 11, 'WSW': 12,
-            'W': 13, 'WNW': 14, 'NW': 15, 'NNW': 16,
-            'VAR': 17, 'CALM': 18
-        }
-        
-        # Define mappings for Condition column
-        condition_mapping = {
-            'Fair': 1, 'Mostly Cloudy': 2, 'Partly Cloudy': 3, 'Cloudy': 4,
-            'Light Rain': 5, 'Light Rain Shower': 6, 'Rain': 7, 'Heavy Rain': 8,
-            'Thunder': 9, 'Light Rain with Thunder': 10, 'T-Storm': 11,
-            'Heavy Rain Shower': 12, 'Rain Shower': 13, 'Showers in the Vicinity': 14,
-            'Thunder in the Vicinity': 15, 'Mostly Cloudy / Windy': 16,
-            'Fair / Windy': 17, 'Partly Cloudy / Windy': 18, 'Rain / Windy': 19,
-            'Light Rain Shower / Windy': 20, 'Heavy Rain / Windy': 21
-        }
-        
-        # Apply mappings to Wind and Condition columns
-        weather_df['Wind'] = weather_df['Wind'].map(wind_mapping)
-        weather_df['Condition'] = weather_df['Condition'].map(condition_mapping)
-        
-        # Define a function to compute the mode
-        def compute_mode(series):
-            return series.mode().iloc[0] if not series.mode().empty else None
-        
-        # Group by 'Year' and 'Month'
-        grouped = weather_df.groupby(['Year', 'Month'])
-        
-        # Aggregate to get the mean for all columns except 'Wind' and 'Condition'
-        # and the mode for 'Wind' and 'Condition'
-        weather_monthly_stats = grouped.agg({
-            'Wind': compute_mode,
-            'Condition': compute_mode,
-            'Time': 'mean',
-            'Temperature': 'mean',
-            'Dew Point' : 'mean',
-            'Humidity': 'mean',
-            'Wind Speed': 'mean',
-            'Wind Gust': 'mean',
-            'Pressure': 'mean',
-            'Precip.': 'mean'
-        }).reset_index()
-        
-        # Select relevant features and target
-        features = ['Temperature', 'Humidity', 'Wind', 'Wind Speed', 'Condition', 'pH (units)', 'Ammonia (mg/L)', 'Nitrate (mg/L)', 'Inorganic Phosphate (mg/L)', 'BOD (mg/l)', 'Dissolved Oxygen (mg/l)', 'Total coliforms (MPN/100ml)']
-        target = 'Phytoplankton (cells/ml)'
+        # Cleaned water quality rows and monthly weather aggregates saved by upload_file
+        water_quality_df, weather_monthly_stats = load_prepared(filename1, filename2)
         
         # Merge datasets on 'Month' and 'Year'
         merged_df = pd.merge(water_quality_df, weather_monthly_stats, on=['Month', 'Year'])
@@ -158,22 +198,19 @@ def train_and_evaluate(filename1, filename2):
         X_train_scaled = scaler.fit_transform(X_train)
         X_test_scaled = scaler.transform(X_test)
         
-        # Define parameter grid for Grid Search with SVR
-        param_grid = {
-            'kernel': ['linear', 'poly', 'rbf', 'sigmoid'],
-            'C': [1, 10, 100],
-            'epsilon': [0.1, 0.2, 0.3],
-            'gamma': ['scale', 'auto']
-        }
-        
-        # Initialize GridSearchCV with SVR
-        grid_search = GridSearchCV(SVR(), param_grid, cv=5, scoring='neg_mean_squared_error', n_jobs=-1)
-        
-        # Fit GridSearchCV
-        grid_search.fit(X_train_scaled, y_train)
-        
-        # Best parameters and score
-        best_svr_model = grid_search.best_estimator_
+        # Search the SVR hyperparameters; ?search=, ?max_seconds= and ?max_fits= override the configured mode and budget
+        search_mode = request.args.get('search', app.config['SVR_SEARCH'])
+        if search_mode == 'halving':
+            max_seconds = request.args.get('max_seconds', app.config['SVR_SEARCH_SECONDS'], type=float)
+            max_fits = request.args.get('max_fits', app.config['SVR_SEARCH_FITS'], type=int)
+            # Start from the parameters of the saved model, so a small budget still tries the previous winner
+            previous_model = load_model()
+            best_svr_model, search = halving_search(
+                X_train_scaled, y_train, max_seconds=max_seconds, max_fits=max_fits,
+                warm_start_params=previous_model.get_params() if previous_model is not None else None,
+                skip_losing_kernels=app.config['SVR_SKIP_LOSING_KERNELS'], n_jobs=-1)
+        else:
+            best_svr_model, search = grid_search(X_train_scaled, y_train, n_jobs=-1)
         
         # Make predictions and evaluate
         y_pred_best_svr = best_svr_model.predict(X_test_scaled)
@@ -187,8 +224,14 @@ def train_and_evaluate(filename1, filename2):
         report = (
             f'Optimized SVR - Mean Squared Error: {mse_best_svr}\n'
             f'Optimized SVR - Mean Absolute Error: {mae_best_svr}\n'
-            f'Optimized SVR - R^2 Score: {r2_best_svr}'
+            f'Optimized SVR - R^2 Score: {r2_best_svr}\n'
+            f"Search ({search['mode']}) - {search['fits']} fits on {search['candidates']} configurations in {search['seconds']:.1f} s\n"
+            f"Search ({search['mode']}) - Best CV Mean Squared Error: {-search['best_score']} with {search['best_params']}"
         )
+        if search['budget_exhausted']:
+            report += '\nSearch stopped when its budget ran out'
+        if search['skipped_kernels']:
+            report += f"\nSkipped kernels: {', '.join(search['skipped_kernels'])}"
         
         return render_template('repo.html', report=report)
     except Exception as e:
@@ -0,0 +1,97 @@
+"""Loading a training dataset from its CSV against the columnar copy in ColumnarDatasetCache.
+
+    python benchmarks/bench_dataset_cache.py                     # Complete.csv, then the station dataset at 10x and 100x
+    python benchmarks/bench_dataset_cache.py --scales 1,1000 --repeat 5
+
+For every dataset three loads are timed, each the best of --repeat runs:
+
+    csv      pd.read_csv, dropna and the training columns, as load_training_frame did before
+    build    the first load through an empty cache, which parses the CSV and writes the .npy files
+    cached   a later load, which maps those files
+
+The loaded frames must be equal, dtypes included, and give the same
+training.row_hashes, which incremental updates compare across versions;
+the script exits with status 1 otherwise. With --train the XGBoost model is
+also trained both ways and the metrics compared.
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+benchmarks_dir = os.path.dirname(os.path.abspath(__file__))
+repo_root = os.path.dirname(benchmarks_dir)
+sys.path.insert(0, benchmarks_dir)
+sys.path.insert(0, repo_root)
+
+import synthetic  # noqa: E402
+from dataset_cache import ColumnarDatasetCache  # noqa: E402
+from training import features, row_hashes, target, train_xgb_model  # noqa: E402
+
+columns = features + [target]
+
+
+def best_time(fn, repeat, setup=None):
+    timings = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def compare(path, label, directory, repeat, train):
+    cache_dir = os.path.join(directory, 'cache')
+    csv_seconds, expected = best_time(lambda: pd.read_csv(path).dropna()[columns], repeat)
+
+    def empty_cache():
+        shutil.rmtree(cache_dir, ignore_errors=True)
+    build_seconds, _ = best_time(lambda: ColumnarDatasetCache(cache_dir, columns).load(path), repeat, empty_cache)
+    cache = ColumnarDatasetCache(cache_dir, columns)
+    cached_seconds, result = best_time(lambda: cache.load(path), repeat)
+
+    ok = True
+    try:
+        pd.testing.assert_frame_equal(result, expected.reset_index(drop=True))
+    except AssertionError:
+        ok = False
+    ok = ok and np.array_equal(row_hashes(result), row_hashes(expected))
+    print(f'{label:>24} {len(expected):>8} rows  csv {csv_seconds * 1000:8.1f} ms  build {build_seconds * 1000:8.1f} ms  '
+          f'cached {cached_seconds * 1000:7.2f} ms ({csv_seconds / cached_seconds:6.1f}x)  '
+          f'{"identical" if ok else "MISMATCH"}', flush=True)
+
+    if train:
+        _, _, csv_metrics, csv_rows = train_xgb_model(path)
+        _, _, cached_metrics, cached_rows = train_xgb_model(path, dataset_cache=cache)
+        same = csv_metrics == cached_metrics and all(np.array_equal(csv_rows[name], cached_rows[name]) for name in csv_rows)
+        ok = ok and same
+        print(f'{label:>24} train  csv {csv_metrics}  cached {cached_metrics}  {"identical" if same else "MISMATCH"}', flush=True)
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scales', default='10,100')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--train', action='store_true')
+    args = parser.parse_args()
+
+    ok = True
+    with tempfile.TemporaryDirectory() as directory:
+        ok &= compare(os.path.join(repo_root, 'Complete.csv'), 'Complete.csv', directory, args.repeat, args.train)
+        for scale in [int(scale) for scale in args.scales.split(',')]:
+            path = os.path.join(directory, f'stations-{scale}.csv')
+            synthetic.station_dataset(scale).to_csv(path, index=False)
+            ok &= compare(path, f'station dataset {scale}x', directory, args.repeat, args.train)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
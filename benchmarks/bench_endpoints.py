@@ -0,0 +1,248 @@
+"""Offline latency, memory and throughput benchmark for the prediction and training endpoints.
+
+    python benchmarks/bench_endpoints.py                              # every endpoint at 1x, 10x and 100x
+    python benchmarks/bench_endpoints.py --scales 1,10 --endpoints predict_and_learn,model_testing
+    python benchmarks/bench_endpoints.py --save results.json
+    python benchmarks/bench_endpoints.py --baseline results.json --tolerance 0.2
+
+For every scale the synthetic datasets from benchmarks/synthetic.py are
+written to a temporary directory together with the serving model. Each
+endpoint then runs in its own Python process started in that directory,
+so caches start cold and the peak RSS belongs to that endpoint alone. The
+Flask test client drives app.py and app2.py; no server or network is
+involved.
+
+The response cache and the forecast table are disabled in those processes,
+so every request does the work of the endpoint and no timing depends on
+whether a background build finished. /predict_and_learn and /model_testing
+are then run once more with the response cache on and one payload repeated,
+reported as "<endpoint> (cached)": its p50 is the latency of a cache hit.
+
+Reported per endpoint and scale: the first (cold) request, p50 and p95 of
+the requests after it, throughput over all requests and peak RSS. With
+--baseline, the script exits with status 1 when any p50 is more than
+--tolerance slower than the stored one.
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+benchmarks_dir = os.path.dirname(os.path.abspath(__file__))
+repo_root = os.path.dirname(benchmarks_dir)
+sys.path.insert(0, benchmarks_dir)
+
+import synthetic  # noqa: E402
+
+endpoints = ['predict_and_learn', 'predict_batch', 'model_testing', 'retrain_model', 'train_and_evaluate']
+
+# Endpoints whose responses the response cache keeps, measured again with it on
+cached_endpoints = ['predict_and_learn', 'model_testing']
+
+# Training endpoints take seconds to minutes, so they run fewer times by default
+default_requests = {
+    'predict_and_learn': 20,
+    'predict_batch': 20,
+    'model_testing': 200,
+    'retrain_model': 3,
+    'train_and_evaluate': 1,
+}
+
+serving_artifacts = ['xgb_model.ubj', 'xgb_scaler.npz']
+
+weather_inputs = {'Temperature': [30.0], 'Humidity': [80.0], 'Wind Speed': [10.0]}
+model_inputs = {
+    'Temperature': [30.0], 'Humidity': [80.0], 'Wind Speed': [10.0], 'pH (units)': [8.0], 'Ammonia (mg/L)': [0.05],
+    'Inorganic Phosphate (mg/L)': [0.1], 'BOD (mg/l)': [2.0], 'Total coliforms (MPN/100ml)': [100.0],
+}
+
+
+def post_json(client, url, payload):
+    # The PHP pages send keys in this order and the scaler checks feature order, so keep it
+    return client.post(url, data=json.dumps(payload), content_type='application/json')
+
+
+def request_once(endpoint, client, paths, i):
+    """Send one request and raise if it did not succeed; requests with another i send other inputs."""
+    if endpoint == 'predict_and_learn':
+        payload = dict(weather_inputs, Date=f'2024-{1 + i % 12:02d}-15', Temperature=[30.0 + i * 0.001])
+        response = post_json(client, '/predict_and_learn', payload)
+        body = response.get_json()
+        if body.get('status') == 'Error':
+            raise RuntimeError(body['message'])
+    elif endpoint == 'predict_batch':
+        rows = [{'Date': f'2024-10-{day:02d}', 'Temperature': 30.0, 'Humidity': 80.0, 'Wind Speed': 10.0}
+                for day in range(20, 27)]
+        body = post_json(client, '/predict_batch', {'rows': rows}).get_json()
+        if body.get('status') == 'Error':
+            raise RuntimeError(body['message'])
+    elif endpoint == 'model_testing':
+        body = post_json(client, '/model_testing', dict(model_inputs, Temperature=[30.0 + i * 0.001])).get_json()
+        if 'prediction' not in body:
+            raise RuntimeError(body)
+    elif endpoint == 'retrain_model':
+        # Queued as a job, so the latency is the time until the job finishes
+        body = post_json(client, '/retrain_model', {'dataset': paths['station_dataset']}).get_json()
+        if 'job_id' not in body:
+            raise RuntimeError(body)
+        while True:
+            job = client.get(f"/jobs/{body['job_id']}").get_json()
+            if job['status'] == 'finished':
+                break
+            if job['status'] in ('failed', 'cancelled'):
+                raise RuntimeError(job['error'] or job['status'])
+            time.sleep(0.01)
+    elif endpoint == 'train_and_evaluate':
+        response = client.get(f"/train_and_evaluate/{os.path.basename(paths['water_quality'])}/{os.path.basename(paths['weather'])}")
+        if response.status_code != 200:
+            raise RuntimeError(f'train_and_evaluate returned {response.status_code}')
+
+
+def run_case(endpoint, requests, paths, cached=False):
+    """Runs inside the benchmark child process, in the dataset directory.
+
+    With cached, every request sends the inputs of the first.
+    """
+    import warnings
+    warnings.simplefilter('ignore')
+    sys.path.insert(0, repo_root)
+    if endpoint == 'train_and_evaluate':
+        import app2
+        client = app2.app.test_client()
+    else:
+        import app
+        client = app.app.test_client()
+
+    latencies = []
+    start = time.perf_counter()
+    for i in range(requests):
+        request_start = time.perf_counter()
+        request_once(endpoint, client, paths, 0 if cached else i)
+        latencies.append(time.perf_counter() - request_start)
+    total = time.perf_counter() - start
+
+    warm = latencies[1:] or latencies
+    return {
+        'endpoint': f'{endpoint} (cached)' if cached else endpoint,
+        'requests': requests,
+        'cold_ms': latencies[0] * 1000,
+        'p50_ms': float(np.percentile(warm, 50)) * 1000,
+        'p95_ms': float(np.percentile(warm, 95)) * 1000,
+        'throughput_rps': requests / total,
+        # ru_maxrss is in kilobytes on Linux
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+def prepare_directory(directory, scale):
+    paths = synthetic.write_datasets(directory, scale)
+    for name in serving_artifacts:
+        shutil.copy(os.path.join(repo_root, name), directory)
+    return paths
+
+
+def run_scale(scale, selected, requests_override):
+    results = []
+    directory = tempfile.mkdtemp(prefix=f'llda-bench-{scale}x-')
+    try:
+        paths = prepare_directory(directory, scale)
+        with open(paths['station_dataset']) as file:
+            rows = sum(1 for _ in file) - 1
+        cases = [(endpoint, False) for endpoint in selected]
+        cases += [(endpoint, True) for endpoint in selected if endpoint in cached_endpoints]
+        for endpoint, cached in cases:
+            requests = requests_override or default_requests[endpoint]
+            command = [sys.executable, os.path.abspath(__file__), '--case', endpoint,
+                       '--requests', str(requests), '--paths', json.dumps(paths)]
+            env = {k: v for k, v in os.environ.items()
+                   if k not in ('SARIMA_CACHE_DIR', 'WARM_UP', 'RESPONSE_CACHE_SIZE', 'RESPONSE_CACHE_PATH')}
+            env['FORECAST_TABLE_MONTHS'] = '0'
+            if cached:
+                command.append('--cached')
+            else:
+                env['RESPONSE_CACHE_SIZE'] = '0'
+            completed = subprocess.run(command, cwd=directory, env=env, capture_output=True, text=True)
+            if completed.returncode != 0:
+                print(f'{endpoint} at {scale}x failed:\n{completed.stderr[-2000:]}', file=sys.stderr)
+                continue
+            result = json.loads(completed.stdout.strip().splitlines()[-1])
+            result.update({'scale': scale, 'station_rows': rows})
+            results.append(result)
+            print(f"{result['endpoint']:>29} {scale:>4}x  cold {result['cold_ms']:10.1f} ms  p50 {result['p50_ms']:10.1f} ms  "
+                  f"p95 {result['p95_ms']:10.1f} ms  {result['throughput_rps']:8.2f} req/s  "
+                  f"{result['peak_rss_mb']:7.1f} MB", flush=True)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Print p50 changes against a baseline and return True if any regressed."""
+    previous = {(r['endpoint'], r['scale']): r for r in baseline['results']}
+    regressed = False
+    for result in results:
+        before = previous.get((result['endpoint'], result['scale']))
+        if before is None:
+            continue
+        ratio = result['p50_ms'] / before['p50_ms'] if before['p50_ms'] else float('inf')
+        flag = ''
+        if ratio > 1 + tolerance:
+            flag = '  REGRESSION'
+            regressed = True
+        print(f"{result['endpoint']:>29} {result['scale']:>4}x  p50 {before['p50_ms']:.1f} -> {result['p50_ms']:.1f} ms ({ratio:.2f}x){flag}")
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scales', default='1,10,100')
+    parser.add_argument('--endpoints', default=','.join(endpoints))
+    parser.add_argument('--requests', type=int, help='requests per endpoint, overriding the defaults')
+    parser.add_argument('--save', help='write the results to this JSON file')
+    parser.add_argument('--baseline', help='compare against results saved with --save')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed p50 slowdown over the baseline')
+    parser.add_argument('--case', help=argparse.SUPPRESS)
+    parser.add_argument('--paths', help=argparse.SUPPRESS)
+    parser.add_argument('--cached', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case:
+        print(json.dumps(run_case(args.case, args.requests, json.loads(args.paths), args.cached)))
+        return
+
+    selected = [name for name in args.endpoints.split(',') if name]
+    unknown = [name for name in selected if name not in endpoints]
+    if unknown:
+        parser.error(f"unknown endpoints: {', '.join(unknown)}")
+
+    results = []
+    for scale in [int(scale) for scale in args.scales.split(',')]:
+        results.extend(run_scale(scale, selected, args.requests))
+
+    report = {
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'results': results,
+    }
+    if args.save:
+        with open(args.save, 'w') as file:
+            json.dump(report, file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        sys.exit(1 if compare(results, baseline, args.tolerance) else 0)
+
+
+if __name__ == '__main__':
+    main()
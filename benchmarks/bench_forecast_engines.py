@@ -0,0 +1,132 @@
+"""Parity and speed of the SARIMA forecasting engines in forecast_engines.
+
+    python benchmarks/bench_forecast_engines.py                      # real station series, 36 months
+    python benchmarks/bench_forecast_engines.py --scales 1,5 --steps 60
+    python benchmarks/bench_forecast_engines.py --tolerance 1e-6     # exit status 1 above it
+
+Every station x parameter series of the station dataset (benchmarks/synthetic.py
+at scales above 1) is fitted once with SARIMAX. The reference forecasts are
+the fitted results' own get_forecast(steps). Every engine then forecasts all
+series from their fitted parameters, and is reported with its total time,
+the speedup over get_forecast on the already filtered results and the
+largest relative difference from the reference,
+|engine - reference| / max(1, |reference|).
+
+The 'grid' lines time forecast_grid for a worker that starts with the fits
+on disk only, as after a restart: the statsmodels engine rebuilds a results
+object per series with a filter pass, the batch engines read the parameters.
+
+The script exits with status 1 when an engine differs by more than --tolerance.
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+benchmarks_dir = os.path.dirname(os.path.abspath(__file__))
+repo_root = os.path.dirname(benchmarks_dir)
+sys.path.insert(0, benchmarks_dir)
+sys.path.insert(0, repo_root)
+
+import synthetic  # noqa: E402
+from dataset_store import DatasetSnapshot  # noqa: E402
+from forecast_engines import engines  # noqa: E402
+from forecasting import forecast_grid  # noqa: E402
+from sarima_cache import SarimaFitCache  # noqa: E402
+
+order = (1, 1, 1)
+seasonal_order = (1, 1, 1, 12)
+parameters = ['pH (units)', 'Ammonia (mg/L)', 'Inorganic Phosphate (mg/L)', 'BOD (mg/l)', 'Total coliforms (MPN/100ml)']
+
+
+def fitted_series(station_frames, cache):
+    """Fit every series into the cache; returns (values, results) of those that could be fitted."""
+    fitted = []
+    for station_name, frame in station_frames.items():
+        for parameter in parameters:
+            series = frame[parameter]
+            try:
+                model_fit = cache.get_or_fit(station_name, parameter, series, order, seasonal_order)
+            except Exception:
+                # Series the app reports as fit errors as well
+                continue
+            fitted.append((series.values, model_fit))
+    return fitted
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scales', default='1')
+    parser.add_argument('--steps', type=int, default=36)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--tolerance', type=float, default=1e-6)
+    args = parser.parse_args()
+    # statsmodels installs its own warning filters when it is imported
+    import statsmodels.tsa.statespace.sarimax  # noqa: F401
+    warnings.simplefilter('ignore')
+
+    failed = False
+    for scale in [int(scale) for scale in args.scales.split(',')]:
+        # Consecutive months ending at the last real one; SARIMAX reads the rows as consecutive anyway,
+        # and the tiled years of the synthetic data would otherwise leave pandas' date range when forecast
+        station_frames = {station_name: frame.set_index(pd.date_range(end=frame.index[-1], periods=len(frame), freq='MS'))
+                          for station_name, frame in
+                          DatasetSnapshot(synthetic.station_dataset(scale), signature=None).frames.items()}
+        directory = tempfile.mkdtemp(prefix='llda-forecast-engines-')
+        fitted = fitted_series(station_frames, SarimaFitCache(directory))
+        series_list = [series for series, _ in fitted]
+        params_list = [model_fit.params for _, model_fit in fitted]
+
+        timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            reference = np.array([model_fit.get_forecast(steps=args.steps).predicted_mean for _, model_fit in fitted])
+            timings.append(time.perf_counter() - start)
+        reference_seconds = min(timings)
+        print(f'{scale:>4}x {len(fitted):>5} series  {"get_forecast":>12} {reference_seconds * 1000:9.1f} ms', flush=True)
+
+        for name, engine in engines.items():
+            timings = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                forecasts = engine(series_list, params_list, order, seasonal_order, args.steps)
+                timings.append(time.perf_counter() - start)
+            difference = float((np.abs(forecasts - reference) / np.maximum(1.0, np.abs(reference))).max())
+            within = difference <= args.tolerance
+            failed = failed or not within
+            print(f'{scale:>4}x {len(fitted):>5} series  {name:>12} {min(timings) * 1000:9.1f} ms  '
+                  f'({reference_seconds / min(timings):5.1f}x)  max relative difference {difference:.2e}'
+                  f'{"" if within else "  ABOVE TOLERANCE"}', flush=True)
+
+        # Forecast paths as ForecastCurves asks for them, up to args.steps months after the latest station
+        target = max(frame.index[-1] for frame in station_frames.values()) + pd.DateOffset(months=args.steps)
+        reference = None
+        for name in engines:
+            timings = []
+            for _ in range(args.repeat):
+                cold_worker = SarimaFitCache(directory)
+                start = time.perf_counter()
+                curves, error = forecast_grid(cold_worker, station_frames, parameters, target, order, seasonal_order,
+                                              full_path=True, engine=name)
+                timings.append(time.perf_counter() - start)
+            paths = np.concatenate([curves[station_name][parameter] for station_name in curves
+                                    for parameter in curves[station_name]])
+            if reference is None:
+                reference, reference_seconds = paths, min(timings)
+            difference = float((np.abs(paths - reference) / np.maximum(1.0, np.abs(reference))).max())
+            failed = failed or difference > args.tolerance
+            print(f'{scale:>4}x {len(fitted):>5} series  {"grid " + name:>17} {min(timings) * 1000:9.1f} ms  '
+                  f'({reference_seconds / min(timings):5.1f}x)  max relative difference {difference:.2e}'
+                  f'{"" if error is None else "  " + error}', flush=True)
+        shutil.rmtree(directory, ignore_errors=True)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
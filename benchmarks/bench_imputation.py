@@ -0,0 +1,170 @@
+"""KNNImputation against the KNNImputer step of Data Cleaning.ipynb.
+
+    python benchmarks/bench_imputation.py                      # New_Merged.csv, then the station dataset at 5x and 10x
+    python benchmarks/bench_imputation.py --scales 1,20 --workers 4 --repeat 3
+
+The water quality columns of every dataset are imputed with n_neighbors=5,
+each way timed as the best of --repeat runs:
+
+    sklearn      KNNImputer(n_neighbors=5).fit_transform, as the notebook does
+    knn          KNNImputation, every row compared with every other, on --workers threads
+    by station   KNNImputation(group_by='Monitoring Stations'), rows compared within their station
+    incremental  KNNImputation with a memo of every row but the newest --new-fraction, imputing those
+
+knn and incremental must fill every cell as KNNImputer does. Distances that
+are equal on paper differ by the rounding of nan_euclidean_distances, which
+depends on how BLAS gets the arrays, so even KNNImputer can take another of
+the rows tied for the last neighbour when given a copy of its input. A cell
+that differs only counts as a mismatch when one of the two values is not a
+mean the tied neighbours allow. by station is a different imputation and only
+reports how far it is from KNNImputer. New_Merged.csv is also compared with
+the New_Merged_Imputed.csv the notebook wrote. The script exits with status
+1 on a mismatch.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+from sklearn.impute import KNNImputer
+
+benchmarks_dir = os.path.dirname(os.path.abspath(__file__))
+repo_root = os.path.dirname(benchmarks_dir)
+sys.path.insert(0, benchmarks_dir)
+sys.path.insert(0, repo_root)
+
+import synthetic  # noqa: E402
+from imputation import KNNImputation, water_quality_columns  # noqa: E402
+
+n_neighbors = 5
+
+
+def best_time(fn, repeat, setup=None):
+    timings = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def allowed(X, row, column, value):
+    """Whether value is the mean of some choice of the n_neighbors nearest donors of the cell, ties included.
+
+    Distances are computed exactly here; two donors tie when their squared
+    distances are closer than the rounding of nan_euclidean_distances, which
+    grows with the squared magnitudes of the readings.
+    """
+    donors = np.flatnonzero(~np.isnan(X[:, column]))
+    diff = X[donors] - X[row]
+    present = (~np.isnan(diff)).sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        weight = X.shape[1] / present
+        squared = np.where(present > 0, np.nansum(diff ** 2, axis=1) * weight, np.inf)
+        magnitude = (np.nansum(X[row] ** 2) + np.nansum(X[donors] ** 2, axis=1)) * weight
+    tolerance = np.where(present > 0, 1e-14 * magnitude, 0.0)
+
+    k = min(n_neighbors, donors.size)
+    kth = np.argsort(squared, kind='stable')[k - 1]
+    gap = squared - squared[kth]
+    margin = tolerance + tolerance[kth]
+    if np.isinf(squared[kth]):
+        closer, tied = np.isfinite(squared), np.isinf(squared)
+    else:
+        closer, tied = gap < -margin, np.abs(gap) <= margin
+    values = X[donors, column]
+    tied_values = np.sort(values[tied])
+    need = k - int(closer.sum())
+    low = (values[closer].sum() + tied_values[:need].sum()) / k
+    high = (values[closer].sum() + tied_values[len(tied_values) - need:].sum()) / k
+    slack = 1e-9 * max(abs(low), abs(high), 1.0)
+    return low - slack <= value <= high + slack
+
+
+def mismatches(X, expected, result, rows=None):
+    """Cells of rows where result and expected differ, and how many of them no tie explains."""
+    differ = ~np.isclose(expected, result, rtol=1e-12, atol=0.0, equal_nan=True)
+    if rows is not None:
+        differ[~rows] = False
+    cells = np.argwhere(differ)
+    unexplained = sum(not (allowed(X, row, column, expected[row, column]) and allowed(X, row, column, result[row, column]))
+                      for row, column in cells)
+    return len(cells), unexplained
+
+
+def compare(df, label, directory, repeat, workers, new_fraction):
+    X = df[water_quality_columns].to_numpy(dtype=float)
+    missing = int(np.isnan(X).sum())
+    ok = True
+
+    sklearn_seconds, expected = best_time(lambda: KNNImputer(n_neighbors=n_neighbors).fit_transform(X), repeat)
+    print(f'{label:>24} {len(df):>7} rows {missing:>7} missing  sklearn     {sklearn_seconds * 1000:9.1f} ms', flush=True)
+
+    imputer = KNNImputation(n_neighbors=n_neighbors, workers=workers)
+    seconds, result = best_time(lambda: imputer.impute(df)[water_quality_columns].to_numpy(), repeat)
+    differ, unexplained = mismatches(X, expected, result)
+    ok = ok and unexplained == 0
+    print(f'{"":>48}  knn         {seconds * 1000:9.1f} ms ({sklearn_seconds / seconds:5.1f}x)  '
+          f'{differ} cells differ, {unexplained} not by a tie', flush=True)
+
+    grouped = KNNImputation(n_neighbors=n_neighbors, group_by='Monitoring Stations', workers=workers)
+    seconds, result = best_time(lambda: grouped.impute(df)[water_quality_columns].to_numpy(), repeat)
+    filled = np.isnan(X)
+    scale = np.nanstd(X, axis=0)
+    distance = np.abs(result - expected)[filled] / np.broadcast_to(scale, X.shape)[filled]
+    print(f'{"":>48}  by station  {seconds * 1000:9.1f} ms ({sklearn_seconds / seconds:5.1f}x)  '
+          f'filled cells {np.mean(distance):.3f} standard deviations from KNNImputer on average', flush=True)
+
+    # The newest rows are the last ones; the memo holds what the older rows were filled with
+    old_rows = len(df) - max(1, int(len(df) * new_fraction))
+    memo_dir = os.path.join(directory, f'memo-{label}')
+    incremental = KNNImputation(n_neighbors=n_neighbors, workers=workers, memo_dir=memo_dir)
+
+    def remember_old_rows():
+        for name in os.listdir(memo_dir):
+            os.remove(os.path.join(memo_dir, name))
+        incremental.impute(df.iloc[:old_rows], 'dataset')
+    seconds, result = best_time(lambda: incremental.impute(df, 'dataset')[water_quality_columns].to_numpy(), repeat,
+                                remember_old_rows)
+    new_rows = np.arange(len(df)) >= old_rows
+    differ, unexplained = mismatches(X, expected, result, new_rows)
+    ok = ok and unexplained == 0
+    print(f'{"":>48}  incremental {seconds * 1000:9.1f} ms ({sklearn_seconds / seconds:5.1f}x)  '
+          f'{len(df) - old_rows} new rows, {differ} of their cells differ, {unexplained} not by a tie', flush=True)
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scales', default='5,10')
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--new-fraction', type=float, default=0.01)
+    args = parser.parse_args()
+
+    ok = True
+    with tempfile.TemporaryDirectory() as directory:
+        new_merged = pd.read_csv(os.path.join(repo_root, 'New_Merged.csv'))
+        ok &= compare(new_merged, 'New_Merged.csv', directory, args.repeat, args.workers, args.new_fraction)
+
+        # What the notebook wrote, from the same input
+        notebook = pd.read_csv(os.path.join(repo_root, 'New_Merged_Imputed.csv'))[water_quality_columns].to_numpy()
+        result = KNNImputation(n_neighbors=n_neighbors).impute(new_merged)[water_quality_columns].to_numpy()
+        X = new_merged[water_quality_columns].to_numpy(dtype=float)
+        differ, unexplained = mismatches(X, notebook, result)
+        ok = ok and unexplained == 0
+        print(f'{"New_Merged_Imputed.csv":>24} {differ} cells differ, {unexplained} not by a tie', flush=True)
+
+        for scale in [int(scale) for scale in args.scales.split(',')]:
+            ok &= compare(synthetic.station_dataset(scale), f'station dataset {scale}x', directory, args.repeat,
+                          args.workers, args.new_fraction)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
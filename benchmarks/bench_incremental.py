@@ -0,0 +1,67 @@
+"""Full XGBoost retraining against the incremental update of training.update_xgb_model.
+
+    python benchmarks/bench_incremental.py                        # 1x, 10x and 100x, one new month of rows
+    python benchmarks/bench_incremental.py --scales 10 --new-rows 6,60,600
+
+For every scale the synthetic station dataset from benchmarks/synthetic.py
+is cut into a base file without its last --new-rows complete rows and the
+full file. A model trained on the base file is then brought up to date on
+the full file both ways: a full train_xgb_model and update_xgb_model with
+the app's defaults. Reported: both times, the holdout MSE of each result
+and, when the update was refused, the reason it gave.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import warnings
+
+benchmarks_dir = os.path.dirname(os.path.abspath(__file__))
+repo_root = os.path.dirname(benchmarks_dir)
+sys.path.insert(0, benchmarks_dir)
+sys.path.insert(0, repo_root)
+
+import synthetic  # noqa: E402
+import training  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scales', default='1,10,100')
+    parser.add_argument('--new-rows', default='6', help='comma separated numbers of rows added since the base model')
+    args = parser.parse_args()
+    warnings.simplefilter('ignore')
+
+    with tempfile.TemporaryDirectory(prefix='llda-incremental-') as directory:
+        base_path = os.path.join(directory, 'base.csv')
+        full_path = os.path.join(directory, 'full.csv')
+        for scale in [int(scale) for scale in args.scales.split(',')]:
+            df = synthetic.station_dataset(scale).dropna()
+            df.to_csv(full_path, index=False)
+            for new_rows in [int(n) for n in args.new_rows.split(',')]:
+                df.iloc[:-new_rows].to_csv(base_path, index=False)
+                model, scaler, _, rows = training.train_xgb_model(base_path)
+
+                start = time.perf_counter()
+                _, _, full_metrics, _ = training.train_xgb_model(full_path)
+                full_seconds = time.perf_counter() - start
+
+                start = time.perf_counter()
+                try:
+                    updated = training.update_xgb_model(full_path, model, scaler, rows)
+                    if updated is None:
+                        # Rows identical to ones already trained on, e.g. station replicas at large scales
+                        outcome = 'no new rows'
+                    else:
+                        outcome = f"update holdout MSE {updated[2]['mse']:.4g}"
+                except training.FullRetrainNeeded as e:
+                    outcome = f'refused: {e}'
+                update_seconds = time.perf_counter() - start
+                print(f'{scale:>4}x {len(df):>8} rows  +{new_rows:<5}  full {full_seconds * 1000:8.1f} ms  '
+                      f'update {update_seconds * 1000:8.1f} ms  ({full_seconds / update_seconds:5.1f}x)  '
+                      f"full holdout MSE {full_metrics['mse']:.4g}  {outcome}", flush=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""Per-request latency of the /model_testing prediction: DataFrame path against RowPredictor.
+
+    python benchmarks/bench_row_predict.py
+    python benchmarks/bench_row_predict.py --requests 20000 --payloads 5000
+
+The serving model and scaler are loaded as app.py loads them when no
+version is promoted. Every payload is a single row of the eight features,
+taken from the complete rows of Complete.csv, in the JSON shape the PHP
+pages send. Two ways of answering it are timed per call:
+
+    dataframe   pd.DataFrame(payload), scaler.transform, model.predict, as /model_testing did
+    row         RowPredictor.row(payload) and RowPredictor.predict
+
+Both must give the same float32 prediction for every payload; the script
+exits with status 1 otherwise. For the latency of the whole request, run
+bench_endpoints.py --endpoints model_testing with and without ROW_PREDICTOR=0.
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+benchmarks_dir = os.path.dirname(os.path.abspath(__file__))
+repo_root = os.path.dirname(benchmarks_dir)
+sys.path.insert(0, repo_root)
+
+from model_artifacts import load_model_pair  # noqa: E402
+from row_predictor import RowPredictor  # noqa: E402
+
+
+def latencies(fn, payloads, requests):
+    timings = np.empty(requests)
+    for i in range(requests):
+        payload = payloads[i % len(payloads)]
+        start = time.perf_counter()
+        fn(payload)
+        timings[i] = time.perf_counter() - start
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--payloads', type=int, default=1000)
+    args = parser.parse_args()
+
+    paths = [os.path.join(repo_root, name) for name in ('xgb_model.ubj', 'xgb_scaler.npz', 'xgb_model.pkl', 'xgb_scaler.pkl')]
+    model, scaler = load_model_pair(*paths)
+    predictor = RowPredictor('bench', model, scaler)
+    features = list(scaler.feature_names_in_)
+
+    rows = pd.read_csv(os.path.join(repo_root, 'Complete.csv'))[features].dropna()
+    rows = rows.sample(min(args.payloads, len(rows)), random_state=0)
+    payloads = [{feature: [value] for feature, value in zip(features, row)} for row in rows.itertuples(index=False)]
+
+    def dataframe(payload):
+        return model.predict(scaler.transform(pd.DataFrame(payload)))
+
+    def row(payload):
+        return predictor.predict(predictor.row(payload))
+
+    mismatched = sum(not np.array_equal(dataframe(payload), row(payload)) for payload in payloads)
+
+    # Warm both paths before timing
+    latencies(dataframe, payloads, 100)
+    latencies(row, payloads, 100)
+    results = {name: latencies(fn, payloads, args.requests) for name, fn in (('dataframe', dataframe), ('row', row))}
+
+    base = np.median(results['dataframe'])
+    for name, timings in results.items():
+        p50, p95, p99 = np.percentile(timings, [50, 95, 99]) * 1e6
+        print(f'{name:>10}  p50 {p50:8.1f} us  p95 {p95:8.1f} us  p99 {p99:8.1f} us  '
+              f'({base / np.median(timings):5.1f}x)', flush=True)
+    print(f'{len(payloads)} payloads, {mismatched} predictions differ')
+    sys.exit(0 if mismatched == 0 else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""Extending cached SARIMA fits with new months against fitting them again.
+
+    python benchmarks/bench_sarima_update.py                  # one new month, every station and parameter
+    python benchmarks/bench_sarima_update.py --new-months 1,3,6 --horizon 24
+
+Every station x parameter series of the station dataset is cut into a base
+series without its last --new-months observations and the full series. The
+base series is fitted through a SarimaFitCache with a cache directory, then
+the full series is brought up to date three ways:
+
+    extend   the worker that fitted it, Kalman filter over the new months only
+    disk     a fresh worker reading the stored parameters, filter over the whole series
+    refit    a full SARIMAX fit, what every new month cost before
+
+Reported per number of new months: total time of each way, how many series
+the cache sent to a refit because the new months were forecast too badly,
+and the largest difference between the extended and the refitted forecasts
+over --horizon months, relative to the standard deviation of the series.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+benchmarks_dir = os.path.dirname(os.path.abspath(__file__))
+repo_root = os.path.dirname(benchmarks_dir)
+sys.path.insert(0, repo_root)
+
+from dataset_store import DatasetSnapshot  # noqa: E402
+from sarima_cache import SarimaFitCache, _sarimax  # noqa: E402
+
+station_dataset_path = os.path.join(repo_root, 'updated_dataset_with_predictions.csv')
+order = (1, 1, 1)
+seasonal_order = (1, 1, 1, 12)
+parameters = ['pH (units)', 'Ammonia (mg/L)', 'Inorganic Phosphate (mg/L)', 'BOD (mg/l)', 'Total coliforms (MPN/100ml)']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--new-months', default='1')
+    parser.add_argument('--horizon', type=int, default=12)
+    args = parser.parse_args()
+    # statsmodels installs its own warning filters when it is imported
+    import statsmodels.tsa.statespace.sarimax  # noqa: F401
+    warnings.simplefilter('ignore')
+
+    snapshot = DatasetSnapshot(pd.read_csv(station_dataset_path), signature=None)
+    series_list = [(station_name, parameter, frame[parameter])
+                   for station_name, frame in snapshot.frames.items() for parameter in parameters]
+
+    for new_months in [int(n) for n in args.new_months.split(',')]:
+        times = {'extend': 0.0, 'disk': 0.0, 'refit': 0.0}
+        refits = 0
+        deviations = []
+        with tempfile.TemporaryDirectory(prefix='llda-sarima-update-') as directory:
+            worker = SarimaFitCache(directory)
+            fitted = []
+            for station_name, parameter, series in series_list:
+                try:
+                    worker.get_or_fit(station_name, parameter, series.iloc[:-new_months], order, seasonal_order)
+                except Exception:
+                    # Series the app reports as fit errors as well
+                    continue
+                fitted.append((station_name, parameter, series))
+
+            fresh_worker = SarimaFitCache(directory)
+            for station_name, parameter, series in fitted:
+                start = time.perf_counter()
+                extended = worker.get(station_name, parameter, series, order, seasonal_order)
+                times['extend'] += time.perf_counter() - start
+
+                start = time.perf_counter()
+                fresh_worker.get(station_name, parameter, series, order, seasonal_order)
+                times['disk'] += time.perf_counter() - start
+
+                start = time.perf_counter()
+                try:
+                    refitted = _sarimax(series, order, seasonal_order).fit(disp=False)
+                except Exception:
+                    refitted = None
+                times['refit'] += time.perf_counter() - start
+
+                if extended is None:
+                    refits += 1
+                    continue
+                if refitted is None:
+                    continue
+                difference = (extended.get_forecast(args.horizon).predicted_mean.values
+                              - refitted.get_forecast(args.horizon).predicted_mean.values)
+                deviations.append(np.abs(difference).max() / (series.std() or 1.0))
+
+        print(f"+{new_months:<3} {len(fitted)} series  extend {times['extend'] * 1000:8.1f} ms  "
+              f"disk {times['disk'] * 1000:8.1f} ms  refit {times['refit'] * 1000:8.1f} ms  "
+              f"({times['refit'] / times['extend']:5.1f}x)  {refits} sent to refit  "
+              f"forecast difference max {max(deviations, default=0):.3f} / median {np.median(deviations or [0]):.3f} std",
+              flush=True)
+
+
+if __name__ == '__main__':
+    main()
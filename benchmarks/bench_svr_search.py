@@ -0,0 +1,113 @@
+"""Speed against accuracy of the SVR hyperparameter searches behind app2's train_and_evaluate.
+
+    python benchmarks/bench_svr_search.py                                  # real uploads, grid vs halving
+    python benchmarks/bench_svr_search.py --scale 10 --budgets fits=40,seconds=5
+    python benchmarks/bench_svr_search.py --no-skip-kernels
+
+Every search runs through the endpoint with the Flask test client, in a
+temporary directory holding the synthetic datasets from
+benchmarks/synthetic.py (the real uploads at --scale 1), so the numbers
+include the cleaning, merge and refit that a real upload pays for. The
+search mode and budget are passed as query parameters. Each run starts
+without a saved model, except the ones labelled 'warm', which reuse the
+model saved by the exhaustive grid search.
+
+Reported per search: wall time of the request, SVR fits, configurations
+tried, the best cross-validated MSE and the MSE and R^2 on the held-out
+test split.
+"""
+import argparse
+import os
+import re
+import shutil
+import sys
+import tempfile
+import time
+
+benchmarks_dir = os.path.dirname(os.path.abspath(__file__))
+repo_root = os.path.dirname(benchmarks_dir)
+sys.path.insert(0, benchmarks_dir)
+sys.path.insert(0, repo_root)
+
+import synthetic  # noqa: E402
+
+report_patterns = {
+    'test_mse': r'Mean Squared Error: ([-\d.e+]+)\n',
+    'test_r2': r'R\^2 Score: ([-\d.e+]+)',
+    'fits': r'- (\d+) fits on',
+    'candidates': r'fits on (\d+) configurations',
+    'cv_mse': r'Best CV Mean Squared Error: ([-\d.e+]+)',
+}
+
+
+def parse_report(html):
+    values = {}
+    for name, pattern in report_patterns.items():
+        match = re.search(pattern, html)
+        if match is None:
+            raise RuntimeError(f'no {name} in the response, training failed?')
+        values[name] = float(match.group(1))
+    values['best_params'] = re.search(r'with (\{.*?\})', html).group(1)
+    values['budget_exhausted'] = 'budget ran out' in html
+    return values
+
+
+def run(client, paths, query):
+    url = f"/train_and_evaluate/{os.path.basename(paths['water_quality'])}/{os.path.basename(paths['weather'])}?{query}"
+    start = time.perf_counter()
+    response = client.get(url)
+    seconds = time.perf_counter() - start
+    if response.status_code != 200:
+        raise RuntimeError(f'{url} returned {response.status_code}')
+    result = parse_report(response.get_data(as_text=True).replace('&#39;', "'"))
+    result['seconds'] = seconds
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scale', type=int, default=1)
+    parser.add_argument('--budgets', default='fits=30,fits=60,seconds=2',
+                        help='comma separated fits=N or seconds=S budgets for the halving search')
+    parser.add_argument('--no-skip-kernels', action='store_true')
+    args = parser.parse_args()
+
+    import warnings
+    warnings.simplefilter('ignore')
+    directory = tempfile.mkdtemp(prefix='llda-svr-search-')
+    cwd = os.getcwd()
+    try:
+        paths = synthetic.write_datasets(directory, args.scale)
+        os.chdir(directory)
+        os.environ['SVR_SKIP_LOSING_KERNELS'] = '0' if args.no_skip_kernels else '1'
+        import app2
+        client = app2.app.test_client()
+
+        runs = [('grid', 'search=grid', False), ('halving', 'search=halving', False)]
+        for budget in [budget for budget in args.budgets.split(',') if budget]:
+            name, value = budget.split('=')
+            query = f"search=halving&max_{'fits' if name == 'fits' else 'seconds'}={value}"
+            runs.append((f'halving {budget}', query, False))
+            runs.append((f'halving {budget} warm', query, True))
+
+        grid_model = None
+        for label, query, warm in runs:
+            if os.path.exists(app2.model_path) and not warm:
+                os.remove(app2.model_path)
+            if warm and grid_model is not None:
+                shutil.copy(grid_model, app2.model_path)
+            result = run(client, paths, query)
+            if label == 'grid':
+                grid_model = os.path.join(directory, 'grid_svr_model.pkl')
+                shutil.copy(app2.model_path, grid_model)
+            print(f"{label:>24}  {result['seconds']:7.2f} s  {int(result['fits']):4d} fits  "
+                  f"{int(result['candidates']):3d} configs  CV MSE {result['cv_mse']:.4g}  "
+                  f"test MSE {result['test_mse']:.4g}  R^2 {result['test_r2']:.4f}"
+                  f"{'  (budget ran out)' if result['budget_exhausted'] else ''}  {result['best_params']}", flush=True)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+"""Peak memory and time of preparing a weather upload whole against in chunks.
+
+    python benchmarks/bench_upload.py                         # 1x, 5x and 20x New_Weather.csv
+    python benchmarks/bench_upload.py --scales 1,50 --chunk-rows 20000
+
+For every scale the synthetic hourly weather of benchmarks/synthetic.py is
+written to a CSV file, then turned into monthly aggregates:
+
+    whole    pd.read_csv of the file and MonthlyWeatherStore.aggregate, as
+             train_and_evaluate did before, on an empty store
+    chunked  MonthlyWeatherStore.aggregate_chunks over pd.read_csv(chunksize=...),
+             as upload_file does now, on an empty store (every month
+             computed), on a store that already holds the upload (same) and
+             on a re-upload with one more year of rows appended
+
+Times are the best of --repeat runs; peak memory is measured with
+tracemalloc, which sees the allocations of pandas and NumPy, in one more
+run since tracing slows them down. The monthly frames are compared with
+those of whole over the same rows using pandas.testing.assert_frame_equal
+at a relative tolerance of 1e-12, the means being summed chunk by chunk;
+the script exits with status 1 on a mismatch.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import pandas as pd
+
+benchmarks_dir = os.path.dirname(os.path.abspath(__file__))
+repo_root = os.path.dirname(benchmarks_dir)
+sys.path.insert(0, benchmarks_dir)
+sys.path.insert(0, repo_root)
+
+import synthetic  # noqa: E402
+from weather_pipeline import MonthlyWeatherStore  # noqa: E402
+
+
+def whole(path, store, chunk_rows):
+    return store.aggregate(pd.read_csv(path, encoding='iso-8859-1'))
+
+
+def chunked(path, store, chunk_rows):
+    return store.aggregate_chunks(lambda: pd.read_csv(path, encoding='iso-8859-1', chunksize=chunk_rows))
+
+
+def new_store(directory, stored_path, chunk_rows):
+    """A store holding the months of stored_path, or an empty one."""
+    store = MonthlyWeatherStore(os.path.join(directory, f'store-{time.monotonic_ns()}.sqlite3'))
+    if stored_path is not None:
+        chunked(stored_path, store, chunk_rows)
+    return store
+
+
+def measure(fn, path, directory, chunk_rows, repeat, stored_path=None):
+    """(best seconds, peak bytes, months recomputed, monthly frame) of runs on a fresh store."""
+    timings = []
+    for _ in range(repeat):
+        store = new_store(directory, stored_path, chunk_rows)
+        start = time.perf_counter()
+        monthly = fn(path, store, chunk_rows)
+        timings.append(time.perf_counter() - start)
+    store = new_store(directory, stored_path, chunk_rows)
+    tracemalloc.start()
+    fn(path, store, chunk_rows)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return min(timings), peak, store.last_update['recomputed'], monthly
+
+
+def compare(result, expected):
+    try:
+        pd.testing.assert_frame_equal(result, expected, check_exact=False, rtol=1e-12)
+        return True, 'identical'
+    except AssertionError as error:
+        return False, f'MISMATCH\n{error}'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scales', default='1,5,20')
+    parser.add_argument('--chunk-rows', type=int, default=50000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    mismatched = False
+    with tempfile.TemporaryDirectory() as directory:
+        for scale in [int(scale) for scale in args.scales.split(',')]:
+            path = os.path.join(directory, f'weather-{scale}.csv')
+            extended_path = os.path.join(directory, f'weather-{scale}-extended.csv')
+            df = synthetic.weather_dataset(scale)
+            df.to_csv(path, index=False, encoding='iso-8859-1')
+            next_year = df[df['Year'] == df['Year'].max()].assign(Year=df['Year'].max() + 1)
+            pd.concat([df, next_year], ignore_index=True).to_csv(extended_path, index=False, encoding='iso-8859-1')
+            rows, megabytes = len(df), os.path.getsize(path) / 2 ** 20
+            del df, next_year
+
+            runs = [
+                ('whole', whole, path, None),
+                ('chunked', chunked, path, None),
+                ('chunked same', chunked, path, path),
+                ('chunked one more year', chunked, extended_path, path),
+            ]
+            results = {label: measure(fn, upload, directory, args.chunk_rows, args.repeat, stored)
+                       for label, fn, upload, stored in runs}
+            expected_extended = whole(extended_path, new_store(directory, None, args.chunk_rows), args.chunk_rows)
+            print(f'{scale:>4}x {rows:>9} rows {megabytes:7.1f} MiB', flush=True)
+            for label, fn, upload, stored in runs:
+                seconds, peak, recomputed, monthly = results[label]
+                ok, status = compare(monthly, expected_extended if upload == extended_path else results['whole'][3])
+                mismatched = mismatched or not ok
+                print(f'      {label:>21} {seconds * 1000:8.1f} ms peak {peak / 2 ** 20:7.1f} MiB '
+                      f'{recomputed:>5} months recomputed  {status}', flush=True)
+            os.remove(path)
+            os.remove(extended_path)
+    sys.exit(1 if mismatched else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,154 @@
+"""Parity and timing of the weather cleaning and monthly aggregation in weather_pipeline against the original versions.
+
+    python benchmarks/bench_weather.py                   # New_Weather.csv at 1x and 10x
+    python benchmarks/bench_weather.py --scales 1,10,100 --repeat 5
+
+The references below are what train_and_evaluate used to do inline:
+re.sub on every cell through DataFrame.apply, Series.map for Wind and
+Condition, then groupby().agg() with a Python mode function per month.
+For every scale both versions run on the synthetic weather data from
+benchmarks/synthetic.py, the outputs are compared with
+pandas.testing.assert_frame_equal (values and dtypes) and the best of
+--repeat runs is reported.
+
+MonthlyWeatherStore is timed on an empty store (every month computed),
+on a re-upload of the same rows and on a re-upload with one more year of
+rows appended. The script exits with status 1 on any mismatch.
+"""
+import argparse
+import os
+import re
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+benchmarks_dir = os.path.dirname(os.path.abspath(__file__))
+repo_root = os.path.dirname(benchmarks_dir)
+sys.path.insert(0, benchmarks_dir)
+sys.path.insert(0, repo_root)
+
+import synthetic  # noqa: E402
+import weather_pipeline  # noqa: E402
+
+
+def reference_clean_weather(weather_df):
+    weather_df = weather_df.copy()
+    exclude_columns = weather_pipeline.exclude_columns
+
+    def remove_non_numeric(value):
+        if isinstance(value, str) and value not in exclude_columns:
+            return re.sub(r'[^0-9.]', '', value)
+        else:
+            return value
+
+    for column in weather_df.columns:
+        if column not in exclude_columns:
+            weather_df[column] = weather_df[column].apply(remove_non_numeric)
+    numeric_columns = [col for col in weather_df.columns if col not in exclude_columns]
+    weather_df[numeric_columns] = weather_df[numeric_columns].apply(pd.to_numeric, errors='coerce')
+    weather_df['Wind'] = weather_df['Wind'].map(weather_pipeline.wind_mapping)
+    weather_df['Condition'] = weather_df['Condition'].map(weather_pipeline.condition_mapping)
+    return weather_df
+
+
+def reference_aggregate_monthly(weather_df):
+    def compute_mode(series):
+        return series.mode().iloc[0] if not series.mode().empty else None
+
+    grouped = weather_df.groupby(['Year', 'Month'])
+    return grouped.agg({
+        'Wind': compute_mode,
+        'Condition': compute_mode,
+        'Time': 'mean',
+        'Temperature': 'mean',
+        'Dew Point': 'mean',
+        'Humidity': 'mean',
+        'Wind Speed': 'mean',
+        'Wind Gust': 'mean',
+        'Pressure': 'mean',
+        'Precip.': 'mean'
+    }).reset_index()
+
+
+def reference_monthly(raw_df):
+    return reference_aggregate_monthly(reference_clean_weather(raw_df))
+
+
+def vectorized_monthly(raw_df):
+    return weather_pipeline.aggregate_monthly(weather_pipeline.clean_weather(raw_df))
+
+
+def check(result, expected):
+    try:
+        pd.testing.assert_frame_equal(result, expected)
+        return True, 'identical'
+    except AssertionError as error:
+        return False, f'MISMATCH\n{error}'
+
+
+def time_store(df, repeat):
+    """Seconds for an empty store, a repeated upload and an upload with one more year, and their parity."""
+    next_year = df[df['Year'] == df['Year'].max()].assign(Year=df['Year'].max() + 1)
+    extended = pd.concat([df, next_year], ignore_index=True)
+    expected = vectorized_monthly(extended)
+    timings = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for label, upload in [('empty', df), ('same', df), ('one more year', extended)]:
+            times = []
+            for i in range(repeat):
+                path = os.path.join(directory, f'{label}-{i}.sqlite3')
+                store = weather_pipeline.MonthlyWeatherStore(path)
+                if label != 'empty':
+                    store.aggregate(df)
+                start = time.perf_counter()
+                result = store.aggregate(upload)
+                times.append(time.perf_counter() - start)
+            timings[label] = (min(times), store.last_update['recomputed'])
+        ok, _ = check(result, expected)
+    return timings, ok
+
+
+def best_time(fn, df, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(df)
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scales', default='1,10')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    mismatched = False
+    for scale in [int(scale) for scale in args.scales.split(',')]:
+        df = synthetic.weather_dataset(scale)
+        reference_seconds, expected = best_time(reference_clean_weather, df, args.repeat)
+        seconds, result = best_time(weather_pipeline.clean_weather, df, args.repeat)
+        ok, status = check(result, expected)
+        mismatched |= not ok
+        print(f'{scale:>4}x {len(df):>9} rows  clean      per-cell {reference_seconds * 1000:9.1f} ms  '
+              f'vectorized {seconds * 1000:9.1f} ms  ({reference_seconds / seconds:5.1f}x)  {status}', flush=True)
+
+        reference_seconds, expected = best_time(reference_monthly, df, 1)
+        seconds, result = best_time(vectorized_monthly, df, args.repeat)
+        ok, status = check(result, expected)
+        mismatched |= not ok
+        print(f'{scale:>4}x {len(df):>9} rows  monthly    per-group {reference_seconds * 1000:8.1f} ms  '
+              f'vectorized {seconds * 1000:9.1f} ms  ({reference_seconds / seconds:5.1f}x)  {status}', flush=True)
+
+        timings, ok = time_store(df, args.repeat)
+        mismatched |= not ok
+        print(f'{scale:>4}x {len(df):>9} rows  store      ' + '  '.join(
+            f'{label} {seconds * 1000:.1f} ms ({recomputed} months)' for label, (seconds, recomputed) in timings.items()
+        ) + ('  identical' if ok else '  MISMATCH'), flush=True)
+    sys.exit(1 if mismatched else 0)
+
+
+if __name__ == '__main__':
+    main()
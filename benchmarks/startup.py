@@ -0,0 +1,85 @@
+"""Measure how long a fresh process takes to import app.py.
+
+    python benchmarks/startup.py                        # 5 cold starts, print the result
+    python benchmarks/startup.py --save startup.json    # also write the result as JSON
+    python benchmarks/startup.py --baseline startup.json --tolerance 0.25
+
+Each run imports app in a new interpreter from the repository root and reports
+the import time and which of the lazily loaded modules were imported. With --baseline
+the script exits with status 1 when the median import time is more than
+--tolerance above the stored median, or when a module that should load lazily
+was imported at startup.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules the serving path should not import before the first request that needs them
+lazy_modules = ['statsmodels', 'training', 'xgboost', 'sklearn.model_selection', 'sklearn.metrics']
+
+probe = '''
+import json, sys, time, warnings
+warnings.simplefilter('ignore')
+start = time.perf_counter()
+import app
+elapsed = time.perf_counter() - start
+print(json.dumps({'seconds': elapsed, 'loaded': [m for m in %r if m in sys.modules]}))
+''' % (lazy_modules,)
+
+
+def measure(runs, env=None):
+    samples = []
+    loaded = set()
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, '-c', probe], cwd=repo_root, env=env,
+                                capture_output=True, text=True, check=True).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        samples.append(result['seconds'])
+        loaded.update(result['loaded'])
+    return {
+        'runs': runs,
+        'median_seconds': statistics.median(samples),
+        'min_seconds': min(samples),
+        'max_seconds': max(samples),
+        'lazy_modules_loaded': sorted(loaded),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--save', help='write the result to this JSON file')
+    parser.add_argument('--baseline', help='compare against a result saved with --save')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed slowdown over the baseline median')
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env.pop('WARM_UP', None)
+    result = measure(args.runs, env)
+    print(json.dumps(result, indent=2))
+
+    if args.save:
+        with open(args.save, 'w') as file:
+            json.dump(result, file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        limit = baseline['median_seconds'] * (1 + args.tolerance)
+        failed = False
+        if result['median_seconds'] > limit:
+            print(f"Startup regressed: {result['median_seconds']:.3f}s > {limit:.3f}s")
+            failed = True
+        if result['lazy_modules_loaded']:
+            print(f"Imported at startup: {', '.join(result['lazy_modules_loaded'])}")
+            failed = True
+        sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""Synthetic datasets shaped like the files the API reads, at a multiple of today's row count.
+
+The real files are tiled backwards in time: copy k of every row is moved
+11 * k years earlier (the real data covers 2013-2023) and its numeric
+measurements get 1% noise, so the column layout, missing values and per
+station structure stay those of the real data. pandas cannot represent
+dates before 1677, so for the station dataset scales above 30 the rest of
+the factor comes from copies of every station under a new name.
+"""
+import math
+import os
+
+import numpy as np
+import pandas as pd
+
+repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+station_dataset_path = os.path.join(repo_root, 'updated_dataset_with_predictions.csv')
+weather_path = os.path.join(repo_root, 'New_Weather.csv')
+water_quality_path = os.path.join(repo_root, 'uploads', 'Overall-dataset-llda(west phyto) assumed_knn_imputed_final2.csv')
+
+# Span of the real data in years, each copy is shifted back by this much
+period_years = 11
+max_year_copies = 30
+
+measurement_columns = ['pH (units)', 'Ammonia (mg/L)', 'Nitrate (mg/L)', 'Inorganic Phosphate (mg/L)', 'BOD (mg/l)',
+                       'Dissolved Oxygen (mg/l)', 'Total coliforms (MPN/100ml)', 'Temperature', 'Humidity', 'Wind Speed']
+
+
+def _tile_years(df, copies, rng, noise_columns=()):
+    frames = []
+    for k in range(copies):
+        frame = df.copy()
+        frame['Year'] = frame['Year'] - period_years * k
+        if k:
+            for column in noise_columns:
+                if column in frame.columns and pd.api.types.is_numeric_dtype(frame[column]):
+                    frame[column] = frame[column] * (1 + 0.01 * rng.standard_normal(len(frame)))
+        frames.append(frame)
+    return pd.concat(frames, ignore_index=True)
+
+
+def station_dataset(scale, seed=0):
+    """Rows like updated_dataset_with_predictions.csv, scale times as many."""
+    rng = np.random.default_rng(seed)
+    df = pd.read_csv(station_dataset_path)
+    # Rows appended by predict_and_learn have no Year/Month and are not part of the data
+    df = df.dropna(subset=['Year', 'Month'])
+    year_copies = min(scale, max_year_copies)
+    station_copies = math.ceil(scale / year_copies)
+
+    tiled = _tile_years(df, year_copies, rng, measurement_columns)
+    frames = [tiled]
+    for k in range(1, station_copies):
+        replica = tiled.copy()
+        replica['Monitoring Stations'] = replica['Monitoring Stations'] + f' #{k}'
+        frames.append(replica)
+    # Trim surplus station copies, then put the oldest rows first like the real file
+    result = pd.concat(frames, ignore_index=True).iloc[:len(df) * scale]
+    return result.sort_values(['Year', 'Month'], kind='stable').reset_index(drop=True)
+
+
+def weather_dataset(scale, seed=0):
+    """Hourly rows like New_Weather.csv, with units in the cells, scale times as many."""
+    df = pd.read_csv(weather_path, encoding='iso-8859-1')
+    tiled = _tile_years(df, scale, np.random.default_rng(seed))
+    return tiled.sort_values('Year', kind='stable').reset_index(drop=True)
+
+
+def water_quality_dataset(scale, seed=0):
+    """Monthly station readings like the app2 upload, scale times as many."""
+    df = pd.read_csv(water_quality_path, encoding='latin1')
+    tiled = _tile_years(df, scale, np.random.default_rng(seed), measurement_columns)
+    return tiled.sort_values('Year', kind='stable').reset_index(drop=True)
+
+
+def write_datasets(directory, scale, seed=0):
+    """Write every synthetic dataset for one scale into directory and return their paths."""
+    uploads = os.path.join(directory, 'uploads')
+    os.makedirs(uploads, exist_ok=True)
+    paths = {
+        'station_dataset': os.path.join(directory, 'updated_dataset_with_predictions.csv'),
+        'weather': os.path.join(uploads, 'weather.csv'),
+        'water_quality': os.path.join(uploads, 'water_quality.csv'),
+    }
+    station_dataset(scale, seed).to_csv(paths['station_dataset'], index=False)
+    weather_dataset(scale, seed).to_csv(paths['weather'], index=False, encoding='iso-8859-1')
+    water_quality_dataset(scale, seed).to_csv(paths['water_quality'], index=False, encoding='latin1')
+    return paths
@@ -0,0 +1,78 @@
+"""Convert the pickled XGBoost models and scalers to the native formats app.py loads.
+
+    python convert_models.py            # xgb_model.pkl, xgb_scaler.pkl and the *2 export pair
+    python convert_models.py --registry models
+
+Each converted pair is checked against the pickles on random inputs before
+the pickles are left behind. The other *.pkl files in the repository
+(random forest, gradient boosting, SVR) are scikit-learn estimators that the
+API does not load and are not touched.
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from model_artifacts import load_pickle, load_scaler, load_xgb_model, save_scaler, save_xgb_model
+
+pairs = [
+    ('xgb_model.pkl', 'xgb_scaler.pkl', 'xgb_model.ubj', 'xgb_scaler.npz'),
+    ('xgb_model2.pkl', 'xgb_scaler2.pkl', 'xgb_model2.ubj', 'xgb_scaler2.npz'),
+]
+
+
+def check_predictions(old_model, old_scaler, new_model, new_scaler, rows=256):
+    """Largest absolute difference between old and new predictions on random inputs."""
+    rng = np.random.default_rng(0)
+    X = old_scaler.mean_ + rng.standard_normal((rows, old_scaler.mean_.shape[0])) * old_scaler.scale_
+    if hasattr(old_scaler, 'feature_names_in_'):
+        X = pd.DataFrame(X, columns=old_scaler.feature_names_in_)
+    old = old_model.predict(old_scaler.transform(X))
+    new = new_model.predict(new_scaler.transform(X))
+    return float(np.max(np.abs(old - new)))
+
+
+def convert_pair(model_pkl, scaler_pkl, model_out, scaler_out):
+    old_model = load_pickle(model_pkl)
+    old_scaler = load_pickle(scaler_pkl)
+    save_xgb_model(old_model, model_out)
+    save_scaler(old_scaler, scaler_out)
+
+    new_model = load_xgb_model(model_out)
+    new_scaler = load_scaler(scaler_out)
+    difference = check_predictions(old_model, old_scaler, new_model, new_scaler)
+    if difference > 1e-3:
+        raise ValueError(f'{model_out} predicts differently from {model_pkl} (max difference {difference})')
+
+    start = time.perf_counter()
+    load_pickle(model_pkl), load_pickle(scaler_pkl)
+    pickle_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    load_xgb_model(model_out), load_scaler(scaler_out)
+    native_seconds = time.perf_counter() - start
+    print(f'{model_pkl} -> {model_out}, {scaler_pkl} -> {scaler_out}: '
+          f'load {pickle_seconds * 1000:.1f} ms -> {native_seconds * 1000:.1f} ms, max difference {difference:.3g}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--registry', help='also convert pickled versions in this model registry directory')
+    args = parser.parse_args()
+
+    for model_pkl, scaler_pkl, model_out, scaler_out in pairs:
+        if os.path.exists(model_pkl) and os.path.exists(scaler_pkl):
+            convert_pair(model_pkl, scaler_pkl, model_out, scaler_out)
+
+    if args.registry:
+        for name in sorted(os.listdir(args.registry)):
+            version_dir = os.path.join(args.registry, name)
+            model_pkl = os.path.join(version_dir, 'model.pkl')
+            scaler_pkl = os.path.join(version_dir, 'scaler.pkl')
+            if os.path.exists(model_pkl) and os.path.exists(scaler_pkl):
+                convert_pair(model_pkl, scaler_pkl, os.path.join(version_dir, 'model.ubj'), os.path.join(version_dir, 'scaler.npz'))
+
+
+if __name__ == '__main__':
+    main()
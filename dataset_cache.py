@@ -0,0 +1,124 @@
+import json
+import os
+import shutil
+import threading
+
+import numpy as np
+import pandas as pd
+
+from model_registry import file_fingerprint
+
+
+class ColumnarDatasetCache:
+    """Typed, memory-mapped copies of the training columns of dataset CSVs, keyed by content hash.
+
+    The first load of a CSV parses it, keeps its complete rows (dropna over
+    every column, as training always did) and writes the requested columns
+    as one .npy file each. Later loads map those files read-only, so only
+    the pages training touches are read and nothing is parsed again. An
+    entry is used until the content of its CSV changes; the entry of the
+    previous content is then removed. Loaded with a KNNImputation, the
+    missing values are imputed before dropna and the entry is kept apart
+    from the one without, under the imputer's key.
+
+    Layout:
+        <root>/<sha1 of the CSV>[-<imputer key>]/<i>.npy        column i, with the dtype pd.read_csv gave it
+        <root>/<sha1 of the CSV>[-<imputer key>]/columns.json   column names, row count and source file
+    """
+
+    def __init__(self, root, columns):
+        self.root = root
+        self.columns = list(columns)
+        # path -> ((mtime, size), sha1), so an unchanged file is not hashed again
+        self.hashes = {}
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        if not os.path.exists(self.root):
+            os.makedirs(self.root)
+
+    def after_fork(self):
+        """Replace the lock in a forked process, where a thread of the parent may have held it."""
+        self.lock = threading.Lock()
+
+    def content_hash(self, path):
+        """SHA-1 of a file's contents, recomputed only when its mtime or size changed."""
+        stat = os.stat(path)
+        signature = (stat.st_mtime_ns, stat.st_size)
+        known = self.hashes.get(path)
+        if known is not None and known[0] == signature:
+            return known[1]
+        digest = file_fingerprint(path)
+        self.hashes[path] = (signature, digest)
+        return digest
+
+    def _entry_dir(self, digest):
+        return os.path.join(self.root, digest)
+
+    def _read(self, digest):
+        entry_dir = self._entry_dir(digest)
+        with open(os.path.join(entry_dir, 'columns.json')) as file:
+            metadata = json.load(file)
+        if metadata['columns'] != self.columns:
+            raise ValueError('Cached for other columns')
+        arrays = {column: np.load(os.path.join(entry_dir, f'{i}.npy'), mmap_mode='r', allow_pickle=False)
+                  for i, column in enumerate(metadata['columns'])}
+        # copy=False keeps every column a view of its mapped file
+        return pd.DataFrame(arrays, copy=False)
+
+    def _write(self, digest, path, imputer=None):
+        df = pd.read_csv(path)
+        if imputer is not None:
+            df = imputer.impute(df, os.path.basename(path))
+        df = df.dropna()
+        missing = [column for column in self.columns if column not in df.columns]
+        if missing:
+            raise KeyError(f"Dataset '{os.path.basename(path)}' has no column {', '.join(missing)}")
+
+        # Written into a temporary directory and renamed, so an entry is never seen half written
+        tmp_dir = os.path.join(self.root, f'.tmp-{digest}-{os.getpid()}-{threading.get_ident()}')
+        os.makedirs(tmp_dir)
+        for i, column in enumerate(self.columns):
+            np.save(os.path.join(tmp_dir, f'{i}.npy'), df[column].to_numpy(), allow_pickle=False)
+        with open(os.path.join(tmp_dir, 'columns.json'), 'w') as file:
+            json.dump({'columns': self.columns, 'rows': len(df), 'source': os.path.abspath(path)}, file)
+        try:
+            os.rename(tmp_dir, self._entry_dir(digest))
+        except OSError:
+            # Another process wrote the same entry first
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        self._remove_stale(digest, os.path.abspath(path))
+
+    def _remove_stale(self, digest, source):
+        """Remove the entries of earlier contents of the same file, with or without an imputer."""
+        content = digest.split('-')[0]
+        for name in os.listdir(self.root):
+            # Entries of the same contents under another imputer key are still current
+            if name.split('-')[0] == content or name.startswith('.'):
+                continue
+            try:
+                with open(os.path.join(self._entry_dir(name), 'columns.json')) as file:
+                    stale = json.load(file)['source'] == source
+            except (OSError, ValueError, KeyError):
+                continue
+            if stale:
+                shutil.rmtree(self._entry_dir(name), ignore_errors=True)
+
+    def load(self, path, imputer=None):
+        """Complete rows of the dataset's columns, memory-mapped from the cache."""
+        digest = self.content_hash(path)
+        if imputer is not None:
+            digest = f'{digest}-{imputer.key}'
+        try:
+            df = self._read(digest)
+            self.hits += 1
+            return df
+        except OSError:
+            pass
+        except (ValueError, KeyError):
+            # Unreadable, or written for other columns
+            shutil.rmtree(self._entry_dir(digest), ignore_errors=True)
+        with self.lock:
+            self._write(digest, path, imputer)
+        self.misses += 1
+        return self._read(digest)
@@ -0,0 +1,79 @@
+import os
+import threading
+
+import pandas as pd
+
+from metrics import span
+
+
+def _index_by_month(df):
+    dates = pd.to_datetime(df[['Year', 'Month']].assign(DAY=1))
+    return df.assign(Date=dates).set_index('Date')
+
+
+class DatasetSnapshot:
+    """One parse of the station CSV, with the cleaned rows of each station pre-indexed."""
+
+    def __init__(self, df, signature, predictions=None):
+        self.signature = signature
+        self.columns = list(df.columns)
+        self.frames = {}
+        for station_name, group in df.groupby('Monitoring Stations', sort=False):
+            # Same cleaning predict_and_learn applied per request: complete rows, monthly dates
+            self.frames[station_name] = _index_by_month(group.dropna())
+
+        # Logged predictions only carry the columns the model uses, so they are cleaned separately
+        if predictions is not None and not predictions.empty:
+            for station_name, group in predictions.groupby('Monitoring Stations', sort=False):
+                group = _index_by_month(group.dropna())
+                if station_name in self.frames:
+                    group = pd.concat([self.frames[station_name], group]).sort_index(kind='stable')
+                self.frames[station_name] = group
+        self._empty = df.iloc[0:0].set_index(pd.DatetimeIndex([], name='Date'))
+
+    def station_frame(self, station_name):
+        """Return the date-indexed rows of a station; the frame is shared, do not modify it."""
+        return self.frames.get(station_name, self._empty)
+
+    def date_index(self, station_name):
+        return self.station_frame(station_name).index
+
+
+class StationDataset:
+    """Keep the latest snapshot of a CSV file, reparsing it only when its mtime or size changes.
+
+    Logged predictions are left out of the snapshot unless include_predictions
+    is set and a PredictionLog is given.
+    """
+
+    def __init__(self, path, prediction_log=None, include_predictions=False):
+        self.path = path
+        self.prediction_log = prediction_log
+        self.include_predictions = include_predictions and prediction_log is not None
+        self.snapshot = None
+        self.loads = 0
+        self.lock = threading.Lock()
+
+    def after_fork(self):
+        """Replace the lock in a forked process, where a thread of the parent may have held it."""
+        self.lock = threading.Lock()
+
+    def _signature(self):
+        stat = os.stat(self.path)
+        if self.include_predictions:
+            return (stat.st_mtime_ns, stat.st_size, self.prediction_log.last_id())
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def get(self):
+        """Return the current snapshot, reloading the file if it changed on disk."""
+        signature = self._signature()
+        snapshot = self.snapshot
+        if snapshot is not None and snapshot.signature == signature:
+            return snapshot
+        with self.lock:
+            if self.snapshot is None or self.snapshot.signature != signature:
+                with span('dataset_load'):
+                    predictions = self.prediction_log.to_frame() if self.include_predictions else None
+                    self.snapshot = DatasetSnapshot(pd.read_csv(self.path), signature, predictions)
+                self.loads += 1
+            return self.snapshot
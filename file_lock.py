@@ -0,0 +1,50 @@
+import threading
+
+try:
+    import fcntl
+except ImportError:
+    # No flock on Windows, where the app runs as a single process anyway
+    fcntl = None
+
+
+class FileLock:
+    """Exclusive lock held across the threads of this process and every process using the same path.
+
+    The lock file is created if needed and never removed.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.thread_lock = threading.Lock()
+        self.file = None
+
+    def after_fork(self):
+        """Start unlocked in a forked process, whose copy may have been taken while a thread held the lock.
+
+        The inherited file is only closed; the parent still unlocks it.
+        """
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        self.thread_lock = threading.Lock()
+
+    def __enter__(self):
+        self.thread_lock.acquire()
+        try:
+            if fcntl is not None:
+                self.file = open(self.path, 'a')
+                fcntl.flock(self.file, fcntl.LOCK_EX)
+        except BaseException:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+            self.thread_lock.release()
+            raise
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.file is not None:
+            fcntl.flock(self.file, fcntl.LOCK_UN)
+            self.file.close()
+            self.file = None
+        self.thread_lock.release()
@@ -0,0 +1,156 @@
+import numpy as np
+
+
+# Variance of the approximate diffuse prior on the differencing states, SARIMAX's default
+initial_variance = 1e6
+
+# Doubling passes for the stationary covariance, covering 2^passes powers of the transition
+lyapunov_passes = 40
+
+
+def _polynomial(coefficients, step, sign):
+    """Lag polynomial 1 + sign * (c1 L^step + c2 L^2step + ...) as an array of coefficients."""
+    polynomial = np.zeros(len(coefficients) * step + 1)
+    polynomial[0] = 1.0
+    polynomial[step::step] = sign * np.asarray(coefficients, dtype=float)
+    return polynomial
+
+
+def arma_polynomials(params, order, seasonal_order):
+    """AR and MA lag polynomials of SARIMAX parameters, ordered like SARIMAX().params.
+
+    Only models without trend or exogenous regressors are supported, which is
+    every model the app fits: ar.L*, ma.L*, ar.S.L*, ma.S.L*, sigma2.
+    """
+    p, _, q = order
+    seasonal_p, _, seasonal_q, season = seasonal_order
+    params = np.asarray(params, dtype=float)
+    if len(params) != p + q + seasonal_p + seasonal_q + 1:
+        raise ValueError(f'Expected {p + q + seasonal_p + seasonal_q + 1} SARIMAX parameters, got {len(params)}')
+    ar, params = params[:p], params[p:]
+    ma, params = params[:q], params[q:]
+    seasonal_ar, params = params[:seasonal_p], params[seasonal_p:]
+    seasonal_ma, sigma2 = params[:seasonal_q], params[seasonal_q]
+    ar_polynomial = np.convolve(_polynomial(ar, 1, -1.0), _polynomial(seasonal_ar, season, -1.0))
+    ma_polynomial = np.convolve(_polynomial(ma, 1, 1.0), _polynomial(seasonal_ma, season, 1.0))
+    return ar_polynomial, ma_polynomial, sigma2
+
+
+def state_space(params_list, order, seasonal_order):
+    """Design vector, transition, state covariance and initial covariance of every model, stacked.
+
+    The representation is the one SARIMAX builds with its defaults
+    (simple_differencing=False, enforce_stationarity=True): d + s * D
+    differencing states with an approximate diffuse prior of variance
+    initial_variance, followed by the ARMA states in Harvey's form with their
+    stationary covariance, so the filter reproduces SARIMAX's predictions.
+    """
+    _, d, _ = order
+    _, seasonal_d, _, season = seasonal_order
+    count = len(params_list)
+    k_diff = d + season * seasonal_d
+    polynomials = [arma_polynomials(params, order, seasonal_order) for params in params_list]
+    k_order = max(1, max(max(len(ar) - 1, len(ma)) for ar, ma, _ in polynomials))
+    k_states = k_diff + k_order
+    seasonal_design = ([0.0] * (season - 1) + [1.0]) * seasonal_d
+
+    design = np.zeros(k_states)
+    design[:d] = 1.0
+    design[d:k_diff] = seasonal_design
+    design[k_diff] = 1.0
+
+    transition = np.zeros((count, k_states, k_states))
+    arma = np.s_[k_diff:, k_diff:]
+    transition[:, k_diff + np.arange(k_order - 1), k_diff + np.arange(1, k_order)] = 1.0
+    for j in range(seasonal_d):
+        start = d + j * season
+        transition[:, start + np.arange(1, season), start + np.arange(season - 1)] = 1.0
+        transition[:, start, start + season - 1] = 1.0
+        if j < seasonal_d - 1:
+            transition[:, start, start + 2 * season - 1] = 1.0
+        transition[:, start, k_diff] = 1.0
+    if d:
+        transition[:, np.triu_indices(d)[0], np.triu_indices(d)[1]] = 1.0
+        transition[:, :d, d:k_diff] = seasonal_design
+        transition[:, :d, k_diff] = 1.0
+
+    selection = np.zeros((count, k_states))
+    for i, (ar, ma, _) in enumerate(polynomials):
+        transition[i, k_diff:k_diff + len(ar) - 1, k_diff] = -ar[1:]
+        selection[i, k_diff:k_diff + len(ma)] = ma
+    sigma2 = np.array([variance for _, _, variance in polynomials])
+    state_cov = sigma2[:, None, None] * selection[:, :, None] * selection[:, None, :]
+
+    # Stationary covariance of the ARMA states by doubling: P = sum_k T^k Q T'^k, twice as many terms per pass
+    power = transition[(slice(None),) + arma]
+    arma_cov = state_cov[(slice(None),) + arma]
+    for _ in range(lyapunov_passes):
+        arma_cov = arma_cov + power @ arma_cov @ power.transpose(0, 2, 1)
+        power = power @ power
+        if np.abs(power).max() < 1e-15:
+            break
+    initial_cov = np.zeros((count, k_states, k_states))
+    initial_cov[:, np.arange(k_diff), np.arange(k_diff)] = initial_variance
+    initial_cov[(slice(None),) + arma] = arma_cov
+    return design, transition, state_cov, initial_cov
+
+
+def forecast_batch(series_list, params_list, order, seasonal_order, steps):
+    """Forecast many SARIMA series with the same orders at once, with NumPy only.
+
+    series_list holds 1-d arrays of consecutive observations without missing
+    values and params_list the fitted SARIMAX parameters of each. Returns an
+    array of shape (len(series_list), steps) with the forecasts for the steps
+    periods after the last observation of each series, the same values as
+    SARIMAX(series).filter(params).get_forecast(steps) up to rounding.
+
+    All series share one state space shape (see state_space) and one Kalman
+    filter loop runs over all of them, every step a few batched matrix
+    products. Series are aligned on their last observation; a shorter series
+    keeps its initial state until its first observation comes up.
+    """
+    count = len(series_list)
+    design, transition, state_cov, cov = state_space(params_list, order, seasonal_order)
+    transition_t = transition.transpose(0, 2, 1)
+
+    lengths = np.array([len(series) for series in series_list])
+    observed = np.zeros((count, lengths.max()))
+    for i, series in enumerate(series_list):
+        observed[i, observed.shape[1] - lengths[i]:] = np.asarray(series, dtype=float)
+    first = observed.shape[1] - lengths
+
+    state = np.zeros((count, len(design)))
+    for t in range(observed.shape[1]):
+        started = first <= t
+        cov_design = cov @ design
+        variance = cov_design @ design
+        gain = cov_design / np.where(started, variance, 1.0)[:, None]
+        updated_state = state + gain * (observed[:, t] - state @ design)[:, None]
+        updated_cov = cov - gain[:, :, None] * cov_design[:, None, :]
+        updated_state = (transition @ updated_state[:, :, None])[:, :, 0]
+        updated_cov = transition @ updated_cov @ transition_t + state_cov
+        state = np.where(started[:, None], updated_state, state)
+        cov = np.where(started[:, None, None], updated_cov, cov)
+
+    forecasts = np.empty((count, steps))
+    for h in range(steps):
+        forecasts[:, h] = state @ design
+        state = (transition @ state[:, :, None])[:, :, 0]
+    return forecasts
+
+
+def statsmodels_forecast(series_list, params_list, order, seasonal_order, steps):
+    """Reference engine: SARIMAX(series).filter(params).get_forecast(steps) for every series in turn."""
+    from statsmodels.tsa.statespace.sarimax import SARIMAX
+    forecasts = np.empty((len(series_list), steps))
+    for i, (series, params) in enumerate(zip(series_list, params_list)):
+        model_fit = SARIMAX(np.asarray(series, dtype=float), order=order, seasonal_order=seasonal_order).filter(params)
+        forecasts[i] = model_fit.get_forecast(steps=steps).predicted_mean
+    return forecasts
+
+
+# Forecasting engines by name, all called as engine(series_list, params_list, order, seasonal_order, steps)
+engines = {
+    'statsmodels': statsmodels_forecast,
+    'numpy': forecast_batch,
+}
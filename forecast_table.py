@@ -0,0 +1,147 @@
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from file_lock import FileLock
+
+
+def month_number(date):
+    return date.year * 12 + date.month - 1
+
+
+class ForecastTable:
+    """Precomputed forecasts of the next months, read by lookup instead of forecasting per request.
+
+    For every station the table holds the SARIMA forecast of each parameter
+    for the horizon months after its last observation, and the XGBoost
+    phytoplankton prediction for those forecasts with the default weather.
+    A table is valid for one key, a string naming the dataset snapshot,
+    model version, horizon and weather it was built from; lookups with
+    another key miss, so the caller falls back to live forecasting until
+    the table is rebuilt.
+
+    With a path the table is also written as an .npz file, replaced
+    atomically, so other workers and restarted processes serve it without
+    computing it again. Builders hold build_lock, a file lock next to it, so
+    only one worker computes a table at a time and the others find it built.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        # (key, rows, weather) swapped as one reference, like ServingModel.current
+        self.table = (None, {}, None)
+        self.file_mtime = None
+        self.builds = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.build_lock = FileLock(f'{path}.lock') if path else threading.Lock()
+        self._reload()
+
+    def after_fork(self):
+        """Replace the locks in a forked process, where a build of the parent may have held them."""
+        self.lock = threading.Lock()
+        if isinstance(self.build_lock, FileLock):
+            self.build_lock.after_fork()
+        else:
+            self.build_lock = threading.Lock()
+
+    def build(self, key, station_frames, curves, parameters, model, scaler, weather, horizon):
+        """Fill the table from forecast curves and save it.
+
+        curves maps station -> {parameter: array}, as ForecastCurves.get
+        returns them, each at least horizon months long. weather maps the
+        weather features to their default values, in the order the scaler
+        expects them before the parameters.
+        """
+        stations = list(station_frames)
+        forecasts = np.array([[curves[station_name][parameter][:horizon] for parameter in parameters]
+                              for station_name in stations]).transpose(0, 2, 1)
+        weather_values = np.broadcast_to(np.array(list(weather.values()), dtype=float), forecasts.shape[:2] + (len(weather),))
+        features = pd.DataFrame(np.concatenate([weather_values, forecasts], axis=2).reshape(-1, len(weather) + len(parameters)),
+                                columns=list(weather) + list(parameters))
+        phytoplankton = model.predict(scaler.transform(features)).reshape(len(stations), horizon)
+        first_months = np.array([month_number(station_frames[station_name].index[-1]) + 1 for station_name in stations])
+
+        arrays = {
+            'key': np.asarray(key),
+            'stations': np.asarray(stations, dtype=str),
+            'parameters': np.asarray(parameters, dtype=str),
+            'first_months': first_months,
+            'forecasts': forecasts,
+            'phytoplankton': phytoplankton.astype(float),
+            'weather_features': np.asarray(list(weather), dtype=str),
+            'weather': np.array(list(weather.values()), dtype=float),
+        }
+        if self.path:
+            tmp_path = f'{self.path}.{os.getpid()}.tmp'
+            with open(tmp_path, 'wb') as file:
+                np.savez(file, **arrays)
+            os.replace(tmp_path, self.path)
+            self.file_mtime = os.stat(self.path).st_mtime_ns
+        self._install(arrays)
+        self.builds += 1
+
+    def _install(self, arrays):
+        # Python lists of plain floats, so a lookup is two indexing operations
+        parameters = [str(parameter) for parameter in arrays['parameters']]
+        rows = {}
+        for i, station_name in enumerate(arrays['stations']):
+            values = arrays['forecasts'][i].tolist()
+            predictions = arrays['phytoplankton'][i].tolist()
+            rows[str(station_name)] = (int(arrays['first_months'][i]),
+                                       [(dict(zip(parameters, month)), prediction)
+                                        for month, prediction in zip(values, predictions)])
+        weather = dict(zip([str(name) for name in arrays['weather_features']], arrays['weather'].tolist()))
+        self.table = (str(arrays['key']), rows, weather)
+
+    def _reload(self):
+        """Load the table from disk if another process wrote a newer one."""
+        if not self.path:
+            return
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            return
+        if mtime == self.file_mtime:
+            return
+        with self.lock:
+            try:
+                with np.load(self.path, allow_pickle=False) as arrays:
+                    self._install({name: arrays[name] for name in arrays.files})
+            except (OSError, ValueError, KeyError):
+                return
+            self.file_mtime = mtime
+
+    @property
+    def key(self):
+        return self.table[0]
+
+    def current(self, key):
+        """Whether the table was built for this key, reloading it from disk if it was not."""
+        if self.table[0] != key:
+            self._reload()
+        return self.table[0] == key
+
+    def lookup(self, key, station_name, target_date):
+        """(forecasts, phytoplankton prediction for the default weather) of a month, or None.
+
+        None when the table is for another key or the month is outside it.
+        The forecasts dict is shared, do not modify it.
+        """
+        table = self.table
+        if table[0] != key:
+            self._reload()
+            table = self.table
+            if table[0] != key:
+                self.misses += 1
+                return None
+        first_month, months = table[1].get(station_name, (0, []))
+        index = month_number(target_date) - first_month
+        if not 0 <= index < len(months):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return months[index]
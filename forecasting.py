@@ -0,0 +1,311 @@
+import multiprocessing
+import threading
+import warnings
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+
+import numpy as np
+import pandas as pd
+
+from forecast_engines import engines
+from metrics import span
+
+
+def ignore_sarima_warnings():
+    """Silence the warnings SARIMAX raises for the station series on every fit."""
+    warnings.filterwarnings("ignore", message="Non-invertible starting MA parameters found. Using zeros as starting parameters.")
+    warnings.filterwarnings("ignore", message="A date index has been provided, but it has no associated frequency information and so will be ignored when e.g. forecasting.")
+    warnings.filterwarnings("ignore", message="No supported index is available. Prediction results will be given with an integer index beginning at `start`.")
+    warnings.filterwarnings("ignore", message="No supported index is available. In the next version, calling this method in a model without a supported index will result in an exception.")
+
+
+def forecast_steps_to(last_date, target_date):
+    """Number of monthly periods from the last observed date to the target date."""
+    return (target_date.year - last_date.year) * 12 + (target_date.month - last_date.month)
+
+
+def fit_error_message(parameter, station_name, e):
+    return f'An error occurred while fitting the model for {parameter} at {station_name}: {e}'
+
+
+def forecast_error_message(parameter, station_name, e):
+    return f'Error in SARIMA for {parameter} at {station_name}: {e}'
+
+
+def forecast_model(model_fit, steps, full_path=False):
+    """Forecast a fitted model; the value at the last step, or the whole path as an array."""
+    forecast = model_fit.get_forecast(steps=steps).predicted_mean
+    if full_path:
+        return forecast.values.astype(float)
+    return float(forecast.values[-1])
+
+
+def engine_paths(engine, known, order, seasonal_order):
+    """Forecast paths of series with known parameters from a batch engine, keyed like known.
+
+    known maps keys to (series, params, steps). With the 'statsmodels'
+    engine, or when the batch fails, nothing is returned and the caller
+    forecasts every series through its results object, which also tells
+    which series failed.
+    """
+    if engine == 'statsmodels' or not known:
+        return {}
+    keys = list(known)
+    if min(known[key][2] for key in keys) < 1:
+        return {}
+    try:
+        with span('sarima_forecast_batch', engine=engine):
+            paths = engines[engine]([known[key][0].values for key in keys], [known[key][1] for key in keys],
+                                    order, seasonal_order, max(known[key][2] for key in keys))
+    except Exception:
+        return {}
+    if not np.isfinite(paths).all():
+        return {}
+    return {key: paths[i, :known[key][2]] for i, key in enumerate(keys)}
+
+
+def _fit_and_forecast(series, order, seasonal_order, steps, full_path=False):
+    """Fit one SARIMA model and forecast it; runs inside a pool worker."""
+    from statsmodels.tsa.statespace.sarimax import SARIMAX
+    ignore_sarima_warnings()
+    try:
+        model_fit = SARIMAX(series, order=order, seasonal_order=seasonal_order).fit(disp=False)
+    except Exception as e:
+        return 'fit', None, None, str(e)
+    try:
+        forecast_value = forecast_model(model_fit, steps, full_path)
+    except Exception as e:
+        return 'forecast', model_fit.params, None, str(e)
+    return None, model_fit.params, forecast_value, None
+
+
+# Pool shared by every request of this Flask worker, created on first use
+_executor = None
+_executor_workers = None
+
+
+def get_executor(workers):
+    """Return the process pool, recreating it if the worker count changed."""
+    global _executor, _executor_workers
+    if _executor is None or _executor_workers != workers:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+        # Spawned workers do not inherit the locks held by Flask's request threads
+        _executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+        _executor_workers = workers
+    return _executor
+
+
+def forget_executor():
+    """Drop a pool inherited through fork; its worker processes belong to the parent."""
+    global _executor, _executor_workers
+    _executor = None
+    _executor_workers = None
+
+
+def shutdown_executor():
+    global _executor, _executor_workers
+    if _executor is not None:
+        _executor.shutdown(wait=True, cancel_futures=True)
+    _executor = None
+    _executor_workers = None
+
+
+def forecast_grid(cache, station_frames, parameters, target_date, order, seasonal_order,
+                  execution='serial', workers=1, timeout=None, full_path=False, engine='statsmodels'):
+    """Forecast every station x parameter series at the target date.
+
+    station_frames maps each station name to its cleaned, date-indexed rows, in
+    the order results should be reported. Returns (forecasts, error) where
+    forecasts maps station -> {parameter: value} and error is the message of
+    the first failing series in that order, or None. With full_path the value
+    is the array of monthly forecasts from the month after the last
+    observation up to the target date.
+
+    Fitted models are forecast by the named engine from forecast_engines,
+    all in one call for the non-reference engines.
+    """
+    tasks = [(station_name, parameter) for station_name in station_frames for parameter in parameters]
+    steps = {station_name: forecast_steps_to(frame.index[-1], target_date)
+             for station_name, frame in station_frames.items()}
+
+    forecasts = {station_name: {} for station_name in station_frames}
+
+    def cached_params(station_name, parameter, series):
+        # Batch engines only need the parameters, a results object is built on a miss or an extension
+        if engine == 'statsmodels':
+            return None
+        return cache.get_params(station_name, parameter, series, order, seasonal_order)
+
+    def forecast_cached(station_name, parameter, series, model_fit, path):
+        if path is not None:
+            return path.astype(float) if full_path else float(path[-1])
+        if model_fit is None:
+            model_fit = cache.get_or_fit(station_name, parameter, series, order, seasonal_order)
+        return forecast_model(model_fit, steps[station_name], full_path)
+
+    if execution != 'process':
+        fitted = {}
+        fit_error = None
+        for station_name, parameter in tasks:
+            series = station_frames[station_name][parameter]
+            model_fit = None
+            params = cached_params(station_name, parameter, series)
+            if params is None:
+                try:
+                    model_fit = cache.get_or_fit(station_name, parameter, series, order, seasonal_order)
+                except Exception as e:
+                    fit_error = fit_error_message(parameter, station_name, e)
+                    break
+                params = model_fit.params
+            fitted[(station_name, parameter)] = (series, model_fit, params)
+
+        paths = engine_paths(engine, {key: (series, params, steps[key[0]]) for key, (series, _, params) in fitted.items()},
+                             order, seasonal_order)
+        for (station_name, parameter), (series, model_fit, _) in fitted.items():
+            try:
+                with span('sarima_forecast', station=station_name, parameter=parameter):
+                    forecasts[station_name][parameter] = forecast_cached(
+                        station_name, parameter, series, model_fit, paths.get((station_name, parameter)))
+            except Exception as e:
+                return forecasts, forecast_error_message(parameter, station_name, e)
+        return forecasts, fit_error
+
+    # Cached fits are forecast in this process, only the misses go to the pool
+    executor = get_executor(workers)
+    pending = {}
+    known = {}
+    for station_name, parameter in tasks:
+        series = station_frames[station_name][parameter]
+        params = cached_params(station_name, parameter, series)
+        if params is not None:
+            known[(station_name, parameter)] = (series, params, steps[station_name])
+            pending[(station_name, parameter)] = None
+            continue
+        model_fit = cache.get(station_name, parameter, series, order, seasonal_order)
+        if model_fit is None:
+            pending[(station_name, parameter)] = executor.submit(
+                _fit_and_forecast, series, order, seasonal_order, steps[station_name], full_path)
+        else:
+            known[(station_name, parameter)] = (series, model_fit.params, steps[station_name])
+            pending[(station_name, parameter)] = model_fit
+    paths = engine_paths(engine, known, order, seasonal_order)
+
+    try:
+        for station_name, parameter in tasks:
+            series = station_frames[station_name][parameter]
+            task = pending[(station_name, parameter)]
+            if hasattr(task, 'result'):
+                try:
+                    # Fit and forecast happen in the worker, only the wait is visible here
+                    with span('sarima_pool_wait', station=station_name, parameter=parameter):
+                        error_stage, params, forecast_value, error = task.result(timeout=timeout)
+                except TimeoutError:
+                    return forecasts, fit_error_message(parameter, station_name, f'timed out after {timeout} seconds')
+                except Exception as e:
+                    return forecasts, fit_error_message(parameter, station_name, e)
+                if params is not None:
+                    cache.put(station_name, parameter, series, order, seasonal_order, params=params)
+                if error_stage == 'fit':
+                    return forecasts, fit_error_message(parameter, station_name, error)
+                if error_stage == 'forecast':
+                    return forecasts, forecast_error_message(parameter, station_name, error)
+                forecasts[station_name][parameter] = forecast_value
+            else:
+                try:
+                    with span('sarima_forecast', station=station_name, parameter=parameter):
+                        forecasts[station_name][parameter] = forecast_cached(
+                            station_name, parameter, series, task, paths.get((station_name, parameter)))
+                except Exception as e:
+                    return forecasts, forecast_error_message(parameter, station_name, e)
+    finally:
+        for task in pending.values():
+            if hasattr(task, 'cancel'):
+                task.cancel()
+    return forecasts, None
+
+
+class ForecastCurves:
+    """Whole forecast paths per (station, parameter), reused for every target month.
+
+    Each curve is a NumPy array whose element i is the forecast for i + 1
+    months after the last observation of the station. Curves are computed
+    together for the dataset snapshot they were built from and are dropped
+    when the snapshot signature changes. One caller computes missing curves
+    at a time; the others wait for it and only compute what it left out, so
+    a request arriving during the forecast table build does not fit the same
+    models again.
+    """
+
+    def __init__(self, cache, horizon, order, seasonal_order):
+        self.cache = cache
+        self.horizon = horizon
+        self.order = order
+        self.seasonal_order = seasonal_order
+        self.signature = None
+        self.curves = {}
+        self.lock = threading.Lock()
+        self.compute_lock = threading.Lock()
+
+    def after_fork(self):
+        """Replace the locks in a forked process, where a thread of the parent may have held them."""
+        self.lock = threading.Lock()
+        self.compute_lock = threading.Lock()
+
+    def _known(self, signature):
+        with self.lock:
+            if self.signature != signature:
+                self.signature = signature
+                self.curves = {}
+            return dict(self.curves)
+
+    def _stale(self, curves, station_frames, parameters, target_date):
+        """(frames of the stations missing curves up to target_date, target month to forecast them to)."""
+        needed_target = target_date
+        stale = {}
+        for station_name, frame in station_frames.items():
+            last_date = frame.index[-1]
+            steps = self.horizon
+            if target_date is not None:
+                steps = max(steps, forecast_steps_to(last_date, target_date))
+            station_curves = curves.get(station_name, {})
+            if any(parameter not in station_curves or len(station_curves[parameter]) < steps for parameter in parameters):
+                stale[station_name] = frame
+                station_target = last_date + pd.DateOffset(months=steps)
+                if needed_target is None or station_target > needed_target:
+                    needed_target = station_target
+        return stale, needed_target
+
+    def get(self, signature, station_frames, parameters, target_date=None, **grid_options):
+        """Return (curves, error) covering every station and parameter up to target_date.
+
+        curves maps station -> {parameter: array}. Missing or too short curves
+        are recomputed with forecast_grid, using at least the configured
+        horizon.
+        """
+        curves = self._known(signature)
+        stale, needed_target = self._stale(curves, station_frames, parameters, target_date)
+        if stale:
+            with self.compute_lock:
+                # The caller holding the lock before may have computed them meanwhile
+                curves = self._known(signature)
+                stale, needed_target = self._stale(curves, station_frames, parameters, target_date)
+                if stale:
+                    computed, error = forecast_grid(self.cache, stale, parameters, needed_target, self.order,
+                                                    self.seasonal_order, full_path=True, **grid_options)
+                    if error is not None:
+                        return None, error
+                    for station_name, station_curves in computed.items():
+                        curves[station_name] = {**curves.get(station_name, {}), **station_curves}
+                    with self.lock:
+                        if self.signature == signature:
+                            self.curves.update({station_name: curves[station_name] for station_name in computed})
+
+        return {station_name: curves[station_name] for station_name in station_frames}, None
+
+    @staticmethod
+    def value(curve, last_date, target_date):
+        """Forecast for the target month, read from a curve by index."""
+        steps = forecast_steps_to(last_date, target_date)
+        if steps < 1:
+            raise ValueError(f'{target_date.date()} is not after the last observation on {last_date.date()}')
+        return float(curve[steps - 1])
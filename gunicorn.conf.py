@@ -0,0 +1,16 @@
+import os
+
+# Same address as `python app.py`, which predict.php posts to
+bind = os.environ.get('BIND', '127.0.0.1:5000')
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+# A request that has to fit the SARIMA grid can take minutes
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 300))
+
+# Load wsgi.py (models, dataset, imports) once in the master, before forking the workers
+preload_app = True
+
+
+def post_fork(server, worker):
+    from app import after_fork
+    after_fork()
@@ -0,0 +1,143 @@
+import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+# Water quality readings the cleaning notebook filled with KNNImputer(n_neighbors=5)
+water_quality_columns = ['pH (units)', 'Ammonia (mg/L)', 'Nitrate (mg/L)', 'Inorganic Phosphate (mg/L)', 'BOD (mg/l)',
+                         'Dissolved Oxygen (mg/l)', 'Total coliforms (MPN/100ml)']
+
+
+class KNNImputation:
+    """Fills missing values with the mean of the n_neighbors nearest rows, as sklearn's KNNImputer does.
+
+    Distances are nan_euclidean over the imputed columns and every cell is
+    filled as KNNImputer(n_neighbors).fit_transform would fill it: from the
+    nearest rows that have a value in that column, or the column mean when
+    no row shares a reading with it. As in KNNImputer, which of the rows tied
+    for the last neighbour is taken depends on the rounding of the distances.
+    A column without any value is left missing instead of being dropped.
+
+    The distances are computed for chunk_rows rows with missing values at a
+    time, so memory stays at chunk_rows x rows. With group_by, rows are only
+    compared with rows of the same group (e.g. the same station), which
+    makes the work quadratic in the size of a group instead of the whole
+    data. Blocks run on `workers` threads; NumPy releases the GIL while it
+    computes distances.
+
+    With memo_dir, impute(df, name) remembers the filled values of every row
+    under name. A later call for the same name fills only the rows it has
+    not seen, from the raw values of all the rows, so those come out as a
+    full run would fill them. Remembered rows keep the values they were
+    filled with, even when the new rows include nearer neighbours or their
+    donors are gone; the result is then an approximation of a full run,
+    which impute without name gives.
+    """
+
+    def __init__(self, columns=None, n_neighbors=5, group_by=None, chunk_rows=512, workers=1, memo_dir=None):
+        self.columns = list(columns or water_quality_columns)
+        self.n_neighbors = n_neighbors
+        self.group_by = group_by
+        self.chunk_rows = chunk_rows
+        self.workers = workers
+        self.memo_dir = memo_dir
+        if self.memo_dir and not os.path.exists(self.memo_dir):
+            os.makedirs(self.memo_dir)
+
+    @property
+    def key(self):
+        """Short id of the settings that change the imputed values."""
+        return hashlib.sha1(repr((self.columns, self.n_neighbors, self.group_by)).encode()).hexdigest()[:8]
+
+    def _block_values(self, X, mask, block, rows, out):
+        """Fill the missing cells of the rows in block from the rows in rows."""
+        # Imported on first use, like the other training dependencies
+        from sklearn.metrics.pairwise import nan_euclidean_distances
+
+        fit_X = X[rows]
+        fit_mask = mask[rows]
+        distances = nan_euclidean_distances(X[block], fit_X)
+        for column in range(X.shape[1]):
+            missing = mask[block, column]
+            donors = np.flatnonzero(~fit_mask[:, column])
+            if not missing.any() or donors.size == 0:
+                continue
+            receivers = block[missing]
+            subset = distances[missing][:, donors]
+
+            # Rows sharing no reading with any donor get the column mean
+            no_distance = np.isnan(subset).all(axis=1)
+            if no_distance.any():
+                out[receivers[no_distance], column] = np.ma.array(fit_X[:, column], mask=fit_mask[:, column]).mean()
+                receivers = receivers[~no_distance]
+                subset = subset[~no_distance]
+                if receivers.size == 0:
+                    continue
+
+            # KNNImputer._calc_impute with uniform weights: donors without a distance sort last
+            n_neighbors = min(self.n_neighbors, donors.size)
+            nearest = np.argpartition(subset, n_neighbors - 1, axis=1)[:, :n_neighbors]
+            values = fit_X[donors, column].take(nearest)
+            out[receivers, column] = values.mean(axis=1)
+
+    def _impute_array(self, X, groups, fill):
+        """X with the missing cells of the rows in fill imputed."""
+        mask = np.isnan(X)
+        out = X.copy()
+        tasks = []
+        for rows in groups:
+            fill_rows = rows[fill[rows] & mask[rows].any(axis=1)]
+            for start in range(0, fill_rows.size, self.chunk_rows):
+                tasks.append((fill_rows[start:start + self.chunk_rows], rows))
+        if self.workers > 1 and len(tasks) > 1:
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                for future in [executor.submit(self._block_values, X, mask, block, rows, out) for block, rows in tasks]:
+                    future.result()
+        else:
+            for block, rows in tasks:
+                self._block_values(X, mask, block, rows, out)
+        return out
+
+    def _memo_path(self, name):
+        return os.path.join(self.memo_dir, f'{name}.{self.key}.npz')
+
+    def impute(self, df, name=None):
+        """Copy of df with the missing values of the columns filled; name keys the memo of filled rows."""
+        missing_columns = [column for column in self.columns if column not in df.columns]
+        if missing_columns:
+            raise KeyError(f"No column {', '.join(missing_columns)} to impute")
+        X = df[self.columns].to_numpy(dtype=float)
+        if self.group_by is None:
+            groups = [np.arange(len(df))]
+        else:
+            groups = [np.asarray(rows) for rows in df.groupby(self.group_by, sort=False).indices.values()]
+        fill = np.ones(len(df), dtype=bool)
+
+        memo = self.memo_dir and name is not None
+        if memo:
+            # Rows are recognised by the hash of all their raw values
+            hashes = pd.util.hash_pandas_object(df, index=False).to_numpy()
+            try:
+                with np.load(self._memo_path(name), allow_pickle=False) as stored:
+                    known_hashes, known_values = stored['hashes'], stored['values']
+            except (OSError, KeyError, ValueError):
+                known_hashes, known_values = np.array([], dtype=np.uint64), np.empty((0, len(self.columns)))
+            positions = np.clip(np.searchsorted(known_hashes, hashes), 0, max(len(known_hashes) - 1, 0))
+            known = (known_hashes[positions] == hashes) if len(known_hashes) else np.zeros(len(df), dtype=bool)
+            fill = ~known
+
+        out = self._impute_array(X, groups, fill)
+        if memo:
+            out[~fill] = known_values[positions[~fill]]
+            order = np.argsort(hashes, kind='stable')
+            path = self._memo_path(name)
+            tmp_path = f'{path}.{os.getpid()}.tmp'
+            with open(tmp_path, 'wb') as file:
+                np.savez(file, hashes=hashes[order], values=out[order])
+            os.replace(tmp_path, path)
+
+        imputed = df.copy()
+        imputed[self.columns] = out
+        return imputed
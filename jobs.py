@@ -0,0 +1,212 @@
+import json
+import os
+import sqlite3
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+
+class JobCancelled(Exception):
+    pass
+
+
+ACTIVE = ('queued', 'running')
+COLUMNS = 'id, kind, status, progress, message, result, error, created_at, started_at, finished_at'
+
+
+class Job:
+    """State of one background job, read from the jobs table every worker process shares."""
+
+    def __init__(self, queue, row):
+        self.queue = queue
+        (self.id, self.kind, self.status, self.progress, self.message, result, self.error,
+         self.created_at, self.started_at, self.finished_at) = row
+        self.result = json.loads(result) if result is not None else None
+
+    def update(self, progress, message):
+        """Record progress from the job function; raises JobCancelled once any worker requested cancellation."""
+        conn = self.queue._connect()
+        try:
+            (cancel_requested,) = conn.execute('SELECT cancel_requested FROM jobs WHERE id = ?', (self.id,)).fetchone()
+            if cancel_requested:
+                raise JobCancelled()
+            conn.execute('UPDATE jobs SET progress = ?, message = ? WHERE id = ?', (progress, message, self.id))
+        finally:
+            conn.close()
+        self.progress = progress
+        self.message = message
+
+    def to_dict(self):
+        return {
+            'job_id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'progress': self.progress,
+            'message': self.message,
+            'result': self.result,
+            'error': self.error,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+        }
+
+
+class JobQueue:
+    """Bounded worker pool for long running requests such as model training, with its jobs in SQLite.
+
+    Jobs run on the threads of the process that submitted them, but their
+    state lives in a table shared by every process opening the same path, so
+    any worker can report or cancel any job. Submitting a job with the same
+    key as a queued or running job, in any process, returns that job instead
+    of starting another one. Jobs left queued or running by a process that
+    no longer exists are marked failed.
+    """
+
+    def __init__(self, path, workers=1, keep=100):
+        self.path = path
+        self.workers = workers
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='job')
+        self.keep = keep
+        conn = self._connect()
+        try:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS jobs ('
+                ' id TEXT PRIMARY KEY,'
+                ' kind TEXT NOT NULL,'
+                ' key TEXT NOT NULL,'
+                ' status TEXT NOT NULL,'
+                ' progress REAL NOT NULL,'
+                ' message TEXT NOT NULL,'
+                ' result TEXT,'
+                ' error TEXT,'
+                ' created_at REAL NOT NULL,'
+                ' started_at REAL,'
+                ' finished_at REAL,'
+                ' pid INTEGER NOT NULL,'
+                ' cancel_requested INTEGER NOT NULL DEFAULT 0)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS jobs_status_key ON jobs (status, key)')
+        finally:
+            conn.close()
+
+    def after_fork(self):
+        """Start with an idle pool in a forked process, whose copy of the pool has no threads.
+
+        Jobs submitted before the fork keep running in the parent, which still records them in the table.
+        """
+        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='job')
+
+    def _connect(self):
+        # Autocommit, with explicit transactions where a read decides a write
+        return sqlite3.connect(self.path, timeout=30, isolation_level=None)
+
+    def _fetch(self, conn, job_id):
+        row = conn.execute(f'SELECT {COLUMNS} FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return Job(self, row) if row is not None else None
+
+    def _fail_abandoned(self, conn):
+        pids = {pid for (pid,) in conn.execute('SELECT DISTINCT pid FROM jobs WHERE status IN (?, ?)', ACTIVE)}
+        for pid in pids - {os.getpid()}:
+            try:
+                os.kill(pid, 0)
+            except ProcessLookupError:
+                conn.execute(
+                    "UPDATE jobs SET status = 'failed', message = 'Failed', error = ?, finished_at = ?"
+                    ' WHERE pid = ? AND status IN (?, ?)',
+                    (f'The worker process {pid} running it exited', time.time(), pid, *ACTIVE),
+                )
+            except PermissionError:
+                pass
+
+    def submit(self, kind, key, fn, *args, **kwargs):
+        """Queue fn(job, *args, **kwargs); returns (job, created).
+
+        key must be JSON serialisable, as it is compared across processes.
+        """
+        key = json.dumps(key)
+        conn = self._connect()
+        try:
+            # Immediate, so no other process can queue the same key between the check and the insert
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                self._fail_abandoned(conn)
+                row = conn.execute('SELECT id FROM jobs WHERE status IN (?, ?) AND key = ?', (*ACTIVE, key)).fetchone()
+                if row is not None:
+                    job, created = self._fetch(conn, row[0]), False
+                else:
+                    job_id = uuid.uuid4().hex
+                    conn.execute(
+                        'INSERT INTO jobs (id, kind, key, status, progress, message, created_at, pid)'
+                        " VALUES (?, ?, ?, 'queued', 0.0, 'Waiting for a worker', ?, ?)",
+                        (job_id, kind, key, time.time(), os.getpid()),
+                    )
+                    self._forget_finished(conn)
+                    job, created = self._fetch(conn, job_id), True
+                conn.execute('COMMIT')
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+        finally:
+            conn.close()
+        if created:
+            self.executor.submit(self._run, job.id, fn, args, kwargs)
+        return job, created
+
+    def _finish(self, job_id, status, message, **values):
+        columns = ''.join(f', {name} = ?' for name in values)
+        conn = self._connect()
+        try:
+            conn.execute(f'UPDATE jobs SET status = ?, message = ?, finished_at = ?{columns} WHERE id = ?',
+                         (status, message, time.time(), *values.values(), job_id))
+        finally:
+            conn.close()
+
+    def _run(self, job_id, fn, args, kwargs):
+        conn = self._connect()
+        try:
+            # A job cancelled while queued is no longer 'queued' and is skipped
+            started = conn.execute("UPDATE jobs SET status = 'running', started_at = ? WHERE id = ? AND status = 'queued'",
+                                   (time.time(), job_id)).rowcount
+            job = self._fetch(conn, job_id) if started else None
+        finally:
+            conn.close()
+        if job is None:
+            return
+        try:
+            result = fn(job, *args, **kwargs)
+            self._finish(job_id, 'finished', 'Finished', progress=1.0, result=json.dumps(result))
+        except JobCancelled:
+            self._finish(job_id, 'cancelled', 'Cancelled while running')
+        except Exception as e:
+            self._finish(job_id, 'failed', 'Failed', error=str(e))
+
+    def _forget_finished(self, conn):
+        # Only the newest finished jobs are kept for status queries
+        conn.execute(
+            'DELETE FROM jobs WHERE status NOT IN (?, ?) AND id NOT IN ('
+            ' SELECT id FROM jobs WHERE status NOT IN (?, ?) ORDER BY created_at DESC LIMIT ?)',
+            (*ACTIVE, *ACTIVE, self.keep),
+        )
+
+    def get(self, job_id):
+        conn = self._connect()
+        try:
+            self._fail_abandoned(conn)
+            return self._fetch(conn, job_id)
+        finally:
+            conn.close()
+
+    def cancel(self, job_id):
+        """Cancel a queued job, or ask a running one to stop at its next progress update."""
+        conn = self._connect()
+        try:
+            conn.execute(
+                "UPDATE jobs SET status = 'cancelled', message = 'Cancelled before it started', finished_at = ?,"
+                " cancel_requested = 1 WHERE id = ? AND status = 'queued'",
+                (time.time(), job_id),
+            )
+            conn.execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND status = 'running'", (job_id,))
+            return self._fetch(conn, job_id)
+        finally:
+            conn.close()
@@ -0,0 +1,138 @@
+import bisect
+import threading
+import time
+
+
+# Upper bounds in seconds, from sub-millisecond model calls to cold SARIMA fits
+default_buckets = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+class Counter:
+    def __init__(self, name, help):
+        self.name = name
+        self.help = help
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        with self.lock:
+            for key, value in self.values.items():
+                lines.append(f'{self.name}{_format_labels(key)} {value}')
+        return lines
+
+
+class Gauge(Counter):
+    def set(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            self.values[key] = value
+
+    def clear(self):
+        with self.lock:
+            self.values.clear()
+
+    def render(self):
+        lines = super().render()
+        lines[1] = f'# TYPE {self.name} gauge'
+        return lines
+
+
+class Histogram:
+    """Counts observations per bucket; cumulative counts are only built when scraped."""
+
+    def __init__(self, name, help, buckets=default_buckets):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(key)
+            if series is None:
+                # One slot per bucket plus +Inf, then the sum
+                series = self.series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self.lock:
+            snapshot = {key: list(series) for key, series in self.series.items()}
+        for key, series in snapshot.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), series[:-1]):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{_format_labels(key, [("le", bound)])} {cumulative}')
+            lines.append(f'{self.name}_sum{_format_labels(key)} {series[-1]}')
+            lines.append(f'{self.name}_count{_format_labels(key)} {cumulative}')
+        return lines
+
+
+class span:
+    """Time a block of code into the stage histogram.
+
+        with span('sarima_fit', station=station_name, parameter=parameter):
+            ...
+    """
+
+    __slots__ = ('labels', 'start')
+
+    def __init__(self, stage, **labels):
+        labels['stage'] = stage
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        stage_seconds.observe(time.perf_counter() - self.start, **self.labels)
+        return False
+
+
+stage_seconds = Histogram('llda_stage_seconds', 'Time spent in each stage of a request.')
+request_seconds = Histogram('llda_request_seconds', 'Time spent handling a request, by endpoint.')
+requests_total = Counter('llda_requests_total', 'Requests handled, by endpoint, HTTP status and serving model version.')
+errors_total = Counter('llda_errors_total', 'Requests that returned an error, by endpoint.')
+model_info = Gauge('llda_model_info', 'Version of the model and scaler being served.')
+cache_events = Gauge('llda_sarima_cache_events', 'SARIMA fit cache hits, misses, extensions and refits since startup.')
+
+forecast_table_events = Gauge('llda_forecast_table_events', 'Forecast table lookups answered from the table (hit) or live (miss), and table builds, since startup.')
+response_cache_events = Gauge('llda_response_cache_events', 'Responses served from this worker\'s cache (hit), from the shared cache (shared_hit) or computed (miss) since startup.')
+all_metrics = [stage_seconds, request_seconds, requests_total, errors_total, model_info, cache_events, forecast_table_events,
+               response_cache_events]
+
+
+def after_fork():
+    """Replace the metric locks in a forked process, where a thread of the parent may have held them."""
+    for metric in all_metrics:
+        metric.lock = threading.Lock()
+
+
+def render():
+    """All metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in all_metrics:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
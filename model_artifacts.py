@@ -0,0 +1,74 @@
+import os
+import pickle
+import time
+
+import numpy as np
+
+
+# Seconds spent loading each artifact in this process, keyed by path
+load_times = {}
+
+
+def save_xgb_model(model, path):
+    """Save an XGBRegressor in XGBoost's native format (.ubj or .json, chosen by extension)."""
+    model.save_model(path)
+
+
+def load_xgb_model(path):
+    # Imported on the first load, so importing the API does not load XGBoost
+    from xgboost import XGBRegressor
+
+    start = time.perf_counter()
+    model = XGBRegressor()
+    model.load_model(path)
+    load_times[path] = time.perf_counter() - start
+    return model
+
+
+def save_scaler(scaler, path):
+    """Save the fitted parameters of a StandardScaler as a NumPy .npz file."""
+    arrays = {
+        'mean': scaler.mean_,
+        'scale': scaler.scale_,
+        'var': scaler.var_,
+        'n_samples_seen': np.asarray(scaler.n_samples_seen_),
+    }
+    if hasattr(scaler, 'feature_names_in_'):
+        arrays['feature_names'] = np.asarray(scaler.feature_names_in_, dtype=str)
+    with open(path, 'wb') as file:
+        np.savez(file, **arrays)
+
+
+def load_scaler(path):
+    from sklearn.preprocessing import StandardScaler
+
+    start = time.perf_counter()
+    with np.load(path, allow_pickle=False) as arrays:
+        scaler = StandardScaler()
+        scaler.mean_ = arrays['mean']
+        scaler.scale_ = arrays['scale']
+        scaler.var_ = arrays['var']
+        scaler.n_samples_seen_ = arrays['n_samples_seen'][()]
+        scaler.n_features_in_ = scaler.mean_.shape[0]
+        if 'feature_names' in arrays:
+            scaler.feature_names_in_ = arrays['feature_names'].astype(object)
+    load_times[path] = time.perf_counter() - start
+    return scaler
+
+
+def load_pickle(path):
+    """Load a legacy pickled artifact; only for files produced by this project."""
+    start = time.perf_counter()
+    with open(path, 'rb') as file:
+        artifact = pickle.load(file)
+    load_times[path] = time.perf_counter() - start
+    return artifact
+
+
+def load_model_pair(model_path, scaler_path, legacy_model_path=None, legacy_scaler_path=None):
+    """Load a model and scaler, preferring the native files over the legacy pickles."""
+    if os.path.exists(model_path) and os.path.exists(scaler_path):
+        return load_xgb_model(model_path), load_scaler(scaler_path)
+    if legacy_model_path and legacy_scaler_path:
+        return load_pickle(legacy_model_path), load_pickle(legacy_scaler_path)
+    raise FileNotFoundError(f'{model_path} or {scaler_path} not found')
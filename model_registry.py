@@ -0,0 +1,196 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+
+import numpy as np
+
+from file_lock import FileLock
+from model_artifacts import load_model_pair, save_scaler, save_xgb_model
+
+
+def file_fingerprint(path):
+    """SHA-1 of a file's contents, used to recognise the data a model was trained on."""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ServingModel:
+    """The model and scaler answering requests, swapped as one reference.
+
+    Requests read `current` once and use that (version, model, scaler) tuple to
+    the end, so a promotion never mixes a new scaler with an old model and
+    in-flight requests finish on the pair they started with. The first read
+    calls load() for the tuple, so a process that has not needed the model
+    yet has not imported XGBoost either.
+    """
+
+    def __init__(self, load):
+        self.load = load
+        self.lock = threading.Lock()
+        self._current = None
+
+    def after_fork(self):
+        """Replace the lock in a forked process, where a thread of the parent may have held it."""
+        self.lock = threading.Lock()
+
+    @property
+    def current(self):
+        current = self._current
+        if current is None:
+            with self.lock:
+                if self._current is None:
+                    self._current = self.load()
+                current = self._current
+        return current
+
+    @property
+    def version(self):
+        """Version being served, None until the model is loaded."""
+        current = self._current
+        return current[0] if current is not None else None
+
+    def swap(self, version, model, scaler):
+        self._current = (version, model, scaler)
+
+
+class ModelRegistry:
+    """Directory of immutable model versions, each a model, its scaler and metadata.
+
+    Layout:
+        <root>/<version>/model.ubj      XGBoost native booster
+        <root>/<version>/scaler.npz     StandardScaler parameters
+        <root>/<version>/metadata.json
+        <root>/<version>/rows.npz       hashes of the rows it was trained and evaluated on
+        <root>/active.json    points at the promoted version
+        <root>/.lock          held while a version is registered or exported, by any process
+    """
+
+    def __init__(self, root):
+        self.root = root
+        if not os.path.exists(self.root):
+            os.makedirs(self.root)
+        self.lock = FileLock(os.path.join(self.root, '.lock'))
+
+    def after_fork(self):
+        """Start with the lock free in a forked process, see FileLock.after_fork."""
+        self.lock.after_fork()
+
+    def _version_dir(self, version):
+        return os.path.join(self.root, version)
+
+    def _registered_dir(self, version):
+        """Directory of a registered version; KeyError for any other id, such as '..' or a path."""
+        if version.startswith('.') or version not in os.listdir(self.root) \
+                or not os.path.isdir(self._version_dir(version)):
+            raise KeyError(f"Model version '{version}' not found.")
+        return self._version_dir(version)
+
+    def register(self, model, scaler, metrics, dataset_fingerprint, dataset_name, extra=None, rows=None):
+        """Store a trained model and scaler as a new version and return its id.
+
+        rows, if given, maps names to arrays of row hashes (see training.row_hashes).
+        """
+        with self.lock:
+            version = time.strftime('%Y%m%d%H%M%S') + '-' + dataset_fingerprint[:8]
+            suffix = 1
+            while os.path.exists(self._version_dir(version)):
+                suffix += 1
+                version = time.strftime('%Y%m%d%H%M%S') + '-' + dataset_fingerprint[:8] + f'-{suffix}'
+
+            # Write into a temporary directory and rename it, so a version is never seen half written
+            tmp_dir = os.path.join(self.root, f'.tmp-{version}-{os.getpid()}')
+            os.makedirs(tmp_dir)
+            save_xgb_model(model, os.path.join(tmp_dir, 'model.ubj'))
+            save_scaler(scaler, os.path.join(tmp_dir, 'scaler.npz'))
+            if rows is not None:
+                with open(os.path.join(tmp_dir, 'rows.npz'), 'wb') as file:
+                    np.savez(file, **rows)
+            metadata = {
+                'version': version,
+                'created_at': time.time(),
+                'dataset': dataset_name,
+                'dataset_fingerprint': dataset_fingerprint,
+                'metrics': metrics,
+            }
+            metadata.update(extra or {})
+            with open(os.path.join(tmp_dir, 'metadata.json'), 'w') as file:
+                json.dump(metadata, file, indent=2)
+            os.rename(tmp_dir, self._version_dir(version))
+        return version
+
+    def metadata(self, version):
+        with open(os.path.join(self._version_dir(version), 'metadata.json')) as file:
+            return json.load(file)
+
+    def versions(self):
+        """Metadata of every registered version, oldest first."""
+        found = []
+        for name in os.listdir(self.root):
+            if name.startswith('.') or not os.path.isdir(self._version_dir(name)):
+                continue
+            try:
+                found.append(self.metadata(name))
+            except (OSError, ValueError):
+                continue
+        return sorted(found, key=lambda metadata: metadata['created_at'])
+
+    def find(self, dataset_fingerprint, **extra):
+        """Newest version trained on the given data, or None."""
+        for metadata in reversed(self.versions()):
+            if metadata['dataset_fingerprint'] == dataset_fingerprint and all(metadata.get(k) == v for k, v in extra.items()):
+                return metadata['version']
+        return None
+
+    def load(self, version):
+        """Return (model, scaler) of a version."""
+        version_dir = self._registered_dir(version)
+        # Versions registered before the native format still hold pickles
+        return load_model_pair(os.path.join(version_dir, 'model.ubj'), os.path.join(version_dir, 'scaler.npz'),
+                               os.path.join(version_dir, 'model.pkl'), os.path.join(version_dir, 'scaler.pkl'))
+
+    def rows(self, version):
+        """Row hashes recorded with a version, or None for versions registered without them."""
+        path = os.path.join(self._version_dir(version), 'rows.npz')
+        if not os.path.exists(path):
+            return None
+        with np.load(path, allow_pickle=False) as arrays:
+            return {name: arrays[name] for name in arrays.files}
+
+    def active_mtime(self):
+        """Modification time of active.json, which changes on every promotion, or None."""
+        try:
+            return os.stat(os.path.join(self.root, 'active.json')).st_mtime_ns
+        except OSError:
+            return None
+
+    def active_version(self):
+        path = os.path.join(self.root, 'active.json')
+        if not os.path.exists(path):
+            return None
+        with open(path) as file:
+            return json.load(file).get('version')
+
+    def promote(self, version):
+        """Mark a version as the one to serve."""
+        self._registered_dir(version)
+        path = os.path.join(self.root, 'active.json')
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w') as file:
+            json.dump({'version': version, 'promoted_at': time.time()}, file)
+        os.replace(tmp_path, path)
+
+    def export(self, version, model_path, scaler_path):
+        """Copy a version's native artifacts to standalone files."""
+        version_dir = self._version_dir(version)
+        with self.lock:
+            for name, path in [('model.ubj', model_path), ('scaler.npz', scaler_path)]:
+                # Replaced whole, so readers never load a file another worker is still copying
+                tmp_path = f'{path}.{os.getpid()}.tmp'
+                shutil.copyfile(os.path.join(version_dir, name), tmp_path)
+                os.replace(tmp_path, path)
@@ -0,0 +1,139 @@
+import json
+import sqlite3
+import threading
+import time
+
+import pandas as pd
+
+
+class PredictionLog:
+    """Append-only SQLite store for predictions, kept apart from the training dataset.
+
+    The database runs in WAL mode with synchronous=FULL, so every committed
+    batch is fsynced before append_many returns and readers never block the
+    writer.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        conn = self._connect()
+        try:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS predictions ('
+                ' id INTEGER PRIMARY KEY AUTOINCREMENT,'
+                ' station TEXT NOT NULL,'
+                ' date TEXT NOT NULL,'
+                ' inputs TEXT NOT NULL,'
+                ' forecasts TEXT NOT NULL,'
+                ' prediction REAL NOT NULL,'
+                ' model_version TEXT,'
+                ' created_at REAL NOT NULL)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS predictions_station_date ON predictions (station, date)')
+            conn.execute('CREATE INDEX IF NOT EXISTS predictions_date ON predictions (date)')
+            conn.commit()
+        finally:
+            conn.close()
+
+    def after_fork(self):
+        """Replace the lock in a forked process, where a thread of the parent may have held it."""
+        self.lock = threading.Lock()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute('PRAGMA synchronous=FULL')
+        return conn
+
+    def append_many(self, rows):
+        """Write a batch of prediction rows in a single transaction.
+
+        Each row is a dict with station, date (anything pd.Timestamp accepts),
+        inputs, forecasts, prediction and model_version.
+        """
+        created_at = time.time()
+        records = [
+            (
+                row['station'],
+                pd.Timestamp(row['date']).strftime('%Y-%m-%d'),
+                json.dumps(row['inputs']),
+                json.dumps(row['forecasts']),
+                float(row['prediction']),
+                row.get('model_version'),
+                created_at,
+            )
+            for row in rows
+        ]
+        with self.lock:
+            conn = self._connect()
+            try:
+                with conn:
+                    conn.executemany(
+                        'INSERT INTO predictions (station, date, inputs, forecasts, prediction, model_version, created_at)'
+                        ' VALUES (?, ?, ?, ?, ?, ?, ?)',
+                        records,
+                    )
+            finally:
+                conn.close()
+        return len(records)
+
+    def last_id(self):
+        """Id of the newest logged row, used to notice new predictions cheaply."""
+        conn = self._connect()
+        try:
+            return conn.execute('SELECT MAX(id) FROM predictions').fetchone()[0]
+        finally:
+            conn.close()
+
+    def query(self, station=None, start=None, end=None, limit=None):
+        """Return logged predictions, optionally filtered by station and an inclusive date range."""
+        clauses = []
+        args = []
+        if station is not None:
+            clauses.append('station = ?')
+            args.append(station)
+        if start is not None:
+            clauses.append('date >= ?')
+            args.append(pd.Timestamp(start).strftime('%Y-%m-%d'))
+        if end is not None:
+            clauses.append('date <= ?')
+            args.append(pd.Timestamp(end).strftime('%Y-%m-%d'))
+        sql = 'SELECT station, date, inputs, forecasts, prediction, model_version, created_at FROM predictions'
+        if clauses:
+            sql += ' WHERE ' + ' AND '.join(clauses)
+        sql += ' ORDER BY date, id'
+        if limit is not None:
+            sql += ' LIMIT ?'
+            args.append(int(limit))
+
+        conn = self._connect()
+        try:
+            rows = conn.execute(sql, args).fetchall()
+        finally:
+            conn.close()
+        return [
+            {
+                'station': station_name,
+                'date': date,
+                'inputs': json.loads(inputs),
+                'forecasts': json.loads(forecasts),
+                'prediction': prediction,
+                'model_version': model_version,
+                'created_at': created_at,
+            }
+            for station_name, date, inputs, forecasts, prediction, model_version, created_at in rows
+        ]
+
+    def to_frame(self, station=None, start=None, end=None):
+        """Return logged predictions shaped like rows of the station dataset."""
+        records = []
+        for row in self.query(station, start, end):
+            date = pd.Timestamp(row['date'])
+            record = {'Monitoring Stations': row['station'], 'Month': date.month, 'Year': date.year}
+            record.update(row['inputs'])
+            record.update(row['forecasts'])
+            record['Phytoplankton (cells/ml)'] = row['prediction']
+            record['Date'] = date.strftime('%m/%d/%Y')
+            records.append(record)
+        return pd.DataFrame(records)
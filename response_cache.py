@@ -0,0 +1,171 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+def canonical(value):
+    """Request payload with the differences that do not change a response removed.
+
+    Integers become floats, so {"Humidity": [80]} and {"Humidity": [80.0]}
+    share a cache entry. Key order is kept: it is the column order of the
+    frame handed to the scaler.
+    """
+    if isinstance(value, dict):
+        return [[str(k), canonical(v)] for k, v in value.items()]
+    if isinstance(value, (list, tuple)):
+        return [canonical(v) for v in value]
+    if isinstance(value, int) and not isinstance(value, bool):
+        return float(value)
+    return value
+
+
+class ResponseCache:
+    """LRU cache of JSON-serialisable responses that expire after ttl seconds.
+
+    At most max_entries responses are kept in memory, the least recently
+    used is dropped first. With a path, entries are also written to a SQLite
+    table, bounded the same way, which every worker reads on a memory miss,
+    so one worker's response serves the others. clear() empties both and
+    touches a marker file next to the table; the other workers drop their
+    memory entries when they see its mtime change.
+    """
+
+    def __init__(self, max_entries=1024, ttl=3600, path=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.path = path
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.cleared_mtime = None
+        if self.path:
+            self.cleared_path = f'{self.path}.cleared'
+            self.cleared_mtime = self._cleared_mtime()
+            conn = self._connect()
+            try:
+                conn.execute('PRAGMA journal_mode=WAL')
+                conn.execute(
+                    'CREATE TABLE IF NOT EXISTS responses ('
+                    ' key TEXT PRIMARY KEY,'
+                    ' value TEXT NOT NULL,'
+                    ' expires_at REAL NOT NULL,'
+                    ' used_at REAL NOT NULL)'
+                )
+                conn.execute('CREATE INDEX IF NOT EXISTS responses_used_at ON responses (used_at)')
+                conn.commit()
+            finally:
+                conn.close()
+
+    def after_fork(self):
+        """Replace the lock in a forked process, where a thread of the parent may have held it."""
+        self.lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def _cleared_mtime(self):
+        try:
+            return os.stat(self.cleared_path).st_mtime_ns
+        except OSError:
+            return None
+
+    def _sync(self):
+        """Forget the memory entries if another process cleared the shared table."""
+        mtime = self._cleared_mtime()
+        if mtime != self.cleared_mtime:
+            with self.lock:
+                self.entries.clear()
+                self.cleared_mtime = mtime
+
+    @staticmethod
+    def key(endpoint, payload, *versions):
+        """Cache key of a request: the endpoint, its canonical payload and what else the response depends on."""
+        text = json.dumps([endpoint, canonical(payload), [repr(version) for version in versions]],
+                          separators=(',', ':'))
+        return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """The stored response, or None if there is none or it expired."""
+        if not self.enabled:
+            return None
+        now = time.time()
+        if self.path:
+            self._sync()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[1] > now:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                del self.entries[key]
+
+        if self.path:
+            conn = self._connect()
+            try:
+                with conn:
+                    row = conn.execute('SELECT value, expires_at FROM responses WHERE key = ? AND expires_at > ?',
+                                       (key, now)).fetchone()
+                    if row is not None:
+                        conn.execute('UPDATE responses SET used_at = ? WHERE key = ?', (now, key))
+            finally:
+                conn.close()
+            if row is not None:
+                value = json.loads(row[0])
+                self._remember(key, value, row[1])
+                self.shared_hits += 1
+                return value
+
+        self.misses += 1
+        return None
+
+    def _remember(self, key, value, expires_at):
+        with self.lock:
+            self.entries[key] = (value, expires_at)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def put(self, key, value):
+        if not self.enabled:
+            return
+        now = time.time()
+        expires_at = now + self.ttl
+        self._remember(key, value, expires_at)
+        if self.path:
+            conn = self._connect()
+            try:
+                with conn:
+                    conn.execute('INSERT OR REPLACE INTO responses (key, value, expires_at, used_at) VALUES (?, ?, ?, ?)',
+                                 (key, json.dumps(value), expires_at, now))
+                    # Expired rows first, then the least recently used beyond max_entries
+                    conn.execute('DELETE FROM responses WHERE expires_at <= ?', (now,))
+                    conn.execute('DELETE FROM responses WHERE key IN (SELECT key FROM responses'
+                                 ' ORDER BY used_at DESC LIMIT -1 OFFSET ?)', (self.max_entries,))
+            finally:
+                conn.close()
+
+    def clear(self):
+        """Drop every response, in this process and in the shared table."""
+        with self.lock:
+            self.entries.clear()
+        if self.path:
+            conn = self._connect()
+            try:
+                with conn:
+                    conn.execute('DELETE FROM responses')
+            finally:
+                conn.close()
+            with open(self.cleared_path, 'a'):
+                os.utime(self.cleared_path)
+            self.cleared_mtime = self._cleared_mtime()
@@ -0,0 +1,56 @@
+import threading
+
+import numpy as np
+
+
+class RowPredictor:
+    """Predicts single rows with a model and its scaler, without pandas or sklearn input validation.
+
+    The schema is taken from the scaler once: a request qualifies when it maps
+    exactly the features the scaler was fitted on, in its order, to one plain
+    number each. Anything else gets None from row() and goes through the
+    DataFrame path, which also produces its errors. The row is scaled in
+    float64 as StandardScaler.transform does, then written into a float32
+    buffer of this thread, the dtype XGBoost predicts in, and handed to
+    Booster.inplace_predict, so the predictions are those of
+    model.predict(scaler.transform(df)).
+    """
+
+    def __init__(self, version, model, scaler):
+        self.version = version
+        names = getattr(scaler, 'feature_names_in_', None)
+        # Without names the scaler takes columns by position, whatever they are called
+        self.features = tuple(names) if names is not None else None
+        n_features = scaler.n_features_in_
+        self.mean = scaler.mean_ if scaler.mean_ is not None else np.zeros(n_features)
+        self.scale = scaler.scale_ if scaler.scale_ is not None else np.ones(n_features)
+        self.booster = model.get_booster()
+        try:
+            self.iteration_range = (0, model.best_iteration + 1)
+        except AttributeError:
+            # No early stopping, every tree is used
+            self.iteration_range = (0, 0)
+        self.local = threading.local()
+
+    def row(self, data):
+        """The values of a single-row request in feature order, or None when it is not one."""
+        if self.features is None or not isinstance(data, dict) or tuple(data) != self.features:
+            return None
+        values = []
+        for value in data.values():
+            if type(value) is not list or len(value) != 1 or type(value[0]) not in (int, float):
+                return None
+            values.append(value[0])
+        return values
+
+    def predict(self, values):
+        buffers = getattr(self.local, 'buffers', None)
+        if buffers is None:
+            # One pair per thread, since the server handles requests concurrently
+            buffers = self.local.buffers = (np.empty(len(self.mean)), np.empty((1, len(self.mean)), dtype=np.float32))
+        scaled, row = buffers
+        scaled[:] = values
+        np.subtract(scaled, self.mean, out=scaled)
+        np.divide(scaled, self.scale, out=scaled)
+        row[0] = scaled
+        return self.booster.inplace_predict(row, iteration_range=self.iteration_range, validate_features=False)
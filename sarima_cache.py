@@ -0,0 +1,215 @@
+import hashlib
+import os
+import pickle
+import threading
+
+import numpy as np
+import pandas as pd
+
+from metrics import span
+
+
+def series_fingerprint(series):
+    """Hash the values and dates of a series so changed rows give a new key."""
+    hashed = pd.util.hash_pandas_object(series, index=True).values
+    return hashlib.sha1(hashed.tobytes()).hexdigest()
+
+
+def _sarimax(series, order, seasonal_order):
+    # statsmodels is imported on first use so serving-only workers start without it
+    from statsmodels.tsa.statespace.sarimax import SARIMAX
+    return SARIMAX(series, order=order, seasonal_order=seasonal_order)
+
+
+class SarimaFitCache:
+    """Keep fitted SARIMAX results in memory and, optionally, their parameters on disk.
+
+    Entries are keyed by (station, parameter, order, seasonal_order) and hold the
+    fingerprint and length of the series they were fitted on. A lookup with a
+    different fingerprint replaces the old entry, so stale fits are evicted as
+    soon as the underlying rows change.
+
+    When the old series is a prefix of the new one, i.e. only new months were
+    appended, the parameters are kept and the Kalman filter is run on over the
+    new observations instead of estimating them again. The parameters are
+    re-estimated once refit_every observations have been appended since the
+    last fit, or when the mean squared standardized one-step forecast error
+    of the new observations exceeds degrade_threshold. The extended entry is
+    written back to disk, so other workers filter from the same parameters.
+    """
+
+    def __init__(self, cache_dir=None, refit_every=12, degrade_threshold=4.0):
+        self.cache_dir = cache_dir
+        self.refit_every = refit_every
+        self.degrade_threshold = degrade_threshold
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+        self.extensions = 0
+        self.refits = 0
+        self.lock = threading.Lock()
+        if self.cache_dir and not os.path.exists(self.cache_dir):
+            os.makedirs(self.cache_dir)
+
+    def after_fork(self):
+        """Replace the lock in a forked process, where a thread of the parent may have held it."""
+        self.lock = threading.Lock()
+
+    def _disk_path(self, key):
+        name = hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, f'{name}.pkl')
+
+    def _load_stored(self, key):
+        if not self.cache_dir:
+            return None
+        path = self._disk_path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'rb') as file:
+                return pickle.load(file)
+        except Exception:
+            return None
+
+    def _save_params(self, key, fingerprint, params, length=None, appended=0):
+        if not self.cache_dir:
+            return
+        path = self._disk_path(key)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as file:
+            pickle.dump({'key': key, 'fingerprint': fingerprint, 'params': params,
+                         'length': length, 'appended': appended}, file)
+        os.replace(tmp_path, path)
+
+    def _remove_stored(self, key):
+        if self.cache_dir and os.path.exists(self._disk_path(key)):
+            os.remove(self._disk_path(key))
+
+    @staticmethod
+    def _extends(series, length, fingerprint):
+        """Whether the series is the one fingerprinted, with new observations appended."""
+        return length is not None and 0 < length < len(series) and series_fingerprint(series.iloc[:length]) == fingerprint
+
+    def _degraded(self, model_fit, new_observations):
+        """Whether the last new_observations are forecast worse than degrade_threshold allows."""
+        # Results of extend() only hold the new observations, those of filter() the whole series
+        errors = np.asarray(model_fit.filter_results.standardized_forecasts_error[0][-new_observations:], dtype=float)
+        errors = errors[np.isfinite(errors)]
+        return errors.size > 0 and float(np.mean(errors ** 2)) > self.degrade_threshold
+
+    def get(self, station, parameter, series, order, seasonal_order):
+        """Return the cached fit for the series, or None if it has to be fitted."""
+        key = (station, parameter, tuple(order), tuple(seasonal_order))
+        fingerprint = series_fingerprint(series)
+
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] == fingerprint:
+                self.hits += 1
+                return entry[1]
+
+        # Only new months appended: keep the fitted parameters and filter over the new observations
+        if entry is not None and self._extends(series, entry[2], entry[0]):
+            return self._extend(key, series, fingerprint, entry[1], entry[2], entry[3], station, parameter)
+
+        stored = self._load_stored(key)
+        if stored is not None and stored.get('fingerprint') == fingerprint:
+            # Rebuild the results from stored parameters with a single filter pass
+            with span('sarima_filter', station=station, parameter=parameter):
+                model_fit = _sarimax(series, order, seasonal_order).filter(stored['params'])
+            with self.lock:
+                self.hits += 1
+                self.entries[key] = (fingerprint, model_fit, len(series), stored.get('appended', 0))
+            return model_fit
+        if stored is not None and self._extends(series, stored.get('length'), stored.get('fingerprint')):
+            return self._extend(key, series, fingerprint, None, stored['length'], stored.get('appended', 0),
+                                station, parameter, params=stored['params'])
+
+        if stored is not None:
+            # The rows changed since this fit was stored
+            self._remove_stored(key)
+        with self.lock:
+            self.misses += 1
+        return None
+
+    def get_params(self, station, parameter, series, order, seasonal_order):
+        """Fitted parameters of exactly this series without building a results object, or None.
+
+        None also when the series extends a cached one; get() does that.
+        """
+        key = (station, parameter, tuple(order), tuple(seasonal_order))
+        fingerprint = series_fingerprint(series)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] == fingerprint:
+                self.hits += 1
+                return entry[1].params
+        stored = self._load_stored(key)
+        if stored is not None and stored.get('fingerprint') == fingerprint:
+            with self.lock:
+                self.hits += 1
+            return stored['params']
+        return None
+
+    def _extend(self, key, series, fingerprint, model_fit, length, appended, station, parameter, params=None):
+        """Advance a fit from the first length observations to the whole series, or return None to refit."""
+        appended += len(series) - length
+        if appended >= self.refit_every:
+            with self.lock:
+                self.refits += 1
+                self.misses += 1
+            return None
+        try:
+            with span('sarima_extend', station=station, parameter=parameter):
+                if model_fit is not None:
+                    # The model has no supported date index, so the new values are appended without one
+                    model_fit = model_fit.extend(series.iloc[length:].values)
+                else:
+                    order, seasonal_order = key[2], key[3]
+                    model_fit = _sarimax(series, order, seasonal_order).filter(params)
+        except Exception:
+            with self.lock:
+                self.misses += 1
+            return None
+        if self._degraded(model_fit, len(series) - length):
+            with self.lock:
+                self.refits += 1
+                self.misses += 1
+            return None
+
+        self._save_params(key, fingerprint, model_fit.params, len(series), appended)
+        with self.lock:
+            self.hits += 1
+            self.extensions += 1
+            self.entries[key] = (fingerprint, model_fit, len(series), appended)
+        return model_fit
+
+    def put(self, station, parameter, series, order, seasonal_order, model_fit=None, params=None):
+        """Store a fit, either as a results object or as parameters fitted elsewhere."""
+        key = (station, parameter, tuple(order), tuple(seasonal_order))
+        fingerprint = series_fingerprint(series)
+        if model_fit is None:
+            with span('sarima_filter', station=station, parameter=parameter):
+                model_fit = _sarimax(series, order, seasonal_order).filter(params)
+        self._save_params(key, fingerprint, model_fit.params, len(series))
+        with self.lock:
+            self.entries[key] = (fingerprint, model_fit, len(series), 0)
+        return model_fit
+
+    def get_or_fit(self, station, parameter, series, order, seasonal_order):
+        """Return a fitted SARIMAX result for the series, fitting only on a cache miss."""
+        model_fit = self.get(station, parameter, series, order, seasonal_order)
+        if model_fit is None:
+            with span('sarima_fit', station=station, parameter=parameter):
+                model_fit = _sarimax(series, order, seasonal_order).fit(disp=False)
+            self.put(station, parameter, series, order, seasonal_order, model_fit=model_fit)
+        return model_fit
+
+    def clear(self):
+        """Drop every cached fit from memory and disk."""
+        with self.lock:
+            self.entries.clear()
+        if self.cache_dir and os.path.exists(self.cache_dir):
+            for name in os.listdir(self.cache_dir):
+                if name.endswith('.pkl'):
+                    os.remove(os.path.join(self.cache_dir, name))
@@ -0,0 +1,168 @@
+import hashlib
+import math
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+from joblib import Parallel, delayed, effective_n_jobs
+from sklearn.metrics import mean_squared_error
+from sklearn.model_selection import GridSearchCV, ParameterGrid, check_cv
+from sklearn.svm import SVR
+
+
+# Define parameter grid for Grid Search with SVR
+param_grid = {
+    'kernel': ['linear', 'poly', 'rbf', 'sigmoid'],
+    'C': [1, 10, 100],
+    'epsilon': [0.1, 0.2, 0.3],
+    'gamma': ['scale', 'auto']
+}
+
+# Train/validation arrays of recent searches, keyed by the content of X and y and the number of folds
+_fold_cache = OrderedDict()
+_fold_cache_lock = threading.Lock()
+fold_cache_size = 4
+
+
+def cached_folds(X, y, cv=5):
+    """Train/validation arrays of every CV fold, split like GridSearchCV(cv=cv) and reused while X and y stay the same."""
+    X = np.ascontiguousarray(X, dtype=np.float64)
+    y = np.ascontiguousarray(y, dtype=np.float64)
+    key = (hashlib.sha1(X.tobytes() + y.tobytes()).hexdigest(), X.shape, cv)
+    with _fold_cache_lock:
+        if key in _fold_cache:
+            _fold_cache.move_to_end(key)
+            return _fold_cache[key]
+    folds = [(X[train], y[train], X[test], y[test]) for train, test in check_cv(cv).split(X, y)]
+    with _fold_cache_lock:
+        _fold_cache[key] = folds
+        while len(_fold_cache) > fold_cache_size:
+            _fold_cache.popitem(last=False)
+    return folds
+
+
+def _fit_score(params, fold):
+    X_train, y_train, X_test, y_test = fold
+    model = SVR(**params).fit(X_train, y_train)
+    # Same sign as scoring='neg_mean_squared_error', higher is better
+    return -mean_squared_error(y_test, model.predict(X_test))
+
+
+def grid_search(X, y, cv=5, n_jobs=-1):
+    """Exhaustive GridSearchCV over param_grid; returns the refitted best SVR and a search report."""
+    start = time.perf_counter()
+    search = GridSearchCV(SVR(), param_grid, cv=cv, scoring='neg_mean_squared_error', n_jobs=n_jobs)
+    search.fit(X, y)
+    candidates = len(search.cv_results_['params'])
+    return search.best_estimator_, {
+        'mode': 'grid',
+        'fits': candidates * cv,
+        'seconds': time.perf_counter() - start,
+        'best_score': float(search.best_score_),
+        'best_params': search.best_params_,
+        'candidates': candidates,
+        'budget_exhausted': False,
+        'skipped_kernels': [],
+    }
+
+
+def halving_search(X, y, cv=5, max_seconds=None, max_fits=None, factor=3, warm_start_params=None,
+                   skip_losing_kernels=True, kernel_patience=3, n_jobs=None, random_state=42):
+    """Successive halving over the folds of param_grid, within a wall-clock and fit-count budget.
+
+    Every candidate is first scored on one fold; the best 1/factor of them
+    move on and are scored on one more fold, reusing the scores they already
+    have, and once no more than factor candidates are left they are scored
+    on all cv folds. The winner is the candidate with the best mean score on
+    all folds, the same criterion GridSearchCV uses, and is refitted on all
+    of X like GridSearchCV(refit=True).
+
+    Candidates are tried in a random order, after warm_start_params (e.g. the
+    parameters of the model saved by the previous search), so a budget that
+    runs out during the first round still amounts to a randomized search
+    that includes the previous winner. With skip_losing_kernels, once a
+    kernel has kernel_patience candidates scored on the first fold and none
+    of them is among those that would move on, its remaining candidates are
+    not tried.
+
+    When the budget runs out the best candidate among those scored on the
+    most folds wins. Budgets are checked between batches of fits, so a
+    single slow fit can overrun max_seconds.
+    """
+    start = time.perf_counter()
+    folds = cached_folds(X, y, cv)
+    cv = len(folds)
+
+    candidates = list(ParameterGrid(param_grid))
+    candidates = [candidates[i] for i in np.random.default_rng(random_state).permutation(len(candidates))]
+    if warm_start_params and all(name in warm_start_params for name in param_grid):
+        previous = {name: warm_start_params[name] for name in param_grid}
+        if previous in candidates:
+            candidates.remove(previous)
+        candidates.insert(0, previous)
+
+    scores = [[] for _ in candidates]
+    batch_size = effective_n_jobs(n_jobs)
+    fits = 0
+    exhausted = False
+    skipped_kernels = set()
+    alive = list(range(len(candidates)))
+    n_folds = 1
+
+    def mean_score(i):
+        return np.mean(scores[i])
+
+    def ranked(indices):
+        # Stable sort, so ties keep the order candidates were tried in
+        return sorted(indices, key=lambda i: -mean_score(i))
+
+    def within_budget():
+        if max_fits is not None and fits >= max_fits:
+            return False
+        return max_seconds is None or time.perf_counter() - start < max_seconds
+
+    first_round_keep = max(1, math.ceil(len(candidates) / factor))
+    while True:
+        tasks = [(i, fold) for i in alive for fold in range(len(scores[i]), n_folds)]
+        while tasks:
+            # Always fit something, even with a budget that is already spent
+            if fits and not within_budget():
+                exhausted = True
+                break
+            tasks = [(i, fold) for i, fold in tasks if candidates[i]['kernel'] not in skipped_kernels]
+            batch = tasks[:batch_size if max_fits is None else max(1, min(batch_size, max_fits - fits))]
+            tasks = tasks[len(batch):]
+            results = Parallel(n_jobs=n_jobs)(delayed(_fit_score)(candidates[i], folds[fold]) for i, fold in batch)
+            for (i, _), score in zip(batch, results):
+                scores[i].append(score)
+            fits += len(batch)
+
+            if skip_losing_kernels and n_folds == 1:
+                scored = [i for i in alive if scores[i]]
+                leaders = set(ranked(scored)[:first_round_keep])
+                for kernel in {candidates[i]['kernel'] for i in scored} - skipped_kernels:
+                    tried = [i for i in scored if candidates[i]['kernel'] == kernel]
+                    remaining_kernels = {candidates[i]['kernel'] for i in alive} - skipped_kernels
+                    if len(tried) >= kernel_patience and not leaders.intersection(tried) and len(remaining_kernels) > 1:
+                        skipped_kernels.add(kernel)
+        alive = [i for i in alive if candidates[i]['kernel'] not in skipped_kernels and scores[i]]
+        if exhausted or n_folds == cv:
+            break
+        alive = ranked(alive)[:max(1, math.ceil(len(alive) / factor))]
+        n_folds = cv if len(alive) <= factor else min(cv, n_folds + 1)
+
+    # With the budget spent, only candidates scored on the most folds are compared
+    most_folds = max(len(scores[i]) for i in alive)
+    best = ranked([i for i in alive if len(scores[i]) == most_folds])[0]
+    best_model = SVR(**candidates[best]).fit(X, y)
+    return best_model, {
+        'mode': 'halving',
+        'fits': fits,
+        'seconds': time.perf_counter() - start,
+        'best_score': float(mean_score(best)),
+        'best_params': candidates[best],
+        'candidates': sum(1 for s in scores if s),
+        'budget_exhausted': exhausted,
+        'skipped_kernels': sorted(skipped_kernels),
+    }
@@ -0,0 +1,158 @@
+import os
+
+import numpy as np
+import pandas as pd
+from sklearn.model_selection import train_test_split
+from sklearn.preprocessing import StandardScaler
+from sklearn.metrics import mean_squared_error, r2_score, mean_absolute_error
+from xgboost import XGBRegressor
+
+
+# Select features and target
+features = ['Temperature', 'Humidity', 'Wind Speed', 'pH (units)', 'Ammonia (mg/L)', 'Inorganic Phosphate (mg/L)', 'BOD (mg/l)', 'Total coliforms (MPN/100ml)']
+target = 'Phytoplankton (cells/ml)'
+
+
+def _report(progress, fraction, message):
+    if progress is not None:
+        progress(fraction, message)
+
+
+class FullRetrainNeeded(Exception):
+    """An incremental update was refused; the reason is the message."""
+
+
+def load_training_frame(dataset_path, prediction_log=None, include_predictions=False, dataset_cache=None,
+                        imputer=None):
+    """Complete rows of the dataset, plus logged predictions when requested.
+
+    With a ColumnarDatasetCache only the features and target are loaded,
+    memory-mapped from the cached copy of the CSV. With a KNNImputation the
+    missing values it covers are imputed first, so fewer rows are dropped.
+    """
+    # Load the dataset
+    if dataset_cache is not None:
+        merged_df = dataset_cache.load(dataset_path, imputer)
+    else:
+        merged_df = pd.read_csv(dataset_path)
+        if imputer is not None:
+            merged_df = imputer.impute(merged_df, os.path.basename(dataset_path))
+        merged_df = merged_df.dropna()
+
+    # Logged predictions are only trained on when explicitly requested
+    if include_predictions and prediction_log is not None:
+        merged_df = pd.concat([merged_df, prediction_log.to_frame().dropna()], ignore_index=True)
+    return merged_df
+
+
+def row_hashes(df):
+    """Hash of the features and target of every row, to recognise rows across versions of a dataset."""
+    return pd.util.hash_pandas_object(df[features + [target]], index=False).to_numpy()
+
+
+def _metrics(y_true, y_pred):
+    return {
+        'mse': float(mean_squared_error(y_true, y_pred)),
+        'mae': float(mean_absolute_error(y_true, y_pred)),
+        'r2': float(r2_score(y_true, y_pred)),
+    }
+
+
+def train_xgb_model(dataset_path, prediction_log=None, include_predictions=False, progress=None, dataset_cache=None,
+                    imputer=None):
+    """Train the XGBoost phytoplankton model on a dataset file.
+
+    Returns the fitted model, its scaler, the test-set metrics and the row
+    hashes of the training and test splits ({'trained': ..., 'holdout': ...}),
+    which let a later update_xgb_model tell new rows apart. progress, if
+    given, is called with a fraction and a message between stages.
+    """
+    _report(progress, 0.0, 'Loading dataset')
+    merged_df = load_training_frame(dataset_path, prediction_log, include_predictions, dataset_cache, imputer)
+
+    # Perform train/test split
+    X = merged_df[features]
+    y = merged_df[target]
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+    hashes = pd.Series(row_hashes(merged_df), index=merged_df.index)
+
+    # Standardize the features
+    _report(progress, 0.2, 'Scaling features')
+    scaler = StandardScaler()
+    X_train_scaled = scaler.fit_transform(X_train)
+    X_test_scaled = scaler.transform(X_test)
+
+    # Train XGBoost model
+    _report(progress, 0.3, 'Training XGBoost model')
+    xgb_model = XGBRegressor()
+    xgb_model.fit(X_train_scaled, y_train)
+
+    # Calculate metrics
+    _report(progress, 0.9, 'Evaluating model')
+    y_pred_xgb = xgb_model.predict(X_test_scaled)
+    metrics = _metrics(y_test, y_pred_xgb)
+    rows = {'trained': hashes[X_train.index].to_numpy(), 'holdout': hashes[X_test.index].to_numpy()}
+    return xgb_model, scaler, metrics, rows
+
+
+def update_xgb_model(dataset_path, model, scaler, rows, prediction_log=None, include_predictions=False,
+                     rounds=10, learning_rate=0.05, drift_threshold=1.0, error_threshold=1.25, progress=None,
+                     dataset_cache=None, imputer=None):
+    """Continue boosting a trained model on the rows of the dataset it has not seen yet.
+
+    rows are the row hashes recorded with the model by train_xgb_model or a
+    previous update. New rows are split 80/20 like a full training run; the
+    model gets `rounds` more trees fitted on the new training rows, scaled
+    with its existing scaler, and is evaluated on every holdout row, old and
+    new. The added trees use a small learning_rate so that a handful of new
+    rows nudges the model instead of overwriting what it learned. Returns
+    the same tuple as train_xgb_model, or None when there are no new rows.
+
+    Raises FullRetrainNeeded when the new rows have drifted, i.e. the mean of
+    some feature moved more than drift_threshold standard deviations of the
+    scaler beyond the three standard errors that sampling alone explains,
+    or when the holdout MSE of the updated model is more than
+    error_threshold times the MSE of the model it started from on the same
+    rows.
+    """
+    _report(progress, 0.0, 'Loading dataset')
+    merged_df = load_training_frame(dataset_path, prediction_log, include_predictions, dataset_cache, imputer)
+    hashes = row_hashes(merged_df)
+    new_rows = merged_df[~np.isin(hashes, np.concatenate([rows['trained'], rows['holdout']]))]
+    if new_rows.empty:
+        return None
+
+    # Too few rows to hold some out; the old holdout rows still measure the update
+    if len(new_rows) >= 5:
+        new_train, new_test = train_test_split(new_rows, test_size=0.2, random_state=42)
+    else:
+        new_train, new_test = new_rows, new_rows.iloc[0:0]
+
+    _report(progress, 0.2, 'Checking drift')
+    X_new = scaler.transform(new_train[features])
+    # A mean of n rows wanders about 1/sqrt(n) standard deviations by chance, allow three of those
+    drift = float(np.abs(X_new.mean(axis=0)).max() - 3 / np.sqrt(len(X_new)))
+    if drift > drift_threshold:
+        raise FullRetrainNeeded(f'Features of the {len(new_rows)} new rows drifted {drift:.2f} standard deviations beyond sampling noise')
+
+    _report(progress, 0.3, f'Boosting on {len(new_train)} new rows')
+    updated = XGBRegressor(**{**model.get_params(), 'n_estimators': rounds, 'learning_rate': learning_rate})
+    updated.fit(X_new, new_train[target], xgb_model=model.get_booster())
+
+    _report(progress, 0.9, 'Evaluating model')
+    holdout_hashes = np.concatenate([rows['holdout'], row_hashes(new_test)])
+    holdout = merged_df[np.isin(hashes, holdout_hashes)]
+    if holdout.empty:
+        raise FullRetrainNeeded('No holdout rows left in the dataset to evaluate an update on')
+    X_holdout = scaler.transform(holdout[features])
+    metrics = _metrics(holdout[target], updated.predict(X_holdout))
+    base_mse = float(mean_squared_error(holdout[target], model.predict(X_holdout)))
+    if metrics['mse'] > error_threshold * base_mse:
+        raise FullRetrainNeeded(
+            f"Holdout MSE {metrics['mse']:.4g} after the update exceeds {error_threshold} x {base_mse:.4g} before it")
+
+    rows = {
+        'trained': np.concatenate([rows['trained'], row_hashes(new_train)]),
+        'holdout': holdout_hashes,
+    }
+    return updated, scaler, metrics, rows
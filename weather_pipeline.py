@@ -0,0 +1,386 @@
+import hashlib
+import re
+import sqlite3
+import threading
+
+import numpy as np
+import pandas as pd
+
+
+# List of columns to exclude from transformation
+exclude_columns = ['Month', 'Wind', 'Condition']
+
+# Everything but digits and the decimal point, e.g. the units in '26 °C' or '1,007.21 °hPa'
+non_numeric = re.compile(r'[^0-9.]')
+
+# Monthly aggregates: the mode of the encoded categories and the mean of the readings
+group_columns = ['Year', 'Month']
+mode_columns = ['Wind', 'Condition']
+mean_columns = ['Time', 'Temperature', 'Dew Point', 'Humidity', 'Wind Speed', 'Wind Gust', 'Pressure', 'Precip.']
+required_columns = group_columns + mode_columns + mean_columns
+
+# Define mappings for Wind column
+wind_mapping = {
+    'N': 1, 'NNE': 2, 'NE': 3, 'ENE': 4,
+    'E': 5, 'ESE': 6, 'SE': 7, 'SSE': 8,
+    'S': 9, 'SSW': 10, 'SW': 11, 'WSW': 12,
+    'W': 13, 'WNW': 14, 'NW': 15, 'NNW': 16,
+    'VAR': 17, 'CALM': 18
+}
+
+# Define mappings for Condition column
+condition_mapping = {
+    'Fair': 1, 'Mostly Cloudy': 2, 'Partly Cloudy': 3, 'Cloudy': 4,
+    'Light Rain': 5, 'Light Rain Shower': 6, 'Rain': 7, 'Heavy Rain': 8,
+    'Thunder': 9, 'Light Rain with Thunder': 10, 'T-Storm': 11,
+    'Heavy Rain Shower': 12, 'Rain Shower': 13, 'Showers in the Vicinity': 14,
+    'Thunder in the Vicinity': 15, 'Mostly Cloudy / Windy': 16,
+    'Fair / Windy': 17, 'Partly Cloudy / Windy': 18, 'Rain / Windy': 19,
+    'Light Rain Shower / Windy': 20, 'Heavy Rain / Windy': 21
+}
+
+
+def clean_numeric_column(column):
+    """Strip units from the text cells of a column and convert it to numbers."""
+    if column.dtype != object:
+        return pd.to_numeric(column, errors='coerce')
+    # Readings repeat a lot ('26 °C', '84 %'), so clean each distinct value once
+    codes, uniques = pd.factorize(column)
+    uniques = pd.Series(uniques, dtype=object)
+    # Cells that are not strings come back as NaN from .str, put the original values back
+    stripped = uniques.str.replace(non_numeric, '', regex=True).fillna(uniques)
+    values = pd.to_numeric(stripped, errors='coerce').to_numpy()
+    if (codes == -1).any():
+        # Code -1 marks missing cells and picks the trailing NaN
+        values = np.append(values.astype(float), np.nan)
+    return pd.Series(values[codes], index=column.index, name=column.name)
+
+
+def encode_categories(column, mapping):
+    """Map labels to their codes through a categorical, leaving unknown labels as NaN."""
+    codes = pd.Categorical(column, categories=list(mapping)).codes
+    # Code -1 marks labels outside the mapping and picks the trailing NaN
+    values = np.append(np.asarray(list(mapping.values()), dtype=float), np.nan)[codes]
+    if not np.isnan(values).any():
+        return pd.Series(values.astype(np.int64), index=column.index, name=column.name)
+    return pd.Series(values, index=column.index, name=column.name)
+
+
+def clean_weather(weather_df):
+    """Convert the hourly weather columns to numbers and encode Wind and Condition."""
+    weather_df = weather_df.copy()
+    numeric_columns = [col for col in weather_df.columns if col not in exclude_columns]
+    for column in numeric_columns:
+        weather_df[column] = clean_numeric_column(weather_df[column])
+
+    # Apply mappings to Wind and Condition columns
+    weather_df['Wind'] = encode_categories(weather_df['Wind'], wind_mapping)
+    weather_df['Condition'] = encode_categories(weather_df['Condition'], condition_mapping)
+    return weather_df
+
+
+def modes_from_counts(counts, column):
+    """Most frequent value per group from counts indexed by (Year, Month, value), the smallest one on ties like Series.mode()."""
+    counts = counts.reset_index(name='count')
+    counts = counts.sort_values(['count', column], ascending=[False, True], kind='stable')
+    return counts.drop_duplicates(group_columns).set_index(group_columns)[column]
+
+
+def monthly_modes(grouped, column):
+    """Most frequent value of column per group, the smallest one on ties like Series.mode()."""
+    return modes_from_counts(grouped[column].value_counts(), column)
+
+
+def aggregate_monthly(weather_df):
+    """Per (Year, Month) modes of Wind and Condition and means of the other readings, from cleaned hourly rows."""
+    grouped = weather_df.groupby(group_columns)
+    means = grouped[mean_columns].mean()
+    for position, column in enumerate(mode_columns):
+        # Months where every value is missing have no mode and get NaN
+        means.insert(position, column, monthly_modes(grouped, column).reindex(means.index))
+    return means.reset_index()
+
+
+def fingerprint_sums(raw_df):
+    """Row count and the two sums of row hashes of every (Year, Month), as a frame indexed by (Year, Month).
+
+    The sums of two sets of rows add up, modulo 2**64, to the sums of their
+    union, so they can be computed chunk by chunk.
+    """
+    grouped = raw_df.groupby(group_columns)
+    sizes = grouped.size()
+    if sizes.empty:
+        return pd.DataFrame({'rows': [], 'first': [], 'second': []}, index=sizes.index).astype(np.uint64)
+    row_hashes = pd.util.hash_pandas_object(raw_df, index=False).to_numpy()
+    # Rows with a missing Year or Month belong to no month
+    group_ids = grouped.ngroup().fillna(-1).to_numpy(dtype=np.int64)
+    in_group = group_ids >= 0
+    hashes = row_hashes[in_group][np.argsort(group_ids[in_group], kind='stable')]
+    starts = np.concatenate([[0], np.cumsum(sizes.to_numpy())[:-1]])
+    # uint64 sums wrap around; the second sum guards against rows trading hash values
+    first = np.add.reduceat(hashes, starts)
+    second = np.add.reduceat(hashes * (hashes | np.uint64(1)), starts)
+    return pd.DataFrame({'rows': sizes.to_numpy().astype(np.uint64), 'first': first, 'second': second}, index=sizes.index)
+
+
+def fingerprints_from_sums(sums, columns):
+    """Fingerprint strings keyed by (Year, Month) from fingerprint_sums and the upload's column names."""
+    header = hashlib.sha1(','.join(map(str, columns)).encode()).hexdigest()[:8]
+    return {
+        key: f'{header}-{count}-{a:016x}{b:016x}'
+        for key, count, a, b in zip(sums.index, sums['rows'].to_numpy(), sums['first'].to_numpy(), sums['second'].to_numpy())
+    }
+
+
+def monthly_fingerprints(raw_df):
+    """Fingerprint of the raw hourly rows of every (Year, Month), keyed by (Year, Month).
+
+    Row hashes are summed per month, so the fingerprint does not depend on
+    the order of the rows, just like the aggregates themselves.
+    """
+    return fingerprints_from_sums(fingerprint_sums(raw_df), raw_df.columns)
+
+
+class MonthlyAccumulator:
+    """Monthly aggregates of hourly weather read in chunks, holding per-month totals only.
+
+    scan() validates one chunk of raw rows as read by
+    pd.read_csv(..., chunksize=...) and folds it into the fingerprints;
+    fold() cleans a chunk and folds its rows, or only those of the given
+    months, into the monthly totals; add() does both. chunk_months tells
+    which months every scanned chunk holds. monthly() then returns
+    what aggregate_monthly(clean_weather(...)) gives for the folded rows at
+    once, up to the rounding of the means. fingerprints() are those of
+    monthly_fingerprints, taken over the rows with their numbers as text so
+    that they do not depend on where the chunks were cut. Memory grows with
+    the number of months, not of rows.
+    """
+
+    def __init__(self):
+        self.columns = None
+        self.rows = 0
+        # Per-chunk totals, a few months each, summed by month once at the end
+        self.sums = []
+        self.counts = []
+        self.mode_counts = {column: [] for column in mode_columns}
+        # (Year, Month) -> [rows, first, second], the fingerprint_sums of every chunk so far
+        self.fingerprint_totals = {}
+        # The months of every chunk scanned, in order
+        self.chunk_months = []
+        self.year_dtype = None
+        self.known = dict.fromkeys(mode_columns, True)
+
+    def scan(self, raw_df):
+        if self.columns is None:
+            missing = [column for column in required_columns if column not in raw_df.columns]
+            if missing:
+                raise ValueError(f'The weather file has no {", ".join(missing)} column')
+            self.columns = list(raw_df.columns)
+        first_row = self.rows + 2
+        self.rows += len(raw_df)
+
+        years = clean_numeric_column(raw_df['Year'])
+        if years.notna().sum() == 0 and raw_df['Year'].notna().any():
+            raise ValueError(f'Rows {first_row}-{first_row + len(raw_df) - 1} of the weather file have no numeric Year')
+        self.year_dtype = years.dtype if self.year_dtype is None else np.result_type(self.year_dtype, years.dtype)
+        for column, mapping in [('Wind', wind_mapping), ('Condition', condition_mapping)]:
+            self.known[column] = self.known[column] and raw_df[column].isin(list(mapping)).all()
+
+        # read_csv infers the dtypes of every chunk on its own, hash numbers as text so every chunk hashes alike
+        hashed = raw_df.assign(**{column: raw_df[column].astype(str) for column in raw_df.columns
+                                  if column not in group_columns and raw_df[column].dtype != object})
+        sums = fingerprint_sums(hashed.assign(Year=years.astype(float)))
+        self.chunk_months.append(set(sums.index))
+        for key, row in zip(sums.index, sums.to_numpy().tolist()):
+            totals = self.fingerprint_totals.setdefault(key, [0, 0, 0])
+            for i, value in enumerate(row):
+                totals[i] = (totals[i] + value) % 2 ** 64
+
+    def fold(self, raw_df, months=None):
+        raw_df = raw_df.assign(Year=clean_numeric_column(raw_df['Year']))
+        if months is not None:
+            raw_df = raw_df[pd.MultiIndex.from_frame(raw_df[group_columns]).isin(list(months))]
+        weather_df = clean_weather(raw_df)
+        grouped = weather_df.groupby(group_columns)
+        self.sums.append(grouped[mean_columns].sum().astype(float))
+        self.counts.append(grouped[mean_columns].count())
+        for column in mode_columns:
+            self.mode_counts[column].append(grouped[column].value_counts())
+
+    def add(self, raw_df):
+        self.scan(raw_df)
+        self.fold(raw_df)
+
+    def monthly(self):
+        if not self.sums:
+            raise ValueError('The weather file has no rows')
+        sums = pd.concat(self.sums).groupby(level=group_columns).sum()
+        counts = pd.concat(self.counts).groupby(level=group_columns).sum()
+        # Months where a reading is always missing get NaN, as the mean of nothing
+        means = sums / counts.where(counts > 0)
+        for position, column in enumerate(mode_columns):
+            mode_counts = pd.concat(self.mode_counts[column]).groupby(level=group_columns + [column]).sum()
+            means.insert(position, column, modes_from_counts(mode_counts, column).reindex(means.index))
+        return self.finish(means.reset_index())
+
+    def finish(self, monthly):
+        """Monthly rows with the dtypes aggregating the whole upload at once would give them."""
+        monthly['Year'] = monthly['Year'].astype(self.year_dtype)
+        for column in mode_columns:
+            # Integer codes when every label is known
+            monthly[column] = monthly[column].astype(np.int64 if self.known[column] else float)
+        return monthly
+
+    def fingerprints(self):
+        totals = pd.DataFrame(list(self.fingerprint_totals.values()), columns=['rows', 'first', 'second'],
+                              index=pd.MultiIndex.from_tuples(list(self.fingerprint_totals), names=group_columns))
+        return fingerprints_from_sums(totals.astype(np.uint64), self.columns)
+
+
+class MonthlyWeatherStore:
+    """SQLite store of monthly weather aggregates, next to the fingerprint of the hourly rows behind them.
+
+    aggregate() only cleans and aggregates the months of an upload that are
+    new or whose rows changed since they were stored, and writes back just
+    those months in one transaction; every other month is read back from
+    the database. aggregate_chunks() does the same for an upload read in
+    chunks, keeping per-month totals only; it reads the upload a second
+    time when months already stored have changed.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.value_columns = mode_columns + mean_columns
+        self.lock = threading.Lock()
+        self.last_update = {'months': 0, 'recomputed': 0}
+        conn = self._connect()
+        try:
+            conn.execute('PRAGMA journal_mode=WAL')
+            # No declared types on the key, so Year and Month come back exactly as they were written
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS weather_monthly ('
+                ' year NOT NULL,'
+                ' month NOT NULL,'
+                ' fingerprint TEXT NOT NULL,'
+                + ''.join(f' "{column}" REAL,' for column in self.value_columns)
+                + ' PRIMARY KEY (year, month))'
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute('PRAGMA synchronous=FULL')
+        return conn
+
+    def _load(self, conn):
+        selected = ', '.join(f'"{column}"' for column in self.value_columns)
+        rows = conn.execute(f'SELECT year, month, fingerprint, {selected} FROM weather_monthly').fetchall()
+        # NULL comes back as None, the float dtype turns it into NaN
+        stored = pd.DataFrame(rows, columns=group_columns + ['fingerprint'] + self.value_columns)
+        return stored.astype({column: float for column in self.value_columns})
+
+    def _save(self, conn, fresh):
+        columns = group_columns + ['fingerprint'] + self.value_columns
+        placeholders = ', '.join('?' * len(columns))
+        # to_dict boxes NumPy scalars into Python ones, which sqlite3 can bind
+        records = fresh[columns].to_dict('split')['data']
+        with conn:
+            conn.executemany(f'INSERT OR REPLACE INTO weather_monthly VALUES ({placeholders})', records)
+
+    def aggregate(self, raw_df):
+        """Monthly aggregates of the hourly rows of an upload, as read by pd.read_csv."""
+        # Year is cleaned like the other readings, so group on the cleaned value from the start
+        years = clean_numeric_column(raw_df['Year'])
+        raw_df = raw_df.assign(Year=years)
+        fingerprints = monthly_fingerprints(raw_df)
+        with self.lock:
+            conn = self._connect()
+            try:
+                stored = self._load(conn)
+                stored_keys = list(zip(stored['Year'], stored['Month']))
+                stored_fingerprints = dict(zip(stored_keys, stored['fingerprint']))
+                changed = {key for key, fingerprint in fingerprints.items() if stored_fingerprints.get(key) != fingerprint}
+
+                parts = []
+                reused = [key in fingerprints and key not in changed for key in stored_keys]
+                if any(reused):
+                    parts.append(stored.loc[reused, group_columns + self.value_columns])
+                if changed:
+                    rows = pd.MultiIndex.from_frame(raw_df[group_columns]).isin(list(changed))
+                    fresh = aggregate_monthly(clean_weather(raw_df[rows]))
+                    parts.append(fresh)
+                    keys = zip(fresh['Year'], fresh['Month'])
+                    self._save(conn, fresh.assign(fingerprint=[fingerprints[key] for key in keys]))
+            finally:
+                conn.close()
+            self.last_update = {'months': len(fingerprints), 'recomputed': len(changed)}
+
+        if not parts:
+            return aggregate_monthly(clean_weather(raw_df))
+        monthly = pd.concat(parts, ignore_index=True)
+        monthly['Year'] = monthly['Year'].astype(years.dtype)
+        for column, mapping in [('Wind', wind_mapping), ('Condition', condition_mapping)]:
+            # Integer codes when every label is known, as aggregating the whole upload would give
+            known = raw_df[column].isin(list(mapping)).all()
+            monthly[column] = monthly[column].astype(np.int64 if known else float)
+        return monthly.sort_values(group_columns, kind='stable').reset_index(drop=True)
+
+    def aggregate_chunks(self, read_chunks):
+        """Monthly aggregates of hourly rows read in chunks, e.g. pd.read_csv(..., chunksize=...).
+
+        read_chunks returns the chunks of the upload from its first row, and
+        is called again when it has to be read twice. Every chunk is
+        validated as the first pass reads it, so a ValueError for a malformed
+        upload comes with the first bad chunk. Months that are not in the
+        store are cleaned and aggregated in that pass too; stored months are
+        only fingerprinted, and the rows of those that changed are cleaned in
+        a second pass over the chunks that hold them. Memory does not grow
+        with the number of rows.
+        """
+        accumulator = MonthlyAccumulator()
+        with self.lock:
+            conn = self._connect()
+            try:
+                stored = self._load(conn)
+                stored_keys = list(zip(stored['Year'], stored['Month']))
+                stored_fingerprints = dict(zip(stored_keys, stored['fingerprint']))
+                for chunk in read_chunks():
+                    accumulator.scan(chunk)
+                    new = accumulator.chunk_months[-1] - stored_fingerprints.keys()
+                    if new:
+                        accumulator.fold(chunk, None if new == accumulator.chunk_months[-1] else new)
+                if accumulator.columns is None:
+                    raise ValueError('The weather file has no rows')
+                fingerprints = accumulator.fingerprints()
+                changed = {key for key, fingerprint in fingerprints.items() if stored_fingerprints.get(key) != fingerprint}
+
+                # Chunks are cut alike on every read, so those without a changed stored month are skipped
+                edited = changed & stored_fingerprints.keys()
+                needed = {i for i, months in enumerate(accumulator.chunk_months) if months & edited}
+                if needed:
+                    for i, chunk in enumerate(read_chunks()):
+                        if i in needed:
+                            accumulator.fold(chunk, edited)
+                        if i == max(needed):
+                            break
+
+                parts = []
+                reused = [key in fingerprints and key not in changed for key in stored_keys]
+                if any(reused):
+                    parts.append(stored.loc[reused, group_columns + self.value_columns])
+                if changed or not parts:
+                    if not accumulator.sums:
+                        # No row has both a Year and a Month, folding none gives the columns of an empty frame
+                        accumulator.fold(pd.DataFrame(columns=accumulator.columns))
+                    fresh = accumulator.monthly()
+                    parts.append(fresh)
+                    keys = zip(fresh['Year'], fresh['Month'])
+                    self._save(conn, fresh.assign(fingerprint=[fingerprints[key] for key in keys]))
+            finally:
+                conn.close()
+            self.last_update = {'months': len(fingerprints), 'recomputed': len(changed)}
+
+        monthly = accumulator.finish(pd.concat(parts, ignore_index=True))
+        return monthly.sort_values(group_columns, kind='stable').reset_index(drop=True)
@@ -0,0 +1,27 @@
+"""Entry point for serving the API from several worker processes.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+gunicorn.conf.py preloads this module in the master process, so the model,
+the scaler and the parsed station dataset are loaded once and shared by the
+forked workers copy-on-write. Predictions go to the SQLite prediction log,
+which serialises writers across processes; model registration, exports and
+forecast table builds take file locks. A version promoted through one worker
+is picked up by the others on their next request. Background jobs run in
+the worker that queued them, but their state is in the shared jobs database,
+so /jobs answers for them from any worker.
+"""
+import gc
+
+from app import app, station_dataset, wait_for_forecast_table, warm_up
+
+# Parse the station dataset and initialise XGBoost's predictor before the workers are forked
+station_dataset.get()
+if not app.config['WARM_UP']:
+    warm_up('imports')
+# With WARM_UP=forecasts a table build is running; forking in the middle of it would leave its
+# locks held in every worker, so it finishes here and the workers share the table it built
+wait_for_forecast_table()
+
+# Objects loaded so far are never collected, so collections in the workers do not write to their shared pages
+gc.freeze()